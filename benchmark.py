@@ -0,0 +1,367 @@
+import os
+import sqlite3
+import random
+import time
+import json
+import argparse
+import tempfile
+
+from normalization import (
+    create_normalized_tables,
+    insert_data,
+    bulk_load,
+    normalize_relations,
+    stream_input,
+    ColumnStore,
+    FlatRecords,
+    PipelineTrace,
+    create_join_indexes,
+    create_reconstructed_view,
+    RECONSTRUCTED_VIEW,
+)
+
+
+##### v SYNTHETIC DATA v #####
+
+
+def generate_records(headers, rows, seed=0):
+    """Generates synthetic records for the given headers, with repeating IDs so projections contain duplicates."""
+    rng = random.Random(seed)
+    records = []
+    for order in range(rows):
+        record = []
+        for header in headers:
+            if header == "OrderID":
+                record.append(str(order))
+            elif header.endswith("ID"):
+                record.append(str(rng.randrange(max(rows // 10, 1))))
+            else:
+                record.append(f"{header}_{rng.randrange(100)}")
+        records.append(record)
+    return records
+
+
+def synthetic_schema(columns, entities=2, multivalued=1):
+    """Builds headers, FDs and MVDs for a synthetic dataset keyed by RowID.
+
+    RowID determines one ID column per entity, each entity ID determines its share of the
+    attribute columns, and every multi-valued column is independent of the rest given RowID."""
+    if entities < 1 or columns < 1 + entities + multivalued:
+        raise ValueError("Need at least one entity and a column for RowID, each entity ID and each multi-valued column")
+    entity_ids = [f"E{e}ID" for e in range(entities)]
+    multivalued_columns = [f"M{m}" for m in range(multivalued)]
+    attributes = {entity_id: [] for entity_id in entity_ids}
+    for a in range(columns - 1 - entities - multivalued):
+        attributes[entity_ids[a % entities]].append(f"E{a % entities}Attr{a // entities}")
+    headers = ["RowID"] + [
+        col for entity_id in entity_ids for col in [entity_id] + attributes[entity_id]
+    ] + multivalued_columns
+    fds = [{"lhs": ["RowID"], "rhs": entity_ids}]
+    fds.extend(
+        {"lhs": [entity_id], "rhs": attributes[entity_id]}
+        for entity_id in entity_ids
+        if attributes[entity_id]
+    )
+    mvds = [{"lhs": "RowID", "rhs": [col]} for col in multivalued_columns]
+    return headers, fds, mvds
+
+
+def write_dataset(path, headers, rows, fanout=3, seed=0):
+    """Writes a brace-delimited input file that satisfies the FDs and MVDs of synthetic_schema."""
+    rng = random.Random(seed)
+    domain = max(rows // 10, 1)
+    with open(path, "w") as f:
+        f.write(" ".join(headers) + "\n")
+        lines = []
+        entity_id = None
+        for row in range(rows):
+            fields = []
+            for col in headers:
+                if col == "RowID":
+                    fields.append(str(row))
+                elif col.endswith("ID"):
+                    entity_id = rng.randrange(domain)
+                    fields.append(str(entity_id))
+                elif col.startswith("M"):
+                    # Multi-valued fields hold between 1 and fanout distinct values
+                    values = rng.sample(range(fanout * 4), rng.randint(1, fanout))
+                    fields.append("{" + ", ".join(f"{col}_{v}" for v in values) + "}")
+                else:
+                    # Attributes are a pure function of their entity's ID so the FDs hold
+                    fields.append(f"{col}_{entity_id * 31 % 997}")
+            lines.append(" ".join(fields))
+            if len(lines) >= 10000:
+                f.write("\n".join(lines) + "\n")
+                lines.clear()
+        if lines:
+            f.write("\n".join(lines) + "\n")
+
+
+##### ^ SYNTHETIC DATA ^ #####
+##### v LOAD BENCHMARK v #####
+
+
+def time_load(loader, relations, headers, records):
+    """Creates the normalized tables in a fresh database file and times the given loader."""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "bench.db"))
+        cursor = conn.cursor()
+        # Copies the relations since create_normalized_tables appends primary keys to the columns
+        create_normalized_tables(cursor, [dict(rel, columns=list(rel["columns"])) for rel in relations])
+        conn.commit()
+        start = time.perf_counter()
+        loader(conn, relations, records, headers)
+        elapsed = time.perf_counter() - start
+        conn.close()
+    return elapsed
+
+
+def row_by_row_loader(conn, relations, records, headers):
+    """The original loading path from main(): one insert_data call per relation per record."""
+    cursor = conn.cursor()
+    for rel in relations:
+        for record in records:
+            insert_data(cursor, rel["table_name"], rel["columns"], record, headers)
+    conn.commit()
+
+
+def benchmark_load(rows, max_nf=3):
+    """Compares rows/sec of the row-by-row insert path and the bulk loader on the same relations."""
+    with open("input_data.txt", "r") as file:
+        headers = [header.strip('"') for header in file.readline().split()]
+    with open("fds.txt", "r") as f:
+        fds = json.load(f)
+    records = generate_records(headers, rows)
+    relations = normalize_relations(
+        {
+            "CoffeeShop": {
+                "table_name": "CoffeeShop",
+                "columns": headers,
+                "primary_key": ["OrderID"],
+                "candidate_keys": [["OrderID"]],
+            }
+        },
+        fds,
+        max_nf=max_nf,
+        records=records,
+    )
+    results = {}
+    for name, loader in (("row_by_row", row_by_row_loader), ("bulk_load", bulk_load)):
+        elapsed = time_load(loader, relations, headers, records)
+        results[name] = {"seconds": elapsed, "rows_per_sec": rows / elapsed if elapsed else float("inf")}
+        print(f"{name:>12}: {rows} rows in {elapsed:.3f}s ({results[name]['rows_per_sec']:,.0f} rows/sec)")
+    print(f"     speedup: {results['row_by_row']['seconds'] / results['bulk_load']['seconds']:.1f}x")
+    return results
+
+
+##### ^ LOAD BENCHMARK ^ #####
+##### v PIPELINE SUITE v #####
+
+
+DEFAULT_SCALES = [10**3, 10**4, 10**5]
+REGRESSION_THRESHOLD = 0.25
+# Stages faster than this are too noisy to flag as regressions
+MIN_STAGE_SECONDS = 0.01
+
+
+def benchmark_pipeline(rows, columns=12, entities=2, multivalued=1, fanout=3, max_nf=6, seed=0):
+    """Times each pipeline stage on one synthetic dataset and returns the seconds per stage."""
+    headers, fds, mvds = synthetic_schema(columns, entities, multivalued)
+    trace = PipelineTrace()
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, "input_data.txt")
+        write_dataset(input_path, headers, rows, fanout, seed)
+
+        with trace.stage("parse"):
+            with open(input_path, "r") as file:
+                headers, records = stream_input(file)
+                records = ColumnStore.from_records(headers, records)
+        with trace.stage("flatten"):
+            records = ColumnStore.from_records(headers, FlatRecords(records, headers))
+
+        relations = normalize_relations(
+            {
+                "Synthetic": {
+                    "table_name": "Synthetic",
+                    "columns": headers,
+                    "primary_key": ["RowID"],
+                    "candidate_keys": [["RowID"]],
+                }
+            },
+            fds,
+            mvds,
+            max_nf=max_nf,
+            records=records,
+            trace=trace,
+        )
+
+        conn = sqlite3.connect(os.path.join(tmp, "bench.db"))
+        trace.attach(conn)
+        create_normalized_tables(conn.cursor(), relations, trace)
+        conn.commit()
+        bulk_load(conn, relations, records, headers, trace=trace)
+        conn.close()
+    return {entry["stage"]: entry["seconds"] for entry in trace.to_dict()["stages"]}
+
+
+def run_suite(scales, **config):
+    """Runs the pipeline benchmark at every scale and prints one line per stage."""
+    results = {}
+    for rows in scales:
+        stages = benchmark_pipeline(rows, **config)
+        results[str(rows)] = stages
+        total = sum(stages.values())
+        print(f"{rows:>10} rows: {total:.3f}s total ({rows / total if total else float('inf'):,.0f} rows/sec)")
+        for stage, seconds in stages.items():
+            print(f"{stage:>24}: {seconds:.4f}s")
+    return results
+
+
+def find_regressions(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Lists the stages that are slower than the baseline by more than the threshold."""
+    regressions = []
+    for rows, stages in results.items():
+        for stage, seconds in stages.items():
+            before = baseline.get(rows, {}).get(stage)
+            if before is None or seconds < MIN_STAGE_SECONDS:
+                continue
+            if seconds > before * (1 + threshold):
+                regressions.append({"rows": rows, "stage": stage, "baseline": before, "seconds": seconds})
+    return regressions
+
+
+##### ^ PIPELINE SUITE ^ #####
+##### v QUERY BENCHMARK v #####
+
+
+def time_query(conn, query, parameters, repeat):
+    """Returns the average milliseconds per execution of a query, cycling through the parameter tuples."""
+    start = time.perf_counter()
+    for run in range(repeat):
+        conn.execute(query, parameters[run % len(parameters)]).fetchall()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def benchmark_queries(rows, columns=12, entities=2, multivalued=1, fanout=3, max_nf=6, repeat=50, seed=0):
+    """Compares query latency on the normalized schema, through the reconstructed view, against one flat table."""
+    headers, fds, mvds = synthetic_schema(columns, entities, multivalued)
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, "input_data.txt")
+        write_dataset(input_path, headers, rows, fanout, seed)
+        with open(input_path, "r") as file:
+            headers, records = stream_input(file)
+            records = ColumnStore.from_records(headers, FlatRecords(ColumnStore.from_records(headers, records), headers))
+        relations = normalize_relations(
+            {"Synthetic": {"table_name": "Synthetic", "columns": headers, "primary_key": ["RowID"]}},
+            fds,
+            mvds,
+            max_nf=max_nf,
+            records=records,
+        )
+
+        conn = sqlite3.connect(os.path.join(tmp, "bench.db"))
+        create_normalized_tables(conn.cursor(), relations)
+        conn.commit()
+        bulk_load(conn, relations, records, headers)
+        create_join_indexes(conn, relations)
+        if not create_reconstructed_view(conn, relations, headers):
+            raise SystemExit("The normalized tables cannot be joined back into the original columns")
+
+        # The flat table gets the same lookups indexed so only the joins differ
+        conn.execute(f"CREATE TABLE Flat ({', '.join(headers)})")
+        conn.executemany(f"INSERT INTO Flat VALUES ({', '.join('?' for _ in headers)})", records)
+        conn.execute("CREATE INDEX Flat_RowID ON Flat (RowID)")
+        conn.execute("CREATE INDEX Flat_E0ID ON Flat (E0ID)")
+        conn.commit()
+
+        row_ids = [(str(rng.randrange(rows)),) for _ in range(repeat)]
+        entity_ids = [(str(rng.randrange(max(rows // 10, 1))),) for _ in range(repeat)]
+        queries = (
+            ("point lookup", "SELECT * FROM {source} WHERE RowID = ?", row_ids, repeat),
+            ("entity filter", "SELECT COUNT(*) FROM {source} WHERE E0ID = ?", entity_ids, repeat),
+            ("full scan", "SELECT COUNT(*) FROM {source}", [()], max(1, repeat // 10)),
+        )
+        results = {}
+        for name, query, parameters, runs in queries:
+            normalized = time_query(conn, query.format(source=RECONSTRUCTED_VIEW), parameters, runs)
+            flat = time_query(conn, query.format(source="Flat"), parameters, runs)
+            results[name] = {"normalized_ms": normalized, "flat_ms": flat}
+            print(f"{name:>14}: normalized {normalized:.3f}ms, flat {flat:.3f}ms ({normalized / flat if flat else float('inf'):.1f}x)")
+        conn.close()
+    return results
+
+
+##### ^ QUERY BENCHMARK ^ #####
+##### v MAIN v #####
+
+
+def main():
+    """Runs the load benchmark for the requested row count, or the per-stage suite with --suite."""
+    parser = argparse.ArgumentParser(description="Benchmarks the normalizer's loading path.")
+    parser.add_argument("--rows", type=int, default=20000, help="Number of synthetic records to load")
+    parser.add_argument("--max-nf", type=int, default=None, help="Normal form used to build the benchmark schema")
+    parser.add_argument("--suite", action="store_true", help="Time every pipeline stage on synthetic datasets")
+    parser.add_argument(
+        "--queries",
+        action="store_true",
+        help="Compare query latency through the reconstructed view against a flat table",
+    )
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES, help="Row counts used by the suite")
+    parser.add_argument("--columns", type=int, default=12, help="Columns in the synthetic datasets")
+    parser.add_argument("--entities", type=int, default=2, help="Entity ID columns, each determining its own attributes")
+    parser.add_argument("--multivalued", type=int, default=1, help="Multi-valued columns, each an MVD of RowID")
+    parser.add_argument("--fanout", type=int, default=3, help="Largest number of values in a multi-valued field")
+    parser.add_argument("--save-baseline", metavar="FILE", help="Save the suite results as a baseline")
+    parser.add_argument("--baseline", metavar="FILE", help="Fail if any stage is slower than this baseline")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=REGRESSION_THRESHOLD,
+        help="Allowed slowdown over the baseline before failing (0.25 = 25%%)",
+    )
+    args = parser.parse_args()
+    if args.queries:
+        benchmark_queries(
+            args.rows,
+            columns=args.columns,
+            entities=args.entities,
+            multivalued=args.multivalued,
+            fanout=args.fanout,
+            max_nf=args.max_nf or 6,
+        )
+        return
+    if not args.suite:
+        benchmark_load(args.rows, args.max_nf or 3)
+        return
+
+    results = run_suite(
+        args.scales,
+        columns=args.columns,
+        entities=args.entities,
+        multivalued=args.multivalued,
+        fanout=args.fanout,
+        max_nf=args.max_nf or 6,
+    )
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print("Baseline saved in", args.save_baseline)
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.threshold)
+        for regression in regressions:
+            print(
+                f"REGRESSION {regression['rows']} rows, {regression['stage']}: "
+                f"{regression['seconds']:.4f}s vs baseline {regression['baseline']:.4f}s"
+            )
+        if regressions:
+            raise SystemExit(1)
+        print("No stage regressed past the threshold")
+
+
+if __name__ == "__main__":
+    main()
+
+##### ^ MAIN ^ #####
@@ -1,65 +1,502 @@
 import os
 import sqlite3
-import random
-import string
 import re
 import json
+import csv
+import hashlib
+import heapq
+import math
+import random
+import operator
+import itertools
+import collections
+import time
+import contextlib
+import cProfile
+import pstats
+import tracemalloc
+import argparse
+import mmap
+import pickle
+import queue
+import threading
+import sys
+import tempfile
+import traceback
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+
+##### v INSTRUMENTATION v #####
+
+
+class PipelineTrace:
+    """Collects per-stage wall time, row and relation counts, SQL statements, rejected inserts and notes as a JSON trace."""
+
+    __slots__ = ("stages", "rejections", "notes", "sql_statements", "profiler", "trace_memory", "started")
+
+    def __init__(self, profile=False, trace_memory=False):
+        self.stages = {}
+        self.rejections = {}
+        self.notes = []
+        self.sql_statements = 0
+        self.profiler = cProfile.Profile() if profile else None
+        self.trace_memory = trace_memory
+        self.started = time.perf_counter()
+        if self.profiler is not None:
+            self.profiler.enable()
+        if trace_memory:
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Times one run of a stage; repeated runs of the same stage are accumulated into one entry."""
+        entry = self.stages.setdefault(
+            name,
+            {"stage": name, "calls": 0, "seconds": 0.0, "rows_in": 0, "rows_out": 0, "relations_in": 0, "relations_out": 0, "sql_statements": 0},
+        )
+        statements = self.sql_statements
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            entry["calls"] += 1
+            entry["seconds"] += time.perf_counter() - start
+            entry["sql_statements"] += self.sql_statements - statements
+            if self.trace_memory:
+                entry["peak_memory_bytes"] = max(entry.get("peak_memory_bytes", 0), tracemalloc.get_traced_memory()[1])
+
+    def attach(self, conn):
+        """Counts every SQL statement the connection executes."""
+        conn.set_trace_callback(self.count_statement)
+
+    def count_statement(self, statement):
+        self.sql_statements += 1
+
+    def reject(self, table_name, reason, count=1):
+        """Records inserts that did not make it into a table, grouped by reason."""
+        if count:
+            reasons = self.rejections.setdefault(table_name, {})
+            reasons[reason] = reasons.get(reason, 0) + count
+
+    def note(self, message):
+        """Records a step that was skipped or changed, with the reason."""
+        self.notes.append(message)
+
+    def to_dict(self):
+        """Returns the trace as plain data."""
+        trace = {
+            "total_seconds": time.perf_counter() - self.started,
+            "sql_statements": self.sql_statements,
+            "stages": list(self.stages.values()),
+            "rejected_inserts": [
+                {"table": table_name, "reason": reason, "count": count}
+                for table_name, reasons in self.rejections.items()
+                for reason, count in reasons.items()
+            ],
+            "notes": self.notes,
+        }
+        if self.profiler is not None:
+            stats = pstats.Stats(self.profiler)
+            # Lists the functions with the most time spent in their own body
+            top = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:25]
+            trace["profile"] = [
+                {"function": f"{path}:{line}({name})", "calls": calls, "own_seconds": own, "cumulative_seconds": cumulative}
+                for (path, line, name), (_, calls, own, cumulative, _) in top
+            ]
+        return trace
 
+    def close(self, path=None):
+        """Stops the profiling hooks and writes the trace to path, if given."""
+        if self.profiler is not None:
+            self.profiler.disable()
+        trace = self.to_dict()
+        if self.trace_memory:
+            tracemalloc.stop()
+        if path:
+            with open(path, "w") as f:
+                json.dump(trace, f, indent=2)
+        return trace
 
+
+##### ^ INSTRUMENTATION ^ #####
 ##### v INPUT PARSER v #####
 
 
+# Matches items within {}s to detect where multivalued items are
+RECORD_TOKENIZER = re.compile(r"\{[^}]*\}|\S+")
+INPUT_CHUNK_SIZE = 1 << 20
+
+
+def parse_headers(line):
+    """Extracts the attribute names from the header line."""
+    return [header.strip('"') for header in line.split()]
+
+
+def parse_record(line):
+    """Splits a single input line into its fields, removing the braces around multi-valued items."""
+    parsed_record = []
+    for item in RECORD_TOKENIZER.findall(line):
+        if item.startswith("{") and item.endswith("}"):
+            parsed_record.append(item[1:-1])  # Removes braces without splitting
+        else:
+            parsed_record.append(item)
+    return parsed_record
+
+
 def parse_input(input_data):
     """Parses input data to extract relevant attributes and functional dependencies."""
     lines = input_data.strip().split("\n")
-    headers = lines[0].split()
-    headers = [header.strip('"') for header in headers]
-    records = []
-
-    for line in lines[1:]:
-        # Matches items within {}s to detect where multivalued items are
-        record = re.findall(r"\{[^}]*\}|\S+", line)
-        parsed_record = []
-
-        for item in record:
-            if item.startswith("{") and item.endswith("}"):
-                values = item[1:-1]  # Removes braces without splitting
-                parsed_record.append(values)
-            else:
-                parsed_record.append(item)
-
-        records.append(parsed_record)
+    headers = parse_headers(lines[0])
+    records = [parse_record(line) for line in lines[1:]]
     return headers, records
 
 
+def iter_records(file, chunk_size=INPUT_CHUNK_SIZE):
+    """Yields parsed records from an open file handle, reading it in fixed-size chunks."""
+    pending = ""
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        lines = (pending + chunk).split("\n")
+        # The last piece may be a partial line, so it is carried over to the next chunk
+        pending = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield parse_record(line)
+    if pending.strip():
+        yield parse_record(pending)
+
+
+def stream_input(file, chunk_size=INPUT_CHUNK_SIZE):
+    """Streaming counterpart of parse_input: returns the headers and a generator of parsed records."""
+    headers = parse_headers(file.readline())
+    return headers, iter_records(file, chunk_size)
+
+
+class InputStream:
+    """Re-iterable view of an input file; each iteration streams the records from disk again."""
+
+    def __init__(self, path, chunk_size=INPUT_CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        with open(path, "r") as file:
+            self.headers = parse_headers(file.readline())
+
+    def __iter__(self):
+        with open(self.path, "r") as file:
+            _, records = stream_input(file, self.chunk_size)
+            yield from records
+
+
+# Captures the inside of a braced item in the first group and a plain item in the second
+RECORD_TOKENIZER_BYTES = re.compile(rb"\{([^}]*)\}|(\S+)")
+
+
+def split_ranges(buffer, parts, start=0):
+    """Splits buffer[start:] into up to parts byte ranges that each begin and end on a line boundary."""
+    end = len(buffer)
+    size = max((end - start) // max(parts, 1), 1)
+    ranges = []
+    while start < end:
+        cut = buffer.find(b"\n", min(start + size, end - 1))
+        cut = end if cut < 0 else cut + 1
+        ranges.append((start, cut))
+        start = cut
+    return ranges
+
+
+def iter_mapped_records(buffer, start, end, columns=None, width=None):
+    """Yields the records of buffer[start:end], decoding only the selected columns.
+
+    With columns, each line is tokenized on the mapped bytes and lines that do not have width fields
+    are skipped; without columns every field is needed and each line is decoded once and parsed."""
+    tokenize = RECORD_TOKENIZER_BYTES.findall
+    position = start
+    while position < end:
+        line_end = buffer.find(b"\n", position, end)
+        if line_end < 0:
+            line_end = end
+        if columns is None:
+            # Every field is needed, so decoding the line once is cheaper than decoding field by field
+            record = parse_record(buffer[position:line_end].decode())
+            position = line_end + 1
+            if record:
+                yield record
+            continue
+        tokens = tokenize(buffer, position, line_end)
+        position = line_end + 1
+        if len(tokens) == width:
+            yield [(tokens[index][0] or tokens[index][1]).decode() for index in columns]
+
+
+class MappedInput:
+    """Re-iterable, memory-mapped view of an input file; records are tokenized directly on the mapped bytes."""
+
+    def __init__(self, path, columns=None):
+        self.path = path
+        with open(path, "rb") as file:
+            self.headers = parse_headers(file.readline().decode())
+            self.data_start = file.tell()
+        self.width = len(self.headers)
+        # Projects onto the named columns, decoding only those fields
+        self.columns = None
+        if columns is not None:
+            self.columns = [self.headers.index(col) for col in columns]
+            self.headers = list(columns)
+
+    def map(self, file):
+        """Maps the file read-only; empty files get an empty buffer since they cannot be mapped."""
+        if os.fstat(file.fileno()).st_size == 0:
+            return contextlib.nullcontext(b"")
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def ranges(self, parts):
+        """Splits the records into byte ranges at line boundaries, so each range can be parsed on its own."""
+        with open(self.path, "rb") as file, self.map(file) as buffer:
+            return split_ranges(buffer, parts, self.data_start)
+
+    def iter_range(self, start, end):
+        """Yields the records of one byte range."""
+        with open(self.path, "rb") as file, self.map(file) as buffer:
+            yield from iter_mapped_records(buffer, start, end, self.columns, self.width)
+
+    def __iter__(self):
+        with open(self.path, "rb") as file, self.map(file) as buffer:
+            yield from iter_mapped_records(buffer, self.data_start, len(buffer), self.columns, self.width)
+
+
+def map_input(path, columns=None):
+    """Memory-mapped counterpart of parse_input: returns the headers and a re-iterable of parsed records."""
+    records = MappedInput(path, columns)
+    return records.headers, records
+
+
 ##### ^ INPUT PARSER ^ #####
+##### v RECORD STORE v #####
+
+
+class ColumnStore:
+    """Columnar record store: one array of integer codes and one string dictionary per column."""
+
+    __slots__ = ("headers", "positions", "codes", "dictionaries", "lookups", "skipped_rows")
+
+    def __init__(self, headers):
+        self.headers = list(headers)
+        self.positions = {header: index for index, header in enumerate(self.headers)}
+        self.codes = [array("I") for _ in self.headers]
+        self.dictionaries = [[] for _ in self.headers]  # code -> value
+        self.lookups = [{} for _ in self.headers]  # value -> code
+        self.skipped_rows = 0
+
+    @classmethod
+    def from_records(cls, headers, records):
+        """Builds a store from any iterable of records without materializing them as lists."""
+        store = cls(headers)
+        store.extend(records)
+        return store
+
+    def append(self, record):
+        """Encodes one record, adding unseen values to the column dictionaries."""
+        if len(record) != len(self.headers):
+            self.skipped_rows += 1  # Skips malformed rows rather than guessing their alignment
+            return
+        for value, column, dictionary, lookup in zip(record, self.codes, self.dictionaries, self.lookups):
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(dictionary)
+                dictionary.append(value)
+            column.append(code)
+
+    def extend(self, records):
+        """Encodes every record of an iterable."""
+        for record in records:
+            self.append(record)
+
+    def __len__(self):
+        return len(self.codes[0]) if self.codes else 0
+
+    def __iter__(self):
+        """Yields the records decoded back into lists of strings, for code that expects row lists."""
+        for row in zip(*self.codes):
+            yield [dictionary[code] for dictionary, code in zip(self.dictionaries, row)]
+
+    def extend_encoded(self, dictionaries, codes, skipped_rows=0):
+        """Appends rows encoded by another store, translating its codes into this store's dictionaries."""
+        for column, dictionary, lookup, shard_dictionary, shard_codes in zip(
+            self.codes, self.dictionaries, self.lookups, dictionaries, codes
+        ):
+            remap = []
+            for value in shard_dictionary:
+                code = lookup.get(value)
+                if code is None:
+                    code = lookup[value] = len(dictionary)
+                    dictionary.append(value)
+                remap.append(code)
+            column.extend(array("I", map(remap.__getitem__, shard_codes)))
+        self.skipped_rows += skipped_rows
+
+    def column(self, header):
+        """Returns the code array of a column."""
+        return self.codes[self.positions[header]]
+
+    def project(self, columns):
+        """Returns a view of the store restricted to the given columns."""
+        return Projection(self, columns)
+
+
+class Projection:
+    """Read-only view of some columns of a ColumnStore; rows are produced as tuples of codes without copying."""
+
+    __slots__ = ("store", "columns", "indexes")
+
+    def __init__(self, store, columns):
+        self.store = store
+        self.columns = list(columns)
+        self.indexes = [store.positions[col] for col in self.columns]
+
+    def __len__(self):
+        return len(self.store)
+
+    def __iter__(self):
+        return zip(*(self.store.codes[index] for index in self.indexes))
+
+    def group_by(self, columns):
+        """Groups the projected rows by the codes of the given columns, returning row numbers per group."""
+        keys = zip(*(self.store.column(col) for col in columns))
+        groups = {}
+        for row, key in enumerate(keys):
+            groups.setdefault(key, array("I")).append(row)
+        return groups
+
+    def distinct(self):
+        """Returns the distinct projected rows as code tuples, in first-seen order."""
+        return dict.fromkeys(self)
+
+    def decode(self, row):
+        """Converts a tuple of codes of this projection back into its string values."""
+        dictionaries = self.store.dictionaries
+        return tuple(dictionaries[index][code] for index, code in zip(self.indexes, row))
+
+
+##### ^ RECORD STORE ^ #####
 ##### v FINAL RELATION GENERATOR v #####
 
 
-def create_normalized_tables(cursor, normalized_relations):
+RECONSTRUCTED_VIEW = "CoffeeShop_reconstructed"
+
+
+def create_normalized_tables(cursor, normalized_relations, trace=None):
     """Creates normalized tables in the database based on the provided relations."""
-    for relation in normalized_relations:
-        table_name = relation["table_name"]
-        columns = relation["columns"]
-        # Ensures primary keys are valid columns
-        primary_keys = relation.get("primary_key", [])
-        for pk in primary_keys:
-            if pk not in columns:
-                columns.append(pk)
-        # Defines column definitions without PRIMARY KEY individually
-        columns_definition = ", ".join([f"{col} TEXT" for col in columns])
-        # If primary keys are defined, adds them as a single PRIMARY KEY constraint
-        if primary_keys:
-            columns_definition += f", PRIMARY KEY ({', '.join(primary_keys)})"
-        # Generates the CREATE TABLE query
-        create_table_query = (
-            f"CREATE TABLE IF NOT EXISTS {table_name} ({columns_definition});"
-        )
+    trace = trace or PipelineTrace()
+    with trace.stage("create_tables") as entry:
+        entry["relations_in"] += len(normalized_relations)
+        references = foreign_keys(normalized_relations)
+        for relation in normalized_relations:
+            create_table(cursor, relation, table_references(references, relation))
+            entry["relations_out"] += 1
+
+
+def foreign_keys(normalized_relations):
+    """Finds the tables that hold another table's primary key, as (child table, key columns, parent table) triples."""
+    references = []
+    for child in normalized_relations:
+        for parent in normalized_relations:
+            key = parent.get("primary_key", [])
+            # Tables sharing the same key would reference each other, so only strictly different keys count
+            if parent is child or not key or set(key) == set(child.get("primary_key", [])):
+                continue
+            if set(key) <= set(child["columns"]):
+                references.append((child["table_name"], list(key), parent["table_name"]))
+    return references
+
+
+def create_table(cursor, relation, references=()):
+    """Creates the table of a single normalized relation, declaring a foreign key for every (columns, parent table) reference."""
+    columns = relation["columns"]
+    # Ensures primary keys are valid columns
+    for pk in relation.get("primary_key", []):
+        if pk not in columns:
+            columns.append(pk)
+    cursor.execute(table_ddl(relation, references))
+
+
+def table_ddl(relation, references=()):
+    """Returns the CREATE TABLE statement of a normalized relation, with its primary and foreign keys."""
+    table_name = relation["table_name"]
+    primary_keys = relation.get("primary_key", [])
+    columns = list(relation["columns"]) + [pk for pk in primary_keys if pk not in relation["columns"]]
+    # Defines column definitions without PRIMARY KEY individually
+    columns_definition = ", ".join([f"{col} TEXT" for col in columns])
+    # If primary keys are defined, adds them as a single PRIMARY KEY constraint
+    if primary_keys:
+        columns_definition += f", PRIMARY KEY ({', '.join(primary_keys)})"
+    for key, parent in references:
+        columns_definition += f", FOREIGN KEY ({', '.join(key)}) REFERENCES {parent} ({', '.join(key)})"
+    # Generates the CREATE TABLE query
+    create_table_query = (
+        f"CREATE TABLE IF NOT EXISTS {table_name} ({columns_definition});"
+    )
+    return create_table_query
+
+
+def schema_ddl(normalized_relations):
+    """Returns the CREATE TABLE statements create_normalized_tables would run, in the same order."""
+    references = foreign_keys(normalized_relations)
+    return [table_ddl(relation, table_references(references, relation)) for relation in normalized_relations]
+
+
+def table_references(references, relation):
+    """Selects the (key columns, parent table) references of one relation from the foreign_keys triples."""
+    return [(key, parent) for child, key, parent in references if child == relation["table_name"]]
+
+
+def create_join_indexes(conn, normalized_relations, trace=None):
+    """Indexes every column group a table shares with other tables, unless its primary key already covers it.
+
+    Runs after the bulk load so the rows are not inserted into the indexes one at a time."""
+    trace = trace or PipelineTrace()
+    with trace.stage("create_indexes") as entry:
+        cursor = conn.cursor()
+        references = foreign_keys(normalized_relations)
+        for relation in normalized_relations:
+            table_name = relation["table_name"]
+            primary_key = list(relation.get("primary_key", []))
+            others = {col for other in normalized_relations if other is not relation for col in other["columns"]}
+            # Foreign keys are indexed as a group, the remaining shared columns one by one
+            groups = [key for child, key, _ in references if child == table_name]
+            grouped = {col for key in groups for col in key}
+            groups.extend([col] for col in relation["columns"] if col in others and col not in grouped)
+            for columns in dict.fromkeys(tuple(group) for group in groups):
+                if list(columns) == primary_key[: len(columns)]:
+                    continue  # The primary key index already starts with these columns
+                index_name = generate_table_name(f"{table_name}_join", columns)
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({', '.join(columns)})")
+                entry["relations_out"] += 1
+        conn.commit()
 
-        cursor.execute(create_table_query)
 
+def create_reconstructed_view(conn, normalized_relations, headers, view_name=RECONSTRUCTED_VIEW, trace=None):
+    """Creates a view that natural-joins the tables back into the original columns; returns False if they cannot be chained."""
+    reason = join_limit_reason(normalized_relations)
+    if reason is not None:
+        if trace is not None:
+            trace.note(f"{view_name} view skipped: {reason}")
+        return False
+    query = natural_join_query(normalized_relations, headers)
+    if query is None:
+        return False
+    cursor = conn.cursor()
+    cursor.execute(f"DROP VIEW IF EXISTS {view_name}")
+    cursor.execute(f"CREATE VIEW {view_name} AS {query}")
+    conn.commit()
+    return True
 
-def insert_data(cursor, table_name, columns, data, headers):
+
+def insert_data(cursor, table_name, columns, data, headers, trace=None):
     """Inserts data into the specified normalized table, matching columns to the correct values dynamically."""
     # Filters data to match the columns
     filtered_data = [data[headers.index(col)] for col in columns if col in headers]
@@ -81,476 +518,3734 @@ def insert_data(cursor, table_name, columns, data, headers):
                 cursor.execute(select_query, (filtered_data[columns.index(pk)],))
                 count = cursor.fetchone()[0]
                 if count > 0:
+                    if trace is not None:
+                        trace.reject(table_name, f"{pk} already exists")
                     return  # Exits if the primary key already exists
 
         # If no primary key constraints are violated, execute the insert
         cursor.execute(insert_query, filtered_data)
-    except sqlite3.IntegrityError as e:
-        print("")
-    except sqlite3.OperationalError as e:
-        print("")
+    except (sqlite3.IntegrityError, sqlite3.OperationalError) as e:
+        # Records why the row was rejected instead of discarding the error
+        if trace is not None:
+            trace.reject(table_name, f"{type(e).__name__}: {e}")
 
 
-##### ^ FINAL RELATION GENERATOR ^ #####
-##### v NORMALIZER SEGMENTS v #####
+# Load-time settings: the database is rebuilt from the input files, so durability is traded for speed
+BULK_LOAD_PRAGMAS = (
+    "PRAGMA journal_mode = MEMORY",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",
+)
+BULK_BATCH_SIZE = 10000
 
 
-def generate_random_table_name(prefix):
-    """Generates a random table name with a given prefix."""
-    """Used for dynamically creating new tables as the program runs."""
-    return f"{prefix}_{''.join(random.choices(string.ascii_lowercase + string.digits, k=10))}"
+def make_projector(indexes):
+    """Returns a function that projects a record onto the given column indexes as a tuple."""
+    if len(indexes) == 1:
+        index = indexes[0]
+        return lambda record: (record[index],)
+    return operator.itemgetter(*indexes)
 
-# Beginning of normilization
-def ensure_1nf(relation, records):
-    """Ensures the relation is in 1NF by flattening any multi-valued columns."""
-    decomposed_relations = []
-    table_name = relation["table_name"]
-    headers = relation["columns"]
-    # Iterates through each record and identify multi-valued fields
-    for record in records:
-        # Keeps track of how many new records we need to create
-        new_records = [record]
-        for index, value in enumerate(record):
-            if "," in value:  # Check if the value is multi-valued
-                # Splits the value by comma and create new records
-                split_values = value.split(",")
-                # Creates new records for each split value
-                new_records = [
-                    record[:index] + [v.strip()] + record[index + 1 :]
-                    for v in split_values
-                ]
-                break
 
-        # Adds the new records to the decomposed relations
-        decomposed_relations.extend(new_records)
-    # Creates a new table name for the normalized relation
-    new_table_name = generate_random_table_name(f"CoffeeShop_1NF")
-    # Defines the structure of the new table based on headers
-    new_relation = {
-        "table_name": new_table_name,
-        "columns": headers,
-        "records": decomposed_relations,
-    }
-    # Returns a list containing the new relation to match expected structure
-    return [new_relation]  # Returns as a list
+# Appending to an existing database keeps the journal so an interrupted load cannot corrupt the history
+APPEND_LOAD_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",
+)
+CONFLICT_MODES = ("skip", "update")
 
 
-def ensure_2nf(relation, fds):
-    """Ensures the relation is in 2NF by decomposing into relations with partial dependencies."""
-    decomposed_relations = []
+def build_insert_query(relation, columns, on_conflict="skip"):
+    """Builds the INSERT statement for a relation, skipping or updating rows whose primary key already exists."""
     table_name = relation["table_name"]
-    primary_key = set(relation.get("primary_key", []))  # Safely gets primary key
-    decomposed_columns = set()
-
-    for fd in fds:
-        lhs = set(fd["lhs"])
-        rhs = fd["rhs"]
+    placeholders = ", ".join("?" for _ in columns)
+    primary_key = [col for col in relation.get("primary_key", []) if col in columns]
+    updates = [col for col in columns if col not in primary_key]
+    if on_conflict == "update" and primary_key and updates:
+        assignments = ", ".join(f"{col} = excluded.{col}" for col in updates)
+        return (
+            f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders}) "
+            f"ON CONFLICT ({', '.join(primary_key)}) DO UPDATE SET {assignments}"
+        )
+    # Rows whose declared primary key already exists are skipped by SQLite itself
+    return f"INSERT OR IGNORE INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})"
 
-        if lhs.issubset(primary_key) and lhs != primary_key:
-            new_relation_name = generate_random_table_name(f"CoffeeShop_2NF")
-            decomposed_relations.append(
-                {
-                    "table_name": new_relation_name,
-                    "columns": list(lhs.union(rhs)),
-                    "primary_key": list(lhs),
-                }
-            )
-            decomposed_columns.update(lhs.union(rhs))
 
-    remaining_columns = [
-        col for col in relation["columns"] if col not in decomposed_columns
-    ]
-    if remaining_columns:
-        decomposed_relations.append(
-            {
-                "table_name": table_name,
-                "columns": remaining_columns,
-                "primary_key": list(
-                    primary_key
-                ),  # Ensures primary key is added to remaining columns
-            }
-        )
+DEDUP_MAX_ROWS = 1_000_000  # Distinct rows per relation kept in memory before a sorted run is spilled to disk
+DEDUP_MERGE_FAN_IN = 64  # Runs merged into one once this many have been spilled
+SPILL_BLOCK_ROWS = 10_000
 
-    return decomposed_relations if decomposed_relations else [relation]
 
+def write_run(file, rows):
+    """Writes rows to a run file in pickled blocks."""
+    rows = iter(rows)
+    for block in iter(lambda: list(itertools.islice(rows, SPILL_BLOCK_ROWS)), []):
+        pickle.dump(block, file, pickle.HIGHEST_PROTOCOL)
 
-def is_superkey(lhs, relation):
-    """Checks if the given left-hand side is a superkey in the relation."""
-    candidate_keys = relation.get("candidate_keys", [])
-    return set(lhs) == set(relation["primary_key"]) or any(
-        set(lhs) == set(candidate_key) for candidate_key in candidate_keys
-    )
 
+def read_run(file):
+    """Yields the rows of a run file from the start."""
+    file.seek(0)
+    while True:
+        try:
+            block = pickle.load(file)
+        except EOFError:
+            return
+        yield from block
 
-def ensure_3nf(relation, fds):
-    """Ensures the relation is in 3NF by removing transitive dependencies."""
-    decomposed_relations = []
-    table_name = relation["table_name"]
-    decomposed_columns = set()
 
-    for fd in fds:
-        lhs = fd["lhs"]
-        rhs = fd["rhs"]
+def unique_sorted(pairs):
+    """Keeps the first (row, sequence) pair of each row from pairs sorted by row and then by sequence."""
+    return map(next, map(operator.itemgetter(1), itertools.groupby(pairs, operator.itemgetter(0))))
 
-        if not is_superkey(lhs, relation) and any(
-            attr not in relation["primary_key"] for attr in rhs
-        ):
-            new_relation_name = generate_random_table_name(f"CoffeeShop_3NF")
-            decomposed_relations.append(
-                {
-                    "table_name": new_relation_name,
-                    "columns": lhs + rhs,
-                    "primary_key": lhs,
-                }
-            )
-            decomposed_columns.update(lhs + rhs)
 
-    remaining_columns = [
-        col for col in relation["columns"] if col not in decomposed_columns
-    ]
-    if remaining_columns:
-        decomposed_relations.append(
-            {
-                "table_name": table_name,
-                "columns": remaining_columns,
-                "primary_key": relation["primary_key"],
-            }
-        )
+def sequence_order(pairs, max_rows=DEDUP_MAX_ROWS, directory=None):
+    """Yields the rows of (row, sequence) pairs in sequence order, sorting at most max_rows pairs in memory at a time."""
+    by_sequence = operator.itemgetter(1)
+    runs = []
+    try:
+        for block in iter(lambda: sorted(itertools.islice(pairs, max_rows), key=by_sequence), []):
+            if not runs and len(block) < max_rows:
+                # Everything fitted in one block, so nothing needs to go to disk
+                yield from map(operator.itemgetter(0), block)
+                return
+            run = tempfile.TemporaryFile(dir=directory)
+            write_run(run, block)
+            runs.append(run)
+            if len(runs) >= DEDUP_MERGE_FAN_IN:
+                merged = tempfile.TemporaryFile(dir=directory)
+                write_run(merged, heapq.merge(*map(read_run, runs), key=by_sequence))
+                for run in runs:
+                    run.close()
+                runs = [merged]
+        yield from map(operator.itemgetter(0), heapq.merge(*map(read_run, runs), key=by_sequence))
+    finally:
+        for run in runs:
+            run.close()
 
-    return decomposed_relations if decomposed_relations else [relation]
 
+class SpillingSet:
+    """Set of projected rows bounded in memory that spills sorted runs to temporary files when it fills.
 
-def ensure_bcnf(relation, fds):
-    """Ensures the relation is in BCNF by removing violations of the BCNF definition."""
-    decomposed_relations = []
-    table_name = relation["table_name"]
-    primary_key = set(relation["primary_key"])
-    all_columns = set(relation["columns"])
+    Every row is stored with the position at which it was first seen. Iterating merges the runs and the rows
+    still in memory with a k-way merge that keeps the earliest position of each row, then sorts the distinct
+    rows back by that position, so they always come out in first-seen order whether or not anything spilled."""
 
-    for fd in fds:
-        lhs = set(fd["lhs"])
-        rhs = set(fd["rhs"])
+    __slots__ = ("max_rows", "directory", "rows", "order", "runs", "spills")
 
-        # Checks for BCNF violation
-        if not is_superkey(fd["lhs"], relation):
-            new_relation_name = generate_random_table_name(f"CoffeeShop_BCNF")
-            # Creates a new relation that contains the lhs and rhs
-            decomposed_relations.append(
-                {
-                    "table_name": new_relation_name,
-                    "columns": list(lhs.union(rhs)),
-                    "primary_key": list(lhs),
-                }
-            )
-            # Removes the rhs from the original relation
-            all_columns -= rhs
+    def __init__(self, max_rows=DEDUP_MAX_ROWS, directory=None):
+        self.max_rows = max_rows
+        self.directory = directory
+        self.rows = {}  # row -> the position at which it was first seen
+        self.order = itertools.count()
+        self.runs = []
+        self.spills = 0
 
-    if all_columns:
-        decomposed_relations.append(
-            {
-                "table_name": table_name,
-                "columns": list(all_columns),
-                "primary_key": relation["primary_key"],
-            }
-        )
+    def update(self, rows):
+        """Adds a batch of rows, spilling once the in-memory rows reach max_rows (so memory holds at most one batch more)."""
+        # setdefault keeps the first position of a row that is already in memory
+        collections.deque(map(self.rows.setdefault, rows, self.order), maxlen=0)
+        if len(self.rows) >= self.max_rows:
+            self.spill()
 
-    return decomposed_relations if decomposed_relations else [relation]
+    def spill(self):
+        """Writes the in-memory rows to a new run sorted by row and empties the memory."""
+        run = tempfile.TemporaryFile(dir=self.directory)
+        write_run(run, sorted(self.rows.items()))
+        self.rows = {}
+        self.runs.append(run)
+        self.spills += 1
+        if len(self.runs) >= DEDUP_MERGE_FAN_IN:
+            # Merges the runs into one so the number of open files stays bounded
+            merged = tempfile.TemporaryFile(dir=self.directory)
+            write_run(merged, unique_sorted(heapq.merge(*map(read_run, self.runs))))
+            self.close()
+            self.runs = [merged]
 
+    def __iter__(self):
+        if not self.runs:
+            yield from self.rows
+            return
+        pairs = unique_sorted(heapq.merge(sorted(self.rows.items()), *map(read_run, self.runs)))
+        yield from sequence_order(pairs, self.max_rows, self.directory)
 
-def validate_mvd(records, lhs, rhs, headers):
-    """Validates the given MVD by checking for independent value sets in the records."""
-    if headers is None:
-        return False
-    if lhs is None or rhs is None:
-        return False  # Returns early if there's a problem
+    def __len__(self):
+        """Counts the distinct rows, merging the runs without restoring their first-seen order."""
+        if not self.runs:
+            return len(self.rows)
+        return sum(1 for _ in unique_sorted(heapq.merge(sorted(self.rows.items()), *map(read_run, self.runs))))
 
-    lhs = list(lhs)  # Converts to list for indexing
-    rhs = list(rhs)
+    def close(self):
+        """Deletes the spilled runs."""
+        for run in self.runs:
+            run.close()
+        self.runs = []
 
-    # Ensures all lhs headers exist in headers
-    for header in lhs:
-        if header not in headers:
-            return False
 
-    lhs_values = {}
+def bulk_load(
+    conn,
+    normalized_relations,
+    records,
+    headers,
+    batch_size=BULK_BATCH_SIZE,
+    on_conflict="skip",
+    pragmas=BULK_LOAD_PRAGMAS,
+    trace=None,
+    dedup_rows=DEDUP_MAX_ROWS,
+    spill_dir=None,
+):
+    """Loads the records into every normalized table in one pass using batched, deduplicated inserts.
 
-    for record in records:
-        try:
-            lhs_key = tuple(record[headers.index(header)] for header in lhs)
-            rhs_value = tuple(record[headers.index(header)] for header in rhs)
+    Streamed records are deduplicated per relation in a SpillingSet holding at most dedup_rows rows in
+    memory, with the sorted runs spilled into spill_dir (the system temporary directory by default)."""
+    if on_conflict not in CONFLICT_MODES:
+        raise ValueError(f"Unknown conflict mode '{on_conflict}'; expected one of {CONFLICT_MODES}")
+    trace = trace or PipelineTrace()
+    with trace.stage("load") as entry:
+        inserted, rows_read, spills = _bulk_load(
+            conn, normalized_relations, records, headers, batch_size, on_conflict, pragmas, trace, dedup_rows, spill_dir
+        )
+        if spills:
+            entry["spilled_runs"] = entry.get("spilled_runs", 0) + spills
+        entry["relations_in"] += len(normalized_relations)
+        entry["relations_out"] += len(inserted)
+        entry["rows_in"] += rows_read
+        entry["rows_out"] += sum(inserted.values())
+    return inserted
 
-            if lhs_key in lhs_values:
-                lhs_values[lhs_key].add(rhs_value)
-            else:
-                lhs_values[lhs_key] = {rhs_value}
-        except ValueError as e:
-            continue
 
-    # Check if each lhs_key has multiple independent rhs values
-    for values in lhs_values.values():
-        if len(values) > 1:
-            return True
+def distinct_projections(normalized_relations, records, headers, batch_size=BULK_BATCH_SIZE, dedup_rows=DEDUP_MAX_ROWS, spill_dir=None):
+    """Returns (relation, columns, rows) for every relation with columns in the input, and the number of records read.
 
-    return False
+    Each rows value is an iterable of the relation's distinct projected rows. A ColumnStore is deduplicated
+    lazily on its integer codes, one relation at a time; streamed records are read once into a SpillingSet
+    per relation, which the caller closes with close_projections."""
+    projections = []
+    for relation in normalized_relations:
+        columns = [col for col in relation["columns"] if col in headers]
+        if columns:
+            projections.append((relation, columns))
 
+    if isinstance(records, ColumnStore):
 
-def ensure_4nf(relation, mvds, records):
-    """Ensures the relation is in 4NF by validating multi-valued dependencies and decomposing as necessary."""
-    decomposed_relations = []
-    table_name = relation["table_name"]
-    all_columns = set(relation["columns"])
-    headers = relation["columns"]
+        def decoded(columns):
+            projection = records.project(columns)
+            # Dedupes the projection on its integer codes and decodes only the distinct rows
+            return map(projection.decode, projection.distinct())
 
-    for mvd in mvds:
-        if "lhs" not in mvd or "rhs" not in mvd:
-            continue  # Skips if missing data
+        return [(relation, columns, decoded(columns)) for relation, columns in projections], len(records)
 
-        lhs = set(mvd["lhs"])  # Ensures these are sets for uniqueness
-        rhs = set(mvd["rhs"])
+    sets = [SpillingSet(dedup_rows, spill_dir) for _ in projections]
+    projectors = [make_projector([headers.index(col) for col in columns]) for _, columns in projections]
+    rows_read = 0
+    try:
+        iterator = iter(records)
+        for chunk in iter(lambda: list(itertools.islice(iterator, batch_size)), []):
+            rows_read += len(chunk)
+            # Duplicate projections are dropped before any sink sees them, spilling to disk if needed
+            for projector, seen in zip(projectors, sets):
+                seen.update(map(projector, chunk))
+    except BaseException:
+        for seen in sets:
+            seen.close()
+        raise
+    return [(relation, columns, seen) for (relation, columns), seen in zip(projections, sets)], rows_read
 
-        # Checks if this MVD is valid by analyzing actual records
-        if validate_mvd(records, lhs, rhs, headers):
-            new_relation_name_lhs = generate_random_table_name(f"CoffeeShop_4NF_lhs")
-            new_relation_name_rhs = generate_random_table_name(f"CoffeeShop_4NF_rhs")
 
-            decomposed_relations.append(
-                {
-                    "table_name": new_relation_name_lhs,
-                    "columns": list(lhs.union(relation["primary_key"])),
-                    "primary_key": list(relation["primary_key"]),
-                }
-            )
-            decomposed_relations.append(
-                {
-                    "table_name": new_relation_name_rhs,
-                    "columns": list(rhs.union(relation["primary_key"])),
-                    "primary_key": list(relation["primary_key"]),
-                }
-            )
-            all_columns -= rhs  # Removes rhs from the original relation
+def close_projections(projections):
+    """Deletes the runs spilled by distinct_projections and returns how many there were."""
+    spills = 0
+    for _, _, rows in projections:
+        if isinstance(rows, SpillingSet):
+            spills += rows.spills
+            rows.close()
+    return spills
 
-    # Adds remaining columns as a new relation
-    if all_columns:
-        decomposed_relations.append(
-            {
-                "table_name": table_name,
-                "columns": list(all_columns),
-                "primary_key": relation["primary_key"],
-            }
-        )
 
-    return decomposed_relations if decomposed_relations else [relation]
+def _bulk_load(conn, normalized_relations, records, headers, batch_size, on_conflict, pragmas, trace, dedup_rows, spill_dir):
+    """Runs the batched load and returns the inserted counts per table, the number of records read and the runs spilled."""
+    cursor = conn.cursor()
+    # PRAGMAs such as journal_mode cannot be changed inside an open transaction
+    if conn.in_transaction:
+        conn.commit()
+    for pragma in pragmas:
+        cursor.execute(pragma)
 
+    projections, rows_read = distinct_projections(normalized_relations, records, headers, batch_size, dedup_rows, spill_dir)
+    inserted = {relation["table_name"]: 0 for relation, _, _ in projections}
 
-def find_join_dependencies(records, columns):
-    """Identifies join dependencies that exist within the data."""
-    join_deps = []
-    # This function will analyze records to determine JDs that can be applied
-    # Placeholder logic - to be defined based on specific criteria for JDs
+    def flush(table_name, insert_query, batch):
+        cursor.executemany(insert_query, batch)
+        inserted[table_name] += cursor.rowcount
+        if on_conflict == "skip":
+            trace.reject(table_name, "primary key already exists", len(batch) - cursor.rowcount)
+        batch.clear()
 
-    return join_deps
+    cursor.execute("BEGIN")
+    try:
+        # Each table is loaded once from its distinct rows
+        for relation, columns, rows in projections:
+            table_name, insert_query, batch = relation["table_name"], build_insert_query(relation, columns, on_conflict), []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    flush(table_name, insert_query, batch)
+            if batch:
+                flush(table_name, insert_query, batch)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    finally:
+        spills = close_projections(projections)
+    return inserted, rows_read, spills
 
 
-def ensure_5nf(relation, records):
-    """Ensure the relation is in 5NF by handling join dependencies and decomposing as necessary."""
-    decomposed_relations = []
-    table_name = relation["table_name"]
-    primary_key = set(relation["primary_key"])
-    all_columns = set(relation["columns"])
+##### ^ FINAL RELATION GENERATOR ^ #####
+##### v INCREMENTAL LOAD v #####
 
-    # Identifies join dependencies by analyzing the data in records
-    join_deps = find_join_dependencies(records, relation["columns"])
 
-    for jd in join_deps:
-        lhs = set(jd["lhs"])
-        rhs = set(jd["rhs"])
+META_TABLE = "_normalizer_meta"
 
-        if not is_superkey(lhs, relation):
-            # Creates new relations based on JD decomposition
-            new_relation_name_lhs = generate_random_table_name(f"CoffeeShop_5NF_lhs")
-            new_relation_name_rhs = generate_random_table_name(f"CoffeeShop_5NF_rhs")
 
-            decomposed_relations.append(
-                {
-                    "table_name": new_relation_name_lhs,
-                    "columns": list(lhs.union(relation["primary_key"])),
-                    "primary_key": list(lhs),
-                }
-            )
-            decomposed_relations.append(
-                {
-                    "table_name": new_relation_name_rhs,
-                    "columns": list(rhs.union(relation["primary_key"])),
-                    "primary_key": list(rhs),
-                }
-            )
-            all_columns -= rhs  # Remove rhs from the original relation
+def save_schema_metadata(conn, normalized_relations, fds, headers):
+    """Stores the decomposed schema, FDs and headers in the database so later runs can append to it."""
+    cursor = conn.cursor()
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {META_TABLE} (name TEXT PRIMARY KEY, value TEXT)")
+    schema = [
+        {"table_name": rel["table_name"], "columns": rel["columns"], "primary_key": rel.get("primary_key", [])}
+        for rel in normalized_relations
+    ]
+    cursor.executemany(
+        f"INSERT OR REPLACE INTO {META_TABLE} (name, value) VALUES (?, ?)",
+        [("relations", json.dumps(schema)), ("fds", json.dumps(fds)), ("headers", json.dumps(headers))],
+    )
+    conn.commit()
 
-    # If columns remain after JD decomposition, includes them as a separate relation
-    if all_columns:
-        decomposed_relations.append(
-            {
-                "table_name": table_name,
-                "columns": list(all_columns),
-                "primary_key": relation["primary_key"],
-            }
-        )
 
-    return decomposed_relations if decomposed_relations else [relation]
+def load_schema_metadata(conn):
+    """Returns the stored schema, FDs and headers, or None if the database was not built by the normalizer."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?", (META_TABLE,))
+    if cursor.fetchone() is None:
+        return None
+    cursor.execute(f"SELECT name, value FROM {META_TABLE}")
+    metadata = {name: json.loads(value) for name, value in cursor.fetchall()}
+    if "relations" not in metadata:
+        return None
+    # Verifies every stored relation still exists with the recorded columns
+    for relation in metadata["relations"]:
+        cursor.execute(f"PRAGMA table_info({relation['table_name']})")
+        existing = {row[1] for row in cursor.fetchall()}
+        if not set(relation["columns"]).issubset(existing):
+            return None
+    return metadata
 
 
-def normalize_relations(parsed_relations, fds, mvds=None, max_nf=6, records=None):
-    """Normalize relations up to the specified max normal form (1NF, 2NF, 3NF, BCNF, 4NF, or 5NF)."""
-    """Runs through normalizing stages up to the point that the user wants to normalze to (default=5NF)"""
-    all_relations = []
-    seen_tables = set()
-    print("Running Normalizer")
-    for table_name, relation in parsed_relations.items():
-
-        # Step 1: Ensures 1NF
-        relations_1nf = ensure_1nf(relation, records)
-        if max_nf == 1:
-            return relations_1nf
-
-        # Step 2: Ensures 2NF
-        for rel_1nf in relations_1nf:
-            relations_2nf = ensure_2nf(rel_1nf, fds)
-            if max_nf == 2:
-                all_relations.extend(
-                    rel_2nf
-                    for rel_2nf in relations_2nf
-                    if rel_2nf["table_name"] not in seen_tables
+def prepare_append_indexes(conn, normalized_relations, fds):
+    """Creates the indexes that let appended rows be deduplicated and FD-checked with indexed lookups."""
+    cursor = conn.cursor()
+    for relation in normalized_relations:
+        table_name = relation["table_name"]
+        if not relation.get("primary_key"):
+            # Tables without a key are deduplicated on all of their columns
+            try:
+                cursor.execute(
+                    f"CREATE UNIQUE INDEX IF NOT EXISTS {table_name}_rows ON {table_name} ({', '.join(relation['columns'])})"
                 )
-                seen_tables.update(rel["table_name"] for rel in relations_2nf)
-                return all_relations
-
-            # Step 3: Ensures 3NF
-            i = 0  # Initializes index for relations_2nf
-            while i < len(relations_2nf):
-                rel_2nf = relations_2nf[i]
-                relations_3nf = ensure_3nf(rel_2nf, fds)
-                j = 0  # Initializes index for relations_3nf
-                while j < len(relations_3nf):
-                    rel_3nf = relations_3nf[j]
-                    if rel_3nf["table_name"] not in seen_tables:
-                        all_relations.append(rel_3nf)
-                        seen_tables.add(rel_3nf["table_name"])
-                    j += 1  # Increments inner index
-                i += 1  # Increments outer index
-
-                # Step 4: Ensures BCNF if max_nf allows
-                if max_nf >= 4:
-                    relations_bcnf = ensure_bcnf(rel_3nf, fds)
-                    k = 0  # Initializes index for relations_bcnf
-                    while k < len(relations_bcnf):
-                        rel_bcnf = relations_bcnf[k]
-                        if rel_bcnf["table_name"] not in seen_tables:
-                            all_relations.append(rel_bcnf)
-                            seen_tables.add(rel_bcnf["table_name"])
-                        k += 1  # Increment index
-
-        # Step 5: Ensures 4NF if max_nf allows (independent of BCNF)
-        if max_nf >= 5:
-            i = 0  # Initializes index for relations_3nf
-            while i < len(relations_3nf):
-                rel_3nf = relations_3nf[i]
-                relations_4nf = ensure_4nf(rel_3nf, mvds, records)  # Pass headers here
-                j = 0  # Initializes index for relations_4nf
-                while j < len(relations_4nf):
-                    rel_4nf = relations_4nf[j]
-                    if rel_4nf["table_name"] not in seen_tables:
-                        all_relations.append(rel_4nf)
-                        seen_tables.add(rel_4nf["table_name"])
-                    j += 1  # Increments inner index
-                i += 1  # Increments outer index
-
-        # Step 6: Ensures 5NF if max_nf allows
-        if max_nf == 6:
-            relations_5nf = []
-            i = 0  # Initializes index for relations_4nf
-            while i < len(relations_4nf):
-                rel_4nf = relations_4nf[i]
-                relations_5nf.extend(ensure_5nf(rel_4nf, records))
-                i += 1  # Increments index
-
-            all_relations.extend(
-                rel for rel in relations_5nf if rel["table_name"] not in seen_tables
-            )
-            seen_tables.update(rel["table_name"] for rel in relations_5nf)
+            except sqlite3.IntegrityError:
+                print(f"Table {table_name} already holds duplicate rows; appended rows may repeat them")
+    for relation, lhs, _ in checkable_fds(normalized_relations, fds):
+        if set(lhs) != set(relation.get("primary_key", [])):
+            index_name = generate_table_name(f"{relation['table_name']}_fd", lhs)
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {relation['table_name']} ({', '.join(lhs)})")
+    conn.commit()
 
-    return all_relations
 
+def checkable_fds(normalized_relations, fds):
+    """Pairs each FD with a stored relation that holds all of its attributes, so it can be checked there."""
+    pairs = []
+    for fd in fds:
+        lhs = as_attribute_list(fd["lhs"])
+        rhs = [attr for attr in as_attribute_list(fd["rhs"]) if attr not in lhs]
+        if not lhs or not rhs:
+            continue
+        for relation in normalized_relations:
+            if set(lhs + rhs).issubset(relation["columns"]):
+                pairs.append((relation, lhs, rhs))
+                break
+    return pairs
 
-##### ^ NORMALIZER SEGMENTS ^ #####
-##### v MAIN v #####
+
+def check_fds_incremental(conn, normalized_relations, fds, records, headers):
+    """Checks a batch of new records against the stored FDs without rescanning the stored data."""
+    cursor = conn.cursor()
+    violations = []
+    for relation, lhs, rhs in checkable_fds(normalized_relations, fds):
+        lhs_project = make_projector([headers.index(col) for col in lhs])
+        rhs_project = make_projector([headers.index(col) for col in rhs])
+        # Collects the distinct RHS values each LHS value takes in the batch
+        batch_values = {}
+        for record in records:
+            batch_values.setdefault(lhs_project(record), {})[rhs_project(record)] = None
+        # Compares each distinct LHS value with the stored rows through the index on the LHS
+        select_query = (
+            f"SELECT {', '.join(rhs)} FROM {relation['table_name']} "
+            f"WHERE {' AND '.join(f'{col} = ?' for col in lhs)} LIMIT 1"
+        )
+        for key, values in batch_values.items():
+            cursor.execute(select_query, key)
+            stored = cursor.fetchone()
+            if stored is not None:
+                conflicting = [value for value in values if value != tuple(stored)]
+                source = "stored"
+            else:
+                # Without a stored row, the batch conflicts with itself if it disagrees on the RHS
+                stored = next(iter(values))
+                conflicting = list(values)[1:]
+                source = "batch"
+            for value in conflicting:
+                violations.append(
+                    {
+                        "lhs": lhs,
+                        "rhs": rhs,
+                        "key": list(key),
+                        "source": source,
+                        "stored": list(stored),
+                        "incoming": list(value),
+                    }
+                )
+    return violations
+
+
+##### ^ INCREMENTAL LOAD ^ #####
+##### v PARALLEL PIPELINE v #####
+
+
+# More shards than workers keeps every worker busy when the shards take uneven time
+SHARDS_PER_WORKER = 4
+_SHARD_CONTEXT = None
+
+
+def _init_shard_worker(context):
+    """Stores the input path, 1NF options and relation projections in a worker process."""
+    global _SHARD_CONTEXT
+    _SHARD_CONTEXT = context
+
+
+def _shard_records(byte_range):
+    """Parses one byte range of the input file and returns its raw records."""
+    source = MappedInput(_SHARD_CONTEXT["path"])
+    return list(source.iter_range(*byte_range))
+
+
+def _parse_shard(byte_range):
+    """Parses and flattens one shard, returning its fan-out report and its dictionary-encoded columns."""
+    headers, expansion, max_fanout = _SHARD_CONTEXT["headers"], _SHARD_CONTEXT["expansion"], _SHARD_CONTEXT["max_fanout"]
+    records = _shard_records(byte_range)
+    fanout = fanout_1nf(records, headers, expansion)
+    store = ColumnStore.from_records(headers, iter_1nf(records, headers, expansion, max_fanout))
+    return fanout, store.dictionaries, store.codes, store.skipped_rows
+
+
+def _load_shard(byte_range):
+    """Parses, flattens and projects one shard, returning the distinct rows of every relation and the number of rows read."""
+    headers, expansion, max_fanout = _SHARD_CONTEXT["headers"], _SHARD_CONTEXT["expansion"], _SHARD_CONTEXT["max_fanout"]
+    projectors = [make_projector(indexes) for indexes in _SHARD_CONTEXT["projections"]]
+    # Dicts keep first-seen order so the first conflicting row wins, as in a serial load
+    distinct = [{} for _ in projectors]
+    width = len(headers)
+    rows_read = 0
+    for record in iter_1nf(_shard_records(byte_range), headers, expansion, max_fanout):
+        rows_read += 1
+        if len(record) != width:
+            continue  # Malformed rows are skipped, as in ColumnStore
+        for projector, rows in zip(projectors, distinct):
+            rows.setdefault(projector(record))
+    return [list(rows) for rows in distinct], rows_read
+
+
+def run_shards(task, context, shards, workers):
+    """Yields the results of a task over every shard in input order, using a process pool when workers > 1."""
+    if workers <= 1:
+        _init_shard_worker(context)
+        yield from map(task, shards)
+        return
+    with ProcessPoolExecutor(workers, initializer=_init_shard_worker, initargs=(context,)) as pool:
+        # Results are consumed in shard order while later shards keep running in the pool
+        yield from pool.map(task, shards)
+
+
+def parallel_parse(path, workers=None, expansion=None, max_fanout=None):
+    """Parses and flattens the input file shard by shard on a process pool, merging the shards into one ColumnStore.
+
+    Returns the store and the combined 1NF fan-out report."""
+    workers = workers or os.cpu_count() or 1
+    source = MappedInput(path)
+    headers = source.headers
+    context = {"path": path, "headers": headers, "expansion": expansion, "max_fanout": max_fanout}
+    store = ColumnStore(headers)
+    report = {"rows": 0, "expanded_rows": 0, "max_fanout": 0, "max_fanout_row": None}
+    for fanout, dictionaries, codes, skipped_rows in run_shards(
+        _parse_shard, context, source.ranges(workers * SHARDS_PER_WORKER), workers
+    ):
+        store.extend_encoded(dictionaries, codes, skipped_rows)
+        report["rows"] += fanout["rows"]
+        report["expanded_rows"] += fanout["expanded_rows"]
+        if fanout["max_fanout"] > report["max_fanout"]:
+            report["max_fanout"] = fanout["max_fanout"]
+            report["max_fanout_row"] = fanout["max_fanout_row"]
+    return store, report
+
+
+def parallel_load(
+    conn,
+    normalized_relations,
+    path,
+    workers=None,
+    expansion=None,
+    max_fanout=None,
+    batch_size=BULK_BATCH_SIZE,
+    on_conflict="skip",
+    pragmas=BULK_LOAD_PRAGMAS,
+    trace=None,
+    dedup_rows=DEDUP_MAX_ROWS,
+    spill_dir=None,
+):
+    """Loads the input file into the normalized tables with workers that expand, project and dedupe their own shard.
+
+    The main process is the single SQLite writer: it removes the duplicates between shards in a
+    SpillingSet per relation, then inserts each relation's distinct rows in batches."""
+    if on_conflict not in CONFLICT_MODES:
+        raise ValueError(f"Unknown conflict mode '{on_conflict}'; expected one of {CONFLICT_MODES}")
+    trace = trace or PipelineTrace()
+    workers = workers or os.cpu_count() or 1
+    source = MappedInput(path)
+    headers = source.headers
+
+    loaders = []
+    for relation in normalized_relations:
+        columns = [col for col in relation["columns"] if col in headers]
+        if columns:
+            loaders.append(
+                (
+                    relation["table_name"],
+                    build_insert_query(relation, columns, on_conflict),
+                    columns,
+                    SpillingSet(dedup_rows, spill_dir),
+                    [],
+                )
+            )
+    context = {
+        "path": path,
+        "headers": headers,
+        "expansion": expansion,
+        "max_fanout": max_fanout,
+        "projections": [[headers.index(col) for col in columns] for _, _, columns, _, _ in loaders],
+    }
+    inserted = {table_name: 0 for table_name, *_ in loaders}
+
+    with trace.stage("load") as entry:
+        cursor = conn.cursor()
+        # PRAGMAs such as journal_mode cannot be changed inside an open transaction
+        if conn.in_transaction:
+            conn.commit()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+
+        def flush(table_name, insert_query, batch):
+            cursor.executemany(insert_query, batch)
+            inserted[table_name] += cursor.rowcount
+            if on_conflict == "skip":
+                trace.reject(table_name, "primary key already exists", len(batch) - cursor.rowcount)
+            batch.clear()
+
+        cursor.execute("BEGIN")
+        try:
+            for shard_rows, rows_read in run_shards(_load_shard, context, source.ranges(workers * SHARDS_PER_WORKER), workers):
+                entry["rows_in"] += rows_read
+                # Shards only dedupe locally, so rows repeated across shards are dropped here
+                for (_, _, _, seen, _), rows in zip(loaders, shard_rows):
+                    seen.update(rows)
+            for table_name, insert_query, _, seen, batch in loaders:
+                for row in seen:
+                    batch.append(row)
+                    if len(batch) >= batch_size:
+                        flush(table_name, insert_query, batch)
+                if batch:
+                    flush(table_name, insert_query, batch)
+                if seen.spills:
+                    entry["spilled_runs"] = entry.get("spilled_runs", 0) + seen.spills
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        finally:
+            for _, _, _, seen, _ in loaders:
+                seen.close()
+        entry["relations_in"] += len(normalized_relations)
+        entry["relations_out"] += len(inserted)
+        entry["rows_out"] += sum(inserted.values())
+    return inserted
+
+
+##### ^ PARALLEL PIPELINE ^ #####
+##### v OUTPUT SINKS v #####
+
+
+SINK_BUFFER_ROWS = 50_000  # Rows handed to every sink per write
+SINK_FILE_BUFFER = 1 << 20  # Bytes file sinks buffer before each write to disk
+SINK_QUEUE_BATCHES = 8  # Batches waiting for the writer thread of a SQLiteWriterSink
+
+
+class Sink:
+    """Destination for the normalized relations that records rows, bytes and seconds per table.
+
+    Subclasses implement open_table, write_rows and close_table. Different tables may be written from
+    different threads at the same time, but each table is only written by one thread."""
+
+    kind = "sink"
+
+    def __init__(self, target):
+        self.target = target
+        self.tables = {}  # table name -> {"rows", "bytes", "seconds"}
+        self.started = self.finished = None
+
+    def create(self, normalized_relations):
+        """Prepares the sink before any table is opened."""
+        self.started = time.perf_counter()
+
+    def open(self, relation, columns):
+        """Starts writing a relation whose rows hold the given columns."""
+        self.tables[relation["table_name"]] = {"rows": 0, "bytes": 0, "seconds": 0.0}
+        self.open_table(relation, columns)
+
+    def write(self, table_name, rows):
+        """Writes a list of rows to a table."""
+        started = time.perf_counter()
+        self.write_rows(table_name, rows)
+        stats = self.tables[table_name]
+        stats["rows"] += len(rows)
+        stats["seconds"] += time.perf_counter() - started
+
+    def finish(self, table_name):
+        """Finishes writing a table."""
+        started = time.perf_counter()
+        written = self.close_table(table_name)
+        stats = self.tables[table_name]
+        stats["bytes"] = written or 0
+        stats["seconds"] += time.perf_counter() - started
+
+    def close(self):
+        """Flushes everything the sink still buffers."""
+        self.finished = time.perf_counter()
+
+    def abort(self):
+        """Releases the sink after a failed write."""
+        self.close()
+
+    def open_table(self, relation, columns):
+        raise NotImplementedError
+
+    def write_rows(self, table_name, rows):
+        raise NotImplementedError
+
+    def close_table(self, table_name):
+        """Returns the number of bytes written for the table, if the sink knows it."""
+        return 0
+
+    def size(self):
+        """Returns the total bytes written."""
+        return sum(stats["bytes"] for stats in self.tables.values())
+
+    def metrics(self):
+        """Returns the rows, bytes, wall time and throughput of the sink and of each of its tables."""
+        seconds = (self.finished or time.perf_counter()) - (self.started or time.perf_counter())
+        rows = sum(stats["rows"] for stats in self.tables.values())
+        size = self.size()
+        return {
+            "sink": self.kind,
+            "target": self.target,
+            "rows": rows,
+            "bytes": size,
+            "seconds": seconds,
+            "rows_per_second": rows / seconds if seconds else None,
+            "bytes_per_second": size / seconds if seconds else None,
+            "tables": {
+                table_name: dict(stats, rows_per_second=stats["rows"] / stats["seconds"] if stats["seconds"] else None)
+                for table_name, stats in self.tables.items()
+            },
+        }
+
+
+class DelimitedSink(Sink):
+    """Writes each relation to DIRECTORY/<table>.csv (or .tsv) with a header line, through a large write buffer."""
+
+    def __init__(self, directory, delimiter=","):
+        super().__init__(directory)
+        self.kind = "tsv" if delimiter == "\t" else "csv"
+        self.delimiter = delimiter
+        self.files = {}
+
+    def create(self, normalized_relations):
+        super().create(normalized_relations)
+        os.makedirs(self.target, exist_ok=True)
+
+    def open_table(self, relation, columns):
+        path = os.path.join(self.target, f"{relation['table_name']}.{self.kind}")
+        file = open(path, "w", newline="", encoding="utf-8", buffering=SINK_FILE_BUFFER)
+        writer = csv.writer(file, delimiter=self.delimiter)
+        writer.writerow(columns)
+        self.files[relation["table_name"]] = (file, writer)
+
+    def write_rows(self, table_name, rows):
+        self.files[table_name][1].writerows(rows)
+
+    def close_table(self, table_name):
+        file, _ = self.files.pop(table_name)
+        size = file.tell()
+        file.close()
+        return size
+
+    def close(self):
+        for file, _ in self.files.values():
+            file.close()
+        self.files.clear()
+        super().close()
+
+
+class NDJSONSink(Sink):
+    """Writes each relation to DIRECTORY/<table>.ndjson, one JSON object per row keyed by column name."""
+
+    kind = "ndjson"
+
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.files = {}
+
+    def create(self, normalized_relations):
+        super().create(normalized_relations)
+        os.makedirs(self.target, exist_ok=True)
+
+    def open_table(self, relation, columns):
+        path = os.path.join(self.target, f"{relation['table_name']}.ndjson")
+        file = open(path, "w", encoding="utf-8", buffering=SINK_FILE_BUFFER)
+        self.files[relation["table_name"]] = (file, columns)
+
+    def write_rows(self, table_name, rows):
+        file, columns = self.files[table_name]
+        file.write("".join(json.dumps(dict(zip(columns, row))) + "\n" for row in rows))
+
+    def close_table(self, table_name):
+        file, _ = self.files.pop(table_name)
+        size = file.tell()
+        file.close()
+        return size
+
+    def close(self):
+        for file, _ in self.files.values():
+            file.close()
+        self.files.clear()
+        super().close()
+
+
+def create_sink_database(path, normalized_relations, pragmas):
+    """Creates a fresh SQLite file holding the normalized tables and returns an open connection to it."""
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    cursor = conn.cursor()
+    for pragma in pragmas:
+        cursor.execute(pragma)
+    # create_table extends the column lists it is given, so it gets copies
+    create_normalized_tables(cursor, [dict(relation, columns=list(relation["columns"])) for relation in normalized_relations])
+    conn.commit()
+    cursor.execute("BEGIN")
+    return conn
+
+
+class SQLiteSink(Sink):
+    """Bulk-loads the relations into a separate SQLite file in one transaction, like bulk_load."""
+
+    kind = "sqlite"
+
+    def __init__(self, path, on_conflict="skip", pragmas=BULK_LOAD_PRAGMAS):
+        super().__init__(path)
+        self.on_conflict = on_conflict
+        self.pragmas = pragmas
+        self.conn = None
+        self.queries = {}
+        # SQLite has a single writer, so tables written from several threads take turns
+        self.lock = threading.Lock()
+
+    def create(self, normalized_relations):
+        super().create(normalized_relations)
+        self.conn = create_sink_database(self.target, normalized_relations, self.pragmas)
+
+    def open_table(self, relation, columns):
+        self.queries[relation["table_name"]] = build_insert_query(relation, columns, self.on_conflict)
+
+    def write_rows(self, table_name, rows):
+        with self.lock:
+            self.conn.executemany(self.queries[table_name], rows)
+
+    def size(self):
+        return os.path.getsize(self.target) if os.path.exists(self.target) else 0
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
+        super().close()
+
+    def abort(self):
+        if self.conn is not None:
+            self.conn.rollback()
+        self.close()
+
+
+class SQLiteWriterSink(Sink):
+    """Sends the rows to a writer thread that owns its own SQLite connection, standing in for a database server.
+
+    Writes only enqueue batches, so producers overlap with the writer until the bounded queue fills up."""
+
+    kind = "sqlite-writer"
+
+    def __init__(self, path, on_conflict="skip", pragmas=BULK_LOAD_PRAGMAS):
+        super().__init__(path)
+        self.on_conflict = on_conflict
+        self.pragmas = pragmas
+        self.queries = {}
+        self.queue = queue.Queue(SINK_QUEUE_BATCHES)
+        self.thread = None
+        self.error = None
+
+    def create(self, normalized_relations):
+        super().create(normalized_relations)
+        self.thread = threading.Thread(target=self.writer, args=(normalized_relations,), daemon=True)
+        self.thread.start()
+
+    def writer(self, normalized_relations):
+        """Runs the writer thread: creates the tables, then executes batches until it receives None."""
+        conn = None
+        try:
+            conn = create_sink_database(self.target, normalized_relations, self.pragmas)
+            for item in iter(self.queue.get, None):
+                if self.error is None:
+                    conn.executemany(*item)
+            if self.error is None:
+                conn.commit()
+        except BaseException as error:
+            self.error = error
+            # Keeps draining so producers blocked on a full queue are released
+            for _ in iter(self.queue.get, None):
+                pass
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def open_table(self, relation, columns):
+        self.queries[relation["table_name"]] = build_insert_query(relation, columns, self.on_conflict)
+
+    def write_rows(self, table_name, rows):
+        if self.error is not None:
+            raise self.error
+        self.queue.put((self.queries[table_name], rows))
+
+    def size(self):
+        return os.path.getsize(self.target) if os.path.exists(self.target) else 0
+
+    def close(self):
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        super().close()
+        if self.error is not None:
+            raise self.error
+
+    def abort(self):
+        if self.error is None:
+            self.error = RuntimeError("write aborted")
+        self.close()
+
+
+SINK_KINDS = {
+    "sqlite": SQLiteSink,
+    "sqlite-writer": SQLiteWriterSink,
+    "csv": DelimitedSink,
+    "tsv": lambda directory: DelimitedSink(directory, "\t"),
+    "ndjson": NDJSONSink,
+}
+
+
+def make_sink(spec):
+    """Builds a sink from a KIND:TARGET spec, e.g. csv:out, tsv:out, ndjson:out, sqlite:copy.db or sqlite-writer:copy.db."""
+    kind, _, target = spec.partition(":")
+    if kind not in SINK_KINDS or not target:
+        raise ValueError(f"Unknown sink '{spec}'; expected KIND:TARGET with KIND one of {sorted(SINK_KINDS)}")
+    return SINK_KINDS[kind](target)
+
+
+def write_sinks(
+    sinks,
+    normalized_relations,
+    records,
+    headers,
+    batch_size=SINK_BUFFER_ROWS,
+    threads=None,
+    dedup_rows=DEDUP_MAX_ROWS,
+    spill_dir=None,
+    trace=None,
+):
+    """Writes the distinct rows of every relation to every sink and returns each sink's metrics.
+
+    The records are projected and deduplicated once; each relation's rows are then read once and handed
+    to all the sinks in batches of batch_size, with up to threads relations written at the same time."""
+    trace = trace or PipelineTrace()
+    with trace.stage("sinks") as entry:
+        projections, rows_read = distinct_projections(normalized_relations, records, headers, batch_size, dedup_rows, spill_dir)
+        entry["rows_in"] += rows_read
+
+        def write_relation(projection):
+            relation, columns, rows = projection
+            table_name = relation["table_name"]
+            for sink in sinks:
+                sink.open(relation, columns)
+            rows = iter(rows)
+            for batch in iter(lambda: list(itertools.islice(rows, batch_size)), []):
+                for sink in sinks:
+                    sink.write(table_name, batch)
+            for sink in sinks:
+                sink.finish(table_name)
+
+        try:
+            for sink in sinks:
+                sink.create(normalized_relations)
+            with ThreadPoolExecutor(threads or len(projections) or 1) as pool:
+                list(pool.map(write_relation, projections))
+        except BaseException:
+            for sink in sinks:
+                with contextlib.suppress(Exception):
+                    sink.abort()
+            raise
+        finally:
+            close_projections(projections)
+        for sink in sinks:
+            sink.close()
+        metrics = [sink.metrics() for sink in sinks]
+        entry["relations_in"] += len(projections)
+        entry["rows_out"] += sum(metric["rows"] for metric in metrics)
+    return metrics
+
+
+##### ^ OUTPUT SINKS ^ #####
+##### v DEPENDENCY ENGINE v #####
+
+
+def as_attribute_list(attributes):
+    """Returns a dependency side as a list, since a single attribute may be written as a plain string."""
+    if isinstance(attributes, str):
+        return [attributes]
+    return list(attributes)
+
+
+class DependencyEngine:
+    """Attribute-closure engine that encodes attributes as integer bitmasks and indexes FDs by LHS attribute."""
+
+    __slots__ = ("attributes", "bits", "lhs_masks", "rhs_masks", "lhs_sizes", "by_lhs", "empty_lhs")
+
+    def __init__(self, attributes, fds):
+        # Every attribute gets one bit; FD attributes outside the relation still take part in closures
+        names = list(attributes)
+        for fd in fds:
+            names.extend(as_attribute_list(fd["lhs"]))
+            names.extend(as_attribute_list(fd["rhs"]))
+        self.attributes = list(dict.fromkeys(names))
+        self.bits = {attr: 1 << index for index, attr in enumerate(self.attributes)}
+        self.lhs_masks = []
+        self.rhs_masks = []
+        self.lhs_sizes = []
+        self.by_lhs = [[] for _ in self.attributes]
+        self.empty_lhs = []
+        for fd in fds:
+            lhs = self.encode(as_attribute_list(fd["lhs"]))
+            index = len(self.lhs_masks)
+            self.lhs_masks.append(lhs)
+            self.rhs_masks.append(self.encode(as_attribute_list(fd["rhs"])))
+            self.lhs_sizes.append(lhs.bit_count())
+            if not lhs:
+                self.empty_lhs.append(index)
+            for bit in self.iter_bits(lhs):
+                self.by_lhs[bit].append(index)
+
+    @staticmethod
+    def iter_bits(mask):
+        """Yields the positions of the set bits in a mask, lowest first."""
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+
+    def encode(self, attributes):
+        """Converts a collection of attribute names into a bitmask."""
+        mask = 0
+        for attr in as_attribute_list(attributes):
+            mask |= self.bits[attr]
+        return mask
+
+    def decode(self, mask):
+        """Converts a bitmask back into a list of attribute names in their original order."""
+        return [self.attributes[bit] for bit in self.iter_bits(mask)]
+
+    def closure(self, mask, disabled=(), target=0):
+        """Computes the attribute closure of a bitmask in time linear in the size of the FD set."""
+        result = mask
+        for index in self.empty_lhs:
+            if index not in disabled:
+                result |= self.rhs_masks[index]
+        # Counts, per FD, how many LHS attributes are still missing from the closure
+        missing = list(self.lhs_sizes)
+        pending = result
+        while pending:
+            # Stops early once every attribute the caller asked about has been reached
+            if target and result & target == target:
+                return result
+            low = pending & -pending
+            pending ^= low
+            for index in self.by_lhs[low.bit_length() - 1]:
+                missing[index] -= 1
+                if missing[index] == 0 and index not in disabled:
+                    new = self.rhs_masks[index] & ~result
+                    if new:
+                        result |= new
+                        pending |= new
+        return result
+
+    def determines(self, mask, target, disabled=()):
+        """Checks whether the closure of a bitmask contains every attribute of the target bitmask."""
+        return self.closure(mask, disabled, target) & target == target
+
+    def is_superkey(self, lhs, columns):
+        """Checks whether the attributes determine every column of the relation."""
+        return self.determines(self.encode(lhs), self.encode(columns))
+
+    def _minimize(self, mask, relation, core=0):
+        """Drops attributes from a superkey of the relation until it is a candidate key."""
+        for bit in list(self.iter_bits(mask & ~core)):
+            reduced = mask & ~(1 << bit)
+            if self.determines(reduced, relation):
+                mask = reduced
+        return mask
+
+    def _projected_keys(self, relation, core):
+        """Enumerates the candidate keys of a relation that the FDs reach outside of, using closures only.
+
+        Every key other than one already found misses some attribute of it, so searching for a key that
+        avoids each such attribute in turn, and recursing on the avoided sets, reaches every key."""
+        keys = []
+        seen = set()
+        pending = [0]  # Sets of attributes the next key must avoid
+        while pending:
+            avoided = pending.pop()
+            if avoided in seen:
+                continue
+            seen.add(avoided)
+            available = relation & ~avoided
+            if not self.determines(available, relation):
+                continue
+            key = next((known for known in keys if not known & avoided), None)
+            if key is None:
+                key = self._minimize(available, relation, core)
+                keys.append(key)
+            pending.extend(avoided | 1 << bit for bit in self.iter_bits(key & ~core))
+        return keys
+
+    def candidate_keys(self, columns):
+        """Enumerates the candidate keys of the relation (Lucchesi-Osborn with core-attribute pruning).
+
+        An FD that only holds through attributes outside the relation can still give it another key, so
+        relations that the FDs reach outside of are searched with _projected_keys instead."""
+        relation = self.encode(columns)
+        # Attributes that nothing else in the relation determines belong to every key
+        core = 0
+        for bit in self.iter_bits(relation):
+            if not self.determines(relation & ~(1 << bit), 1 << bit):
+                core |= 1 << bit
+        if self.determines(core, relation):
+            return [self.decode(core)]
+
+        # Lucchesi-Osborn needs the FDs of the relation itself, which are only the given ones when no FD leaves it
+        outside = 0
+        for lhs, rhs in zip(self.lhs_masks, self.rhs_masks):
+            outside |= (lhs | rhs) & ~relation
+        if outside:
+            return [self.decode(key) for key in self._projected_keys(relation, core)]
+
+        projected = {}
+        for lhs in self.lhs_masks:
+            if lhs not in projected:
+                projected[lhs] = self.closure(lhs) & relation
+        keys = [self._minimize(relation, relation, core)]
+        tried = set()
+        index = 0
+        while index < len(keys):
+            key = keys[index]
+            for lhs, rhs in projected.items():
+                superkey = lhs | (key & ~rhs) | core
+                if superkey in tried:
+                    continue
+                tried.add(superkey)
+                # Prunes any superkey that already contains a known key
+                if not any(known & ~superkey == 0 for known in keys):
+                    keys.append(self._minimize(superkey, relation, core))
+            index += 1
+        return [self.decode(key) for key in keys]
+
+    def prime_attributes(self, columns):
+        """Returns the set of attributes that belong to at least one candidate key."""
+        return {attr for key in self.candidate_keys(columns) for attr in key}
+
+    def minimal_cover(self):
+        """Computes a minimal cover of the FD set, grouped by left-hand side."""
+        # Splits every FD into single-attribute right-hand sides
+        singles = []
+        for lhs, rhs in zip(self.lhs_masks, self.rhs_masks):
+            for bit in self.iter_bits(rhs & ~lhs):
+                singles.append((lhs, 1 << bit))
+        # Removes extraneous left-hand side attributes
+        reduced = []
+        for lhs, rhs in singles:
+            for bit in list(self.iter_bits(lhs)):
+                smaller = lhs & ~(1 << bit)
+                if self.determines(smaller, rhs):
+                    lhs = smaller
+            reduced.append((lhs, rhs))
+        reduced = list(dict.fromkeys(reduced))
+        # Removes FDs that the remaining ones already imply
+        engine = DependencyEngine(
+            self.attributes,
+            [{"lhs": self.decode(lhs), "rhs": self.decode(rhs)} for lhs, rhs in reduced],
+        )
+        disabled = set()
+        for index, (lhs, rhs) in enumerate(reduced):
+            disabled.add(index)
+            if not engine.determines(lhs, rhs, disabled):
+                disabled.discard(index)
+        grouped = {}
+        for index, (lhs, rhs) in enumerate(reduced):
+            if index not in disabled:
+                grouped[lhs] = grouped.get(lhs, 0) | rhs
+        return [{"lhs": self.decode(lhs), "rhs": self.decode(rhs)} for lhs, rhs in grouped.items()]
+
+
+##### ^ DEPENDENCY ENGINE ^ #####
+##### v DEPENDENCY DISCOVERY v #####
+
+
+# Integer-coded columns shared with the discovery worker processes
+_DISCOVERY_CODES = None
+
+
+def stripped_partition(column):
+    """Groups row numbers by their code, keeping only the classes with more than one row."""
+    groups = {}
+    for row, code in enumerate(column):
+        groups.setdefault(code, []).append(row)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def refine_partition(partition, column):
+    """Refines a stripped partition by one more column, keeping only the classes with more than one row."""
+    refined = []
+    for rows in partition:
+        # Pairs are by far the most common class deep in the lattice, so they skip the dict
+        if len(rows) == 2:
+            if column[rows[0]] == column[rows[1]]:
+                refined.append(rows)
+            continue
+        groups = {}
+        for row in rows:
+            groups.setdefault(column[row], []).append(row)
+        for group in groups.values():
+            if len(group) > 1:
+                refined.append(group)
+    return refined
+
+
+def partition_error(partition):
+    """Returns e(X): the number of rows that must be removed for X to become a key."""
+    return sum(len(rows) for rows in partition) - len(partition)
+
+
+def _init_discovery_worker(codes):
+    """Stores the integer-coded columns in a worker process."""
+    global _DISCOVERY_CODES
+    _DISCOVERY_CODES = codes
+
+
+def _discovery_task(partition, extensions):
+    """Refines a parent's stripped partition by each extension attribute, returning the errors and partitions."""
+    codes = _DISCOVERY_CODES
+    results = []
+    for attr in extensions:
+        # The empty set's partition is never shipped; single columns are partitioned directly
+        refined = stripped_partition(codes[attr]) if partition is None else refine_partition(partition, codes[attr])
+        results.append((partition_error(refined), refined))
+    return results
+
+
+def _mask_of(attrs):
+    """Converts attribute positions into a bitmask."""
+    mask = 0
+    for attr in attrs:
+        mask |= 1 << attr
+    return mask
+
+
+def discover_fds(headers, records, workers=None, max_lhs=None):
+    """Discovers all minimal non-trivial FDs that hold in the records (TANE over stripped partitions)."""
+    if not isinstance(records, ColumnStore):
+        records = ColumnStore.from_records(headers, records)
+    codes = records.codes
+    row_count = len(codes[0]) if codes else 0
+    if not row_count:
+        return []
+    width = len(headers)
+    full = (1 << width) - 1
+    bits = DependencyEngine.iter_bits
+    workers = workers or os.cpu_count() or 1
+
+    errors = {0: row_count - 1}
+    cplus = {0: full}  # C+(X): attributes that may still appear as a minimal RHS below X
+    found = []
+
+    def rhs_candidates(mask):
+        # Sets skipped by the lattice inherit the intersection of their subsets' candidates
+        if mask not in cplus:
+            value = full
+            for attr in bits(mask):
+                value &= rhs_candidates(mask & ~(1 << attr))
+            cplus[mask] = value
+        return cplus[mask]
+
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(workers, initializer=_init_discovery_worker, initargs=(codes,))
+    else:
+        _init_discovery_worker(codes)
+    try:
+        # Each task is (parent set, parent partition, extension attributes)
+        tasks = [(0, None, [attr]) for attr in range(width)]
+        level_size = 1
+        while tasks:
+            # Spreads the partition refinements of this lattice level across the pool
+            arguments = ([partition for _, partition, _ in tasks], [extensions for _, _, extensions in tasks])
+            if pool is not None:
+                results = pool.map(_discovery_task, *arguments, chunksize=max(1, len(tasks) // (workers * 4)))
+            else:
+                results = map(_discovery_task, *arguments)
+            level = []
+            partitions = {}
+            for (parent, _, extensions), result in zip(tasks, results):
+                for attr, (error, partition) in zip(extensions, result):
+                    mask = parent | (1 << attr)
+                    errors[mask] = error
+                    partitions[mask] = partition
+                    level.append(mask)
+            tasks = None
+
+            # Computes the dependencies whose LHS is one attribute smaller than this level
+            for mask in level:
+                candidates = full
+                for attr in bits(mask):
+                    candidates &= cplus[mask & ~(1 << attr)]
+                for attr in list(bits(mask & candidates)):
+                    lhs = mask & ~(1 << attr)
+                    if errors[lhs] == errors[mask]:
+                        found.append((lhs, attr))
+                        candidates &= ~(1 << attr)
+                        candidates &= mask
+                cplus[mask] = candidates
+
+            # Prunes sets that cannot lead to new minimal dependencies
+            kept = []
+            for mask in level:
+                if not cplus[mask]:
+                    continue
+                if errors[mask] == 0:
+                    # A key determines everything; only the minimal ones are reported, and only if it fits in max_lhs
+                    if max_lhs is None or level_size <= max_lhs:
+                        for attr in bits(cplus[mask] & ~mask):
+                            extended = mask | (1 << attr)
+                            if all(rhs_candidates(extended & ~(1 << other)) >> attr & 1 for other in bits(mask)):
+                                found.append((mask, attr))
+                    continue
+                kept.append(mask)
+            if max_lhs is not None and level_size > max_lhs:
+                break
+
+            # Generates the next level from sets that share all but their last attribute
+            kept_masks = set(kept)
+            blocks = {}
+            for mask in kept:
+                attrs = tuple(bits(mask))
+                blocks.setdefault(attrs[:-1], []).append(attrs[-1])
+            tasks = []
+            for prefix, lasts in blocks.items():
+                lasts.sort()
+                prefix_mask = _mask_of(prefix)
+                for position, first in enumerate(lasts):
+                    parent = prefix_mask | (1 << first)
+                    extensions = [
+                        second
+                        for second in lasts[position + 1 :]
+                        if all((parent | (1 << second)) & ~(1 << attr) in kept_masks for attr in prefix)
+                    ]
+                    if extensions:
+                        tasks.append((parent, partitions[parent], extensions))
+            # Only the partitions of the next level's parents are needed from here on
+            partitions = None
+            level_size += 1
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    # Keeps only minimal dependencies and groups them by LHS in the fds.txt format
+    by_rhs = {}
+    for lhs, attr in found:
+        by_rhs.setdefault(attr, set()).add(lhs)
+    grouped = {}
+    for attr, lhs_masks in by_rhs.items():
+        minimal = []
+        for lhs in sorted(lhs_masks, key=int.bit_count):
+            if not any(other & ~lhs == 0 for other in minimal):
+                minimal.append(lhs)
+                grouped.setdefault(lhs, []).append(attr)
+    return [
+        {"lhs": [headers[attr] for attr in bits(lhs)], "rhs": [headers[attr] for attr in sorted(attrs)]}
+        for lhs, attrs in sorted(grouped.items(), key=lambda item: (item[0].bit_count(), item[0]))
+    ]
+
+
+##### ^ DEPENDENCY DISCOVERY ^ #####
+##### v DEPENDENCY VALIDATION v #####
+
+
+MAX_VIOLATING_ROWS = 20
+
+
+def packed_keys(store, columns):
+    """Packs the codes of the given columns into one integer per row, returning the keys and their radix."""
+    if not columns:
+        return [0] * len(store), 1
+    keys = store.column(columns[0])
+    radix = len(store.dictionaries[store.positions[columns[0]]]) or 1
+    for col in columns[1:]:
+        size = len(store.dictionaries[store.positions[col]]) or 1
+        # Mixed-radix packing with C-level map calls keeps the per-row work out of the interpreter
+        keys = list(map(operator.add, map(operator.mul, keys, itertools.repeat(size)), store.column(col)))
+        radix *= size
+    return keys, radix
+
+
+def combine_keys(left, right, radix):
+    """Packs two key lists row by row, with right keys below the given radix."""
+    return map(operator.add, map(operator.mul, left, itertools.repeat(radix)), right)
+
+
+def group_sizes(lhs_keys, keys, radix):
+    """Counts the distinct keys per LHS group."""
+    return collections.Counter(map(operator.floordiv, set(combine_keys(lhs_keys, keys, radix)), itertools.repeat(radix)))
+
+
+def violating_rows(lhs_keys, groups, limit=MAX_VIOLATING_ROWS):
+    """Returns the numbers of the first rows that fall into any of the given LHS groups."""
+    rows = []
+    for row, key in enumerate(lhs_keys):
+        if key in groups:
+            rows.append(row)
+            if len(rows) >= limit:
+                break
+    return rows
+
+
+def check_fd(store, lhs, rhs, lhs_keys=None):
+    """Returns the LHS groups that map to more than one RHS value."""
+    if lhs_keys is None:
+        lhs_keys, _ = packed_keys(store, lhs)
+    rhs_keys, rhs_radix = packed_keys(store, rhs)
+    return {key for key, count in group_sizes(lhs_keys, rhs_keys, rhs_radix).items() if count > 1}
+
+
+def check_mvd(store, lhs, rhs, rest, lhs_keys=None):
+    """Returns the LHS groups that are not the cross product of their RHS and remaining values, and the missing row count.
+
+    lhs ->> rhs holds in a group exactly when its distinct (rhs, rest) pairs number |rhs values| * |rest values|."""
+    if lhs_keys is None:
+        lhs_keys, _ = packed_keys(store, lhs)
+    rhs_keys, rhs_radix = packed_keys(store, rhs)
+    rest_keys, rest_radix = packed_keys(store, rest)
+    rhs_sizes = group_sizes(lhs_keys, rhs_keys, rhs_radix)
+    rest_sizes = group_sizes(lhs_keys, rest_keys, rest_radix)
+    pair_sizes = group_sizes(lhs_keys, combine_keys(rhs_keys, rest_keys, rest_radix), rhs_radix * rest_radix)
+    groups, missing = set(), 0
+    for key, pairs in pair_sizes.items():
+        expected = rhs_sizes[key] * rest_sizes[key]
+        if pairs != expected:
+            groups.add(key)
+            missing += expected - pairs
+    return groups, missing
+
+
+def validate_dependencies(records, fds, mvds=(), headers=None, max_rows=MAX_VIOLATING_ROWS):
+    """Checks every FD and MVD against the records and returns one report entry per violated dependency.
+
+    Each dependency is evaluated with hash group-bys over the integer codes of a ColumnStore, so the
+    records are only revisited to collect the rows of dependencies that turn out to be violated."""
+    if not isinstance(records, ColumnStore):
+        records = ColumnStore.from_records(headers or records.headers, records)
+    headers = records.headers
+    violations = []
+    # Dependencies that share a left-hand side share its packed group keys
+    lhs_cache = {}
+    for kind, dependencies in (("fd", fds), ("mvd", mvds or [])):
+        for dependency in dependencies:
+            lhs = [col for col in as_attribute_list(dependency["lhs"]) if col in records.positions]
+            rhs = [
+                col
+                for col in as_attribute_list(dependency["rhs"])
+                if col in records.positions and col not in lhs
+            ]
+            if len(lhs) < len(as_attribute_list(dependency["lhs"])) or not rhs:
+                continue  # Dependencies on columns that are not in the data cannot be checked
+            lhs_keys = lhs_cache.get(tuple(lhs))
+            if lhs_keys is None:
+                lhs_keys = lhs_cache[tuple(lhs)] = packed_keys(records, lhs)[0]
+            if kind == "fd":
+                groups, missing = check_fd(records, lhs, rhs, lhs_keys), 0
+            else:
+                rest = [col for col in headers if col not in lhs and col not in rhs]
+                groups, missing = check_mvd(records, lhs, rhs, rest, lhs_keys)
+            if groups:
+                violations.append(
+                    {
+                        "kind": kind,
+                        "lhs": lhs,
+                        "rhs": rhs,
+                        "groups": len(groups),
+                        "missing_rows": missing,
+                        "rows": violating_rows(lhs_keys, groups, max_rows),
+                    }
+                )
+    return violations
+
+
+def stream_validate_dependencies(
+    records, fds, mvds=(), headers=None, max_rows=MAX_VIOLATING_ROWS, run_rows=DEDUP_MAX_ROWS, spill_dir=None
+):
+    """Streaming counterpart of validate_dependencies that holds at most run_rows records in memory.
+
+    One pass sorts the records by every distinct left-hand side into runs spilled to spill_dir. Each LHS's
+    runs are then merged, so its groups arrive one at a time and every dependency on it is checked group
+    by group. The reports are the same as validate_dependencies gives."""
+    headers = list(headers or records.headers)
+    positions = {col: index for index, col in enumerate(headers)}
+    checks = []
+    for kind, dependencies in (("fd", fds), ("mvd", mvds or [])):
+        for dependency in dependencies:
+            lhs = [col for col in as_attribute_list(dependency["lhs"]) if col in positions]
+            rhs = [col for col in as_attribute_list(dependency["rhs"]) if col in positions and col not in lhs]
+            if len(lhs) < len(as_attribute_list(dependency["lhs"])) or not rhs:
+                continue  # Dependencies on columns that are not in the data cannot be checked
+            rest = [col for col in headers if col not in lhs and col not in rhs]
+            checks.append((kind, lhs, rhs, rest))
+    # Dependencies that share a left-hand side share its sorted runs, which hold only the columns they look at
+    sorts = {}
+    for kind, lhs, rhs, rest in checks:
+        state = sorts.setdefault(tuple(lhs), {"lhs": lhs, "columns": set(), "buffer": [], "runs": []})
+        state["columns"].update(rhs + rest if kind == "mvd" else rhs)
+    for state in sorts.values():
+        state["columns"] = [col for col in headers if col in state["columns"]]
+        state["projector"] = make_projector([positions[col] for col in state["lhs"]])
+        state["payload"] = make_projector([positions[col] for col in state["columns"]])
+
+    def spill():
+        for state in sorts.values():
+            run = tempfile.TemporaryFile(dir=spill_dir)
+            state["buffer"].sort()
+            write_run(run, state["buffer"])
+            state["buffer"] = []
+            state["runs"].append(run)
+
+    violations = []
+    try:
+        row = 0
+        buffered = 0
+        iterator = iter(records)
+        for chunk in iter(lambda: list(itertools.islice(iterator, BULK_BATCH_SIZE)), []):
+            # Rows are numbered as in a ColumnStore, which skips malformed records
+            rows = [tuple(record) for record in chunk if len(record) == len(headers)]
+            numbers = range(row, row + len(rows))
+            row += len(rows)
+            for state in sorts.values():
+                state["buffer"].extend(zip(map(state["projector"], rows), numbers, map(state["payload"], rows)))
+            buffered += len(rows)
+            if buffered >= run_rows:
+                spill()
+                buffered = 0
+
+        for kind, lhs, rhs, rest in checks:
+            state = sorts[tuple(lhs)]
+            rhs_projector = make_projector([state["columns"].index(col) for col in rhs])
+            if kind == "mvd":
+                rest_projector = make_projector([state["columns"].index(col) for col in rest]) if rest else lambda record: ()
+            groups, missing, first_rows = 0, 0, []
+            merged = heapq.merge(sorted(state["buffer"]), *map(read_run, state["runs"]))
+            for _, entries in itertools.groupby(merged, operator.itemgetter(0)):
+                entries = list(entries)
+                rhs_values = set(map(rhs_projector, map(operator.itemgetter(2), entries)))
+                if kind == "fd":
+                    violated = len(rhs_values) > 1
+                else:
+                    rest_values = set(map(rest_projector, map(operator.itemgetter(2), entries)))
+                    pairs = {(rhs_projector(record), rest_projector(record)) for _, _, record in entries}
+                    expected = len(rhs_values) * len(rest_values)
+                    violated = len(pairs) != expected
+                    missing += expected - len(pairs)
+                if violated:
+                    groups += 1
+                    first_rows = heapq.nsmallest(max_rows, first_rows + [number for _, number, _ in entries])
+            if groups:
+                violations.append(
+                    {"kind": kind, "lhs": lhs, "rhs": rhs, "groups": groups, "missing_rows": missing, "rows": first_rows}
+                )
+    finally:
+        for state in sorts.values():
+            for run in state["runs"]:
+                run.close()
+    return violations
+
+##### ^ DEPENDENCY VALIDATION ^ #####
+##### v APPROXIMATE VALIDATION v #####
+
+
+SAMPLE_SIZE = 100_000
+APPROX_THRESHOLD = 0.01  # Largest error at which a dependency still counts as holding
+APPROX_CONFIDENCE = 0.95
+
+
+def reservoir_sample(records, size=SAMPLE_SIZE, seed=0):
+    """Draws a uniform sample of up to size records in one pass, returning the sample and the number of records seen.
+
+    Uses Algorithm L, which computes how many records to skip before the next replacement instead of drawing for each record."""
+    rng = random.Random(seed)
+    counter = itertools.count()
+    # zip advances the counter once per record pulled, plus once when the records run out
+    iterator = map(operator.itemgetter(1), zip(counter, records))
+    sample = list(itertools.islice(iterator, size))
+    if len(sample) < size or not size:
+        return sample, next(counter) - 1
+    uniform = lambda: max(rng.random(), sys.float_info.min)
+    weight = math.exp(math.log(uniform()) / size)
+    while True:
+        skip = int(math.log(uniform()) / math.log1p(-weight))
+        # The skipped records are consumed at C speed
+        record = next(itertools.islice(iterator, skip, None), None)
+        if record is None:
+            return sample, next(counter) - 1
+        sample[rng.randrange(size)] = record
+        weight *= math.exp(math.log(uniform()) / size)
+
+
+def stable_priority(seed, key):
+    """Returns a pseudo-random priority for a value that, unlike hash(), is the same in every process and run."""
+    digest = hashlib.blake2b(repr((seed, key)).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class KeySample:
+    """Bottom-k sample of the distinct values of some columns that keeps every record of each sampled value.
+
+    Each value gets a pseudo-random priority from a hash of the value and the seed, and the size values with
+    the lowest priorities are kept, so the sampled LHS groups are a uniform sample of all groups and each one is complete."""
+
+    __slots__ = ("projector", "size", "seed", "groups", "heap", "complete")
+
+    def __init__(self, indexes, size=SAMPLE_SIZE, seed=0):
+        # A bare value for a single column; the keys only need to be consistent within the sample
+        self.projector = operator.itemgetter(*indexes)
+        self.size = size
+        self.seed = seed
+        self.groups = {}  # value -> its records
+        self.heap = []  # (-priority, value) of the sampled values, highest priority on top
+        self.complete = True  # False once a value has been left out
+
+    def add(self, record, priority=None):
+        """Adds one record, keeping it only if its value is in the sample."""
+        key = self.projector(record)
+        rows = self.groups.get(key)
+        if rows is not None:
+            rows.append(record)
+            return
+        # Priorities never change, so a value evicted once is rejected again when it reappears
+        if priority is None:
+            priority = stable_priority(self.seed, key)
+        if len(self.heap) < self.size:
+            heapq.heappush(self.heap, (-priority, key))
+        else:
+            self.complete = False
+            if not self.heap or priority >= -self.heap[0][0]:
+                return
+            _, evicted = heapq.heapreplace(self.heap, (-priority, key))
+            del self.groups[evicted]
+        self.groups[key] = [record]
+
+    def extend(self, records):
+        """Adds a list of records, passing to add() only those whose value is sampled or may enter the sample."""
+        keys = list(map(self.projector, records))
+        # Values repeat within a chunk, so each distinct one that is not sampled yet is hashed once
+        priorities = {key: stable_priority(self.seed, key) for key in set(keys).difference(self.groups)}
+        threshold = -self.heap[0][0] if len(self.heap) >= self.size and self.heap else math.inf
+        # The threshold only falls while records are added, so the one at the start admits a superset
+        candidates = map(
+            operator.or_,
+            map(operator.lt, map(priorities.get, keys, itertools.repeat(math.inf)), itertools.repeat(threshold)),
+            map(self.groups.__contains__, keys),
+        )
+        added = 0
+        for record, key in itertools.compress(zip(records, keys), candidates):
+            self.add(record, priorities.get(key))
+            added += 1
+        if added < len(records):
+            self.complete = False  # Some records had a value that was rejected without calling add()
+
+    def records(self):
+        """Yields the records of every sampled value."""
+        for rows in self.groups.values():
+            yield from rows
+
+
+def hoeffding_bound(samples, confidence=APPROX_CONFIDENCE):
+    """Returns the half-width of the Hoeffding interval for a mean of samples independent values in [0, 1]."""
+    if not samples:
+        return 1.0
+    return math.sqrt(math.log(2 / (1 - confidence)) / (2 * samples))
+
+
+def g3_error(store, lhs, rhs, lhs_keys=None):
+    """Returns the g3 error of lhs -> rhs: the fraction of rows that must be removed for the FD to hold."""
+    if not len(store):
+        return 0.0
+    if lhs_keys is None:
+        lhs_keys, _ = packed_keys(store, lhs)
+    rhs_keys, radix = packed_keys(store, rhs)
+    # Each LHS group keeps the rows of its most common RHS value
+    kept = {}
+    for key, count in collections.Counter(combine_keys(lhs_keys, rhs_keys, radix)).items():
+        group = key // radix
+        if count > kept.get(group, 0):
+            kept[group] = count
+    return 1 - sum(kept.values()) / len(store)
+
+
+def sampled_group_shares(records, headers, checks):
+    """Returns, for each (lhs, rhs, sampled LHS values) check, the fraction of each sampled group that lhs -> rhs removes.
+
+    The groups are counted in one more pass over the records. Only the RHS values of the sampled groups are counted, so memory grows with the sample and not with the input."""
+    positions = {col: index for index, col in enumerate(headers)}
+    # Plain itemgetters skip make_projector's tuple for a single column; the caller keys the sampled rows the same way
+    projectors = [
+        (operator.itemgetter(*(positions[col] for col in lhs)), operator.itemgetter(*(positions[col] for col in rhs)), wanted)
+        for lhs, rhs, wanted in checks
+    ]
+    counts = [collections.Counter() for _ in checks]
+    iterator = iter(records)
+    for chunk in iter(lambda: list(itertools.islice(iterator, BULK_BATCH_SIZE)), []):
+        rows = [record for record in chunk if len(record) == len(headers)]
+        for (lhs_projector, rhs_projector, wanted), counter in zip(projectors, counts):
+            keys = list(map(lhs_projector, rows))
+            sampled = list(map(wanted.__contains__, keys))
+            counter.update(zip(itertools.compress(keys, sampled), map(rhs_projector, itertools.compress(rows, sampled))))
+    shares = []
+    for counter in counts:
+        sizes, largest = collections.Counter(), {}
+        for (key, _), count in counter.items():
+            sizes[key] += count
+            largest[key] = max(largest.get(key, 0), count)
+        shares.append({key: 1 - largest[key] / size for key, size in sizes.items()})
+    return shares
+
+
+def mvd_error(store, lhs, rhs, rest, lhs_keys=None):
+    """Returns the fraction of LHS groups in which lhs ->> rhs does not hold."""
+    if lhs_keys is None:
+        lhs_keys, _ = packed_keys(store, lhs)
+    total = len(set(lhs_keys))
+    if not total:
+        return 0.0
+    groups, _ = check_mvd(store, lhs, rhs, rest, lhs_keys)
+    return len(groups) / total
+
+
+def approximate_dependencies(
+    records,
+    fds,
+    mvds=(),
+    headers=None,
+    sample_size=SAMPLE_SIZE,
+    threshold=APPROX_THRESHOLD,
+    confidence=APPROX_CONFIDENCE,
+    seed=0,
+):
+    """Estimates how far every FD and MVD is from holding from samples of the records.
+
+    FDs are measured by their g3 error: the fraction of rows that must be removed for the FD to hold. One
+    reservoir sample of rows serves every FD. The g3 error of the sampled rows alone can only undercount, as
+    a group's most common value among its sampled rows may be a minority in the whole group, so it bounds the
+    error from below and settles the FDs that clearly do not hold. For the others, one more pass counts the
+    RHS values of just the sampled rows' LHS groups, and each sampled row scores the fraction of its group
+    that would be removed. Those scores average to the g3 error over uniformly sampled rows.
+    An MVD cannot be judged on scattered rows, so it is measured by the fraction of violating LHS groups in
+    a bottom-k sample of complete groups, drawn in the same pass as the reservoir.
+    Each estimate comes with a Hoeffding interval at the given confidence. A dependency holds when its
+    interval lies below the threshold and is violated when the interval lies above it; when the interval
+    contains the threshold, the dependency is checked exactly on all the records instead."""
+    headers = list(headers or records.headers)
+    positions = {col: index for index, col in enumerate(headers)}
+    dependencies = []
+    for kind, declared in (("fd", fds), ("mvd", mvds or [])):
+        for dependency in declared:
+            lhs = [col for col in as_attribute_list(dependency["lhs"]) if col in positions]
+            rhs = [col for col in as_attribute_list(dependency["rhs"]) if col in positions and col not in lhs]
+            if len(lhs) < len(as_attribute_list(dependency["lhs"])) or not rhs:
+                continue  # Dependencies on columns that are not in the data cannot be checked
+            dependencies.append((kind, lhs, rhs))
+
+    # MVDs sharing an LHS share one key sample, filled while the reservoir sample streams the records
+    key_samples = {
+        tuple(lhs): KeySample([positions[col] for col in lhs], sample_size, seed)
+        for kind, lhs, _ in dependencies
+        if kind == "mvd"
+    }
+    # Kept as tuples, which the garbage collector stops scanning once they hold only strings, unlike lists
+    stream = map(tuple, records)
+    if key_samples:
+
+        def observed(records):
+            iterator = iter(records)
+            # Chunks let the key samples reject most records without a Python call per record
+            for chunk in iter(lambda: list(itertools.islice(iterator, BULK_BATCH_SIZE)), []):
+                rows = [record for record in chunk if len(record) == len(headers)]
+                for key_sample in key_samples.values():
+                    key_sample.extend(rows)
+                yield from chunk
+
+        stream = observed(stream)
+    sample, seen = reservoir_sample(stream, sample_size, seed)
+    sample = [record for record in sample if len(record) == len(headers)]
+    row_sample = ColumnStore.from_records(headers, sample)
+    group_samples = {lhs: ColumnStore.from_records(headers, key_sample.records()) for lhs, key_sample in key_samples.items()}
+
+    reports = []
+    for kind, lhs, rhs in dependencies:
+        if kind == "fd":
+            # A sample that holds all the rows is already exact
+            complete = seen <= sample_size
+            error = g3_error(row_sample, lhs, rhs)
+            samples = len(row_sample)
+        else:
+            rest = [col for col in headers if col not in lhs and col not in rhs]
+            complete = key_samples[tuple(lhs)].complete
+            error = mvd_error(group_samples[tuple(lhs)], lhs, rhs, rest)
+            samples = len(key_samples[tuple(lhs)].groups)
+        margin = 0.0 if complete else hoeffding_bound(samples, confidence)
+        lower, upper = max(0.0, error - margin), min(1.0, error + margin)
+        if kind == "fd" and not complete:
+            upper = 1.0  # Unknown until the sampled groups are counted
+        reports.append(
+            {
+                "kind": kind,
+                "lhs": lhs,
+                "rhs": rhs,
+                "measure": "g3" if kind == "fd" else "violating_groups",
+                "error": error,
+                "lower": lower,
+                "upper": upper,
+                "samples": samples,
+                "exact": complete,
+            }
+        )
+
+    # FDs whose lower bound does not already rule them out get their sampled groups counted
+    unsettled = [
+        report for report in reports if report["kind"] == "fd" and not report["exact"] and report["lower"] <= threshold
+    ]
+    if unsettled:
+        sample_keys = {
+            tuple(report["lhs"]): list(map(operator.itemgetter(*(positions[col] for col in report["lhs"])), sample))
+            for report in unsettled
+        }
+        checks = [(report["lhs"], report["rhs"], set(sample_keys[tuple(report["lhs"])])) for report in unsettled]
+        for report, shares in zip(unsettled, sampled_group_shares(records, headers, checks)):
+            keys = sample_keys[tuple(report["lhs"])]
+            error = sum(map(shares.__getitem__, keys)) / len(keys)
+            margin = hoeffding_bound(len(keys), confidence)
+            report.update(error=error, lower=max(0.0, error - margin), upper=min(1.0, error + margin))
+
+    exact_store = None
+    for report in reports:
+        kind, lhs, rhs = report["kind"], report["lhs"], report["rhs"]
+        if report["lower"] <= threshold < report["upper"]:
+            # Too close to call from the sample, so this dependency alone is checked on every record
+            if exact_store is None:
+                exact_store = records if isinstance(records, ColumnStore) else ColumnStore.from_records(headers, records)
+            if kind == "fd":
+                error = g3_error(exact_store, lhs, rhs)
+            else:
+                error = mvd_error(exact_store, lhs, rhs, [col for col in headers if col not in lhs and col not in rhs])
+            report.update(error=error, lower=error, upper=error, exact=True)
+        report["holds"] = report["upper"] <= threshold
+    return reports
+
+##### ^ APPROXIMATE VALIDATION ^ #####
+##### v NORMALIZER SEGMENTS v #####
+
+
+def generate_table_name(prefix, columns, primary_key=()):
+    """Generates a table name from a prefix and a hash of the relation's attributes and key."""
+    # The same attributes and key always produce the same name, so schemas can be compared between runs
+    content = json.dumps([sorted(columns), sorted(primary_key)])
+    return f"{prefix}_{hashlib.sha1(content.encode()).hexdigest()[:10]}"
+
+
+def ordered_columns(attributes, columns):
+    """Returns the attributes in the order they appear in the relation's columns."""
+    return [col for col in columns if col in attributes]
+
+
+# Beginning of normilization
+# How a multi-valued column is flattened: crossed with the others, or paired positionally with other "zip" columns
+EXPANSION_MODES = ("product", "zip")
+
+
+def split_multivalued(value):
+    """Splits a multi-valued field into its atomic values."""
+    if "," not in value:  # Check if the value is multi-valued
+        return [value]
+    return [v.strip() for v in value.split(",")]
+
+
+def zip_positions(headers, expansion):
+    """Returns the positions of the columns that are expanded positionally rather than by Cartesian product."""
+    positions = set()
+    for col, mode in (expansion or {}).items():
+        if mode not in EXPANSION_MODES:
+            raise ValueError(f"Unknown expansion mode '{mode}' for column {col}; expected one of {EXPANSION_MODES}")
+        if mode == "zip":
+            positions.add(headers.index(col))
+    return positions
+
+
+def record_fanout(record, zipped=()):
+    """Returns how many atomic records a record expands into."""
+    fanout = 1
+    zip_length = 1
+    for index, value in enumerate(record):
+        count = value.count(",") + 1
+        if index in zipped:
+            zip_length = max(zip_length, count)
+        else:
+            fanout *= count
+    return fanout * zip_length
+
+
+def expand_record(record, zipped=()):
+    """Yields the atomic records of one record: the Cartesian product of its multi-valued columns, with zip columns paired."""
+    positions = []
+    axes = []
+    zip_columns = []
+    for index, value in enumerate(record):
+        if "," not in value:
+            continue
+        if index in zipped:
+            zip_columns.append((index, split_multivalued(value)))
+        else:
+            positions.append((index,))
+            axes.append([(v,) for v in split_multivalued(value)])
+    if not axes and not zip_columns:
+        yield record
+        return
+    if zip_columns:
+        # Shorter zip columns are padded so every position of the longest one is kept
+        positions.append(tuple(index for index, _ in zip_columns))
+        axes.append(list(itertools.zip_longest(*(values for _, values in zip_columns), fillvalue="NULL")))
+    for combination in itertools.product(*axes):
+        new_record = list(record)
+        for indexes, values in zip(positions, combination):
+            for index, v in zip(indexes, values):
+                new_record[index] = v
+        yield new_record
+
+
+def iter_1nf(records, headers=None, expansion=None, max_fanout=None):
+    """Lazily yields the records with every multi-valued field flattened."""
+    zipped = zip_positions(headers, expansion) if expansion else set()
+    for record in records:
+        # Checks the fan-out before expanding so a single wide row cannot exhaust memory
+        if max_fanout is not None:
+            fanout = record_fanout(record, zipped)
+            if fanout > max_fanout:
+                raise ValueError(f"Record {record[0]} expands into {fanout} rows, above the limit of {max_fanout}")
+        yield from expand_record(record, zipped)
+
+
+def fanout_1nf(records, headers, expansion=None):
+    """Reports how many rows the 1NF expansion will produce without expanding anything."""
+    zipped = zip_positions(headers, expansion) if expansion else set()
+    report = {"rows": 0, "expanded_rows": 0, "max_fanout": 0, "max_fanout_row": None}
+    for record in records:
+        fanout = record_fanout(record, zipped)
+        report["rows"] += 1
+        report["expanded_rows"] += fanout
+        if fanout > report["max_fanout"]:
+            report["max_fanout"] = fanout
+            report["max_fanout_row"] = record[0] if record else None
+    return report
+
+
+class FlatRecords:
+    """Re-iterable, lazy 1NF view of some records; each iteration expands them again."""
+
+    __slots__ = ("records", "headers", "expansion", "max_fanout")
+
+    def __init__(self, records, headers, expansion=None, max_fanout=None):
+        self.records = records
+        self.headers = headers
+        self.expansion = expansion
+        self.max_fanout = max_fanout
+
+    def __iter__(self):
+        return iter_1nf(self.records, self.headers, self.expansion, self.max_fanout)
+
+
+def ensure_1nf(relation, records, expansion=None, max_fanout=None):
+    """Ensures the relation is in 1NF by flattening any multi-valued columns."""
+    headers = relation["columns"]
+    # Creates a new table name for the normalized relation
+    new_table_name = generate_table_name("CoffeeShop_1NF", headers)
+    # Defines the structure of the new table based on headers; records are produced lazily
+    new_relation = {
+        "table_name": new_table_name,
+        "columns": headers,
+        # Flattening repeats the declared key across the expanded rows, so the 1NF relation starts without one
+        "primary_key": [],
+        "records": FlatRecords(records, headers, expansion, max_fanout),
+    }
+    # Returns a list containing the new relation to match expected structure
+    return [new_relation]  # Returns as a list
+
+
+def ensure_2nf(relation, fds):
+    """Ensures the relation is in 2NF by decomposing into relations with partial dependencies."""
+    decomposed_relations = []
+    table_name = relation["table_name"]
+    primary_key = set(relation.get("primary_key", []))  # Safely gets primary key
+    columns = relation["columns"]
+    engine = DependencyEngine(columns, fds)
+    candidate_keys = [set(key) for key in engine.candidate_keys(columns)]
+    prime_attributes = set().union(*candidate_keys)
+    moved_columns = set()
+    seen_lhs = set()
+
+    for fd in fds:
+        lhs = set(as_attribute_list(fd["lhs"]))
+        if frozenset(lhs) in seen_lhs:
+            continue
+        seen_lhs.add(frozenset(lhs))
+        # Moves every non-prime attribute the LHS determines, not only the ones listed in this FD
+        determined = engine.decode(engine.closure(engine.encode(lhs)))
+        rhs = {attr for attr in determined if attr in columns and attr not in prime_attributes}
+
+        # A partial dependency is a non-prime attribute depending on part of a candidate key
+        if rhs and any(lhs < key for key in candidate_keys):
+            new_columns = [col for col in columns if col in lhs or col in rhs]
+            new_primary_key = [col for col in columns if col in lhs]
+            decomposed_relations.append(
+                {
+                    "table_name": generate_table_name("CoffeeShop_2NF", new_columns, new_primary_key),
+                    "columns": new_columns,
+                    "primary_key": new_primary_key,
+                }
+            )
+            moved_columns.update(rhs)
+
+    # The key keeps the column order so the same relation always gets the same DDL
+    ordered_key = ordered_columns(primary_key, columns) + sorted(primary_key.difference(columns))
+    if not decomposed_relations:
+        # Later stages read the key, so it is attached even when nothing is split off
+        return [dict(relation, primary_key=ordered_key)]
+    remaining_columns = [col for col in columns if col not in moved_columns]
+    if remaining_columns:
+        decomposed_relations.append(
+            {
+                "table_name": table_name,
+                "columns": remaining_columns,
+                "primary_key": ordered_key,  # Ensures primary key is added to remaining columns
+            }
+        )
+
+    return decomposed_relations
+
+
+def is_superkey(lhs, relation, engine=None):
+    """Checks if the given left-hand side is a superkey in the relation."""
+    if engine is not None:
+        # Uses the attribute closure under the FDs rather than comparing against declared keys
+        return engine.is_superkey(as_attribute_list(lhs), relation["columns"])
+    candidate_keys = relation.get("candidate_keys", [])
+    return set(lhs) == set(relation.get("primary_key", [])) or any(
+        set(lhs) == set(candidate_key) for candidate_key in candidate_keys
+    )
+
+
+def remainder_columns(columns, splits):
+    """Returns the columns left in a relation after moving out the (lhs, rhs) splits, in their original order.
+
+    Every split's rhs leaves the relation. Each fragment then joins back losslessly as long as its lhs can
+    be reached from the remainder through other fragments, so the lhs of a split that nothing reaches
+    (for example two LHSs that determine each other) is kept in the remainder."""
+    remaining = set(columns).difference(*(rhs for _, rhs in splits))
+    while True:
+        reached = set(remaining)
+        changed = True
+        while changed:
+            changed = False
+            for lhs, rhs in splits:
+                if reached.issuperset(lhs) and not reached.issuperset(rhs):
+                    reached.update(rhs)
+                    changed = True
+        stranded = next((lhs for lhs, _ in splits if not reached.issuperset(lhs)), None)
+        if stranded is None:
+            return [col for col in columns if col in remaining]
+        remaining.update(stranded)
+
+
+def ensure_3nf(relation, fds):
+    """Ensures the relation is in 3NF by removing transitive dependencies."""
+    decomposed_relations = []
+    table_name = relation["table_name"]
+    columns = relation["columns"]
+    engine = DependencyEngine(columns, fds)
+    prime_attributes = engine.prime_attributes(columns)
+    splits = []
+
+    for fd in fds:
+        lhs = as_attribute_list(fd["lhs"])
+        if not set(lhs).issubset(columns):
+            continue  # The FD does not apply to this relation
+        rhs = [
+            attr
+            for attr in as_attribute_list(fd["rhs"])
+            if attr in columns and attr not in lhs and attr not in prime_attributes
+        ]
+
+        # A transitive dependency has a non-superkey LHS determining a non-prime attribute
+        if rhs and not is_superkey(lhs, relation, engine):
+            if any(set(lhs + rhs) == set(split_lhs + split_rhs) for split_lhs, split_rhs in splits):
+                continue  # LHSs that determine each other would split off the same columns twice
+            new_relation_name = generate_table_name("CoffeeShop_3NF", lhs + rhs, lhs)
+            decomposed_relations.append(
+                {
+                    "table_name": new_relation_name,
+                    "columns": lhs + rhs,
+                    "primary_key": lhs,
+                }
+            )
+            splits.append((lhs, rhs))
+
+    if not decomposed_relations:
+        return [relation]
+    remaining_columns = remainder_columns(columns, splits)
+    if remaining_columns:
+        decomposed_relations.append(
+            {
+                "table_name": table_name,
+                "columns": remaining_columns,
+                "primary_key": relation.get("primary_key", []),
+            }
+        )
+
+    return decomposed_relations
+
+
+def ensure_bcnf(relation, fds):
+    """Ensures the relation is in BCNF by removing violations of the BCNF definition."""
+    decomposed_relations = []
+    table_name = relation["table_name"]
+    columns = relation["columns"]
+    engine = DependencyEngine(columns, fds)
+    splits = []
+
+    for fd in fds:
+        lhs = as_attribute_list(fd["lhs"])
+        if not set(lhs).issubset(columns):
+            continue  # The FD does not apply to this relation
+        rhs = [attr for attr in as_attribute_list(fd["rhs"]) if attr in columns and attr not in lhs]
+
+        # Checks for BCNF violation
+        if rhs and not is_superkey(lhs, relation, engine):
+            if any(set(lhs + rhs) == set(split_lhs + split_rhs) for split_lhs, split_rhs in splits):
+                continue  # LHSs that determine each other would split off the same columns twice
+            new_relation_name = generate_table_name("CoffeeShop_BCNF", lhs + rhs, lhs)
+            # Creates a new relation that contains the lhs and rhs
+            decomposed_relations.append(
+                {
+                    "table_name": new_relation_name,
+                    "columns": lhs + rhs,
+                    "primary_key": lhs,
+                }
+            )
+            # Removes the rhs from the original relation
+            splits.append((lhs, rhs))
+
+    if not decomposed_relations:
+        return [relation]
+    remaining_columns = remainder_columns(columns, splits)
+    if remaining_columns:
+        decomposed_relations.append(
+            {
+                "table_name": table_name,
+                "columns": remaining_columns,
+                "primary_key": relation.get("primary_key", []),
+            }
+        )
+
+    return decomposed_relations
+
+
+def validate_mvd(records, lhs, rhs, headers, rest=None):
+    """Validates the given MVD: it holds, and is not just an FD, when every LHS group is the cross product of its RHS and remaining values."""
+    if headers is None:
+        return False
+    if lhs is None or rhs is None:
+        return False  # Returns early if there's a problem
+
+    lhs = list(lhs)  # Converts to list for indexing
+    rhs = list(rhs)
+    # Groups on integer codes, so plain record lists are encoded first
+    if not isinstance(records, ColumnStore):
+        records = ColumnStore.from_records(headers, records)
+    headers = records.headers
+
+    # Ensures all lhs and rhs headers exist in headers
+    for header in lhs + rhs:
+        if header not in headers:
+            return False
+    if rest is None:
+        rest = [col for col in headers if col not in lhs and col not in rhs]
+    rest = [col for col in rest if col in records.positions]
+
+    lhs_keys, _ = packed_keys(records, lhs)
+    groups, _ = check_mvd(records, lhs, rhs, rest, lhs_keys)
+    if groups:
+        return False
+
+    # Requires some LHS to have more than one independent RHS value; otherwise lhs -> rhs is an FD
+    return bool(check_fd(records, lhs, rhs, lhs_keys))
+
+
+def ensure_4nf(relation, mvds, records, fds=None, applied=None):
+    """Ensures the relation is in 4NF by validating multi-valued dependencies and decomposing as necessary.
+
+    A valid lhs ->> rhs splits R into lhs + rhs and lhs + rest, each keyed by all of its columns since
+    the MVD implies no smaller key, and both fragments are checked again for the remaining MVDs. Every
+    MVD a relation is split along is appended to applied, when given, as the join dependency
+    *[lhs+rhs, lhs+rest] that it is equivalent to."""
+    table_name = relation["table_name"]
+    headers = relation["columns"]
+    engine = DependencyEngine(headers, fds or [])
+
+    for mvd in mvds:
+        if "lhs" not in mvd or "rhs" not in mvd:
+            continue  # Skips if missing data
+
+        lhs = set(as_attribute_list(mvd["lhs"]))  # Ensures these are sets for uniqueness
+        # Projects the MVD onto this relation; it only applies if the relation holds its LHS
+        rhs = set(as_attribute_list(mvd["rhs"])) & set(headers)
+        if not lhs.issubset(headers) or not rhs - lhs or lhs | rhs == set(headers):
+            continue  # Trivial within this relation
+
+        # An MVD whose LHS is a superkey does not violate 4NF
+        if is_superkey(lhs, relation, engine):
+            continue
+
+        # Checks if this MVD is valid by analyzing actual records
+        rest = [col for col in headers if col not in lhs and col not in rhs]
+        if not validate_mvd(records, lhs, rhs, getattr(records, "headers", headers), rest):
+            continue
+        rhs_columns = ordered_columns(lhs | rhs, headers)
+        rest_columns = ordered_columns(lhs.union(rest), headers)
+        if applied is not None:
+            applied.append([rhs_columns, rest_columns])
+        fragments = [
+            {
+                "table_name": generate_table_name("CoffeeShop_4NF_rhs", rhs_columns, rhs_columns),
+                "columns": rhs_columns,
+                "primary_key": rhs_columns,
+            },
+            # The LHS and the remaining columns keep the relation's name
+            {"table_name": table_name, "columns": rest_columns, "primary_key": rest_columns},
+        ]
+        # The fragments may still violate other MVDs, so each one is decomposed further
+        decomposed_relations = []
+        for fragment in fragments:
+            decomposed_relations.extend(ensure_4nf(fragment, mvds, records, fds, applied))
+        return decomposed_relations
+
+    return [relation]
+
+JD_MAX_COMPONENTS = 3
+# Below this many candidates the process pool costs more than it saves
+JD_PARALLEL_MIN_CANDIDATES = 32
+_JD_ROWS = None
+
+
+def _init_jd_worker(rows):
+    """Stores the relation's distinct rows in a worker process."""
+    global _JD_ROWS
+    _JD_ROWS = rows
+
+
+def pair_join_groups(rows, first, second):
+    """Groups the rows on every column except first and second, collecting both columns' values per group."""
+    width = len(next(iter(rows)))
+    shared = make_projector([index for index in range(width) if index not in (first, second)])
+    groups = {}
+    for row in rows:
+        left, right = groups.setdefault(shared(row), (set(), set()))
+        left.add(row[first])
+        right.add(row[second])
+    return groups
+
+
+def is_lossless_pair(rows, first, second):
+    """Checks *[R - first, R - second] by comparing the size of the join with the relation's."""
+    width = len(next(iter(rows)))
+    shared = [index for index in range(width) if index not in (first, second)]
+    drop_last = operator.itemgetter(slice(None, -1))
+    # Counts the distinct values of each joined column per group of shared values
+    left = collections.Counter(map(drop_last, set(map(make_projector(shared + [first]), rows))))
+    right = collections.Counter(map(drop_last, set(map(make_projector(shared + [second]), rows))))
+    return sum(count * right[key] for key, count in left.items()) == len(rows)
+
+
+def _jd_pair_task(pair):
+    """Tests the two-way JD *[R - first, R - second] on the worker's rows."""
+    return is_lossless_pair(_JD_ROWS, *pair)
+
+
+def _jd_task(removed):
+    """Tests *[R - a for a in removed] on the worker's rows, stopping at the first spurious tuple."""
+    return holds_join_dependency(_JD_ROWS, removed)
+
+
+def holds_join_dependency(rows, removed):
+    """Checks whether joining the projections R - a for every a in removed gives back exactly the rows."""
+    first, second, *others = removed
+    width = len(next(iter(rows)))
+    filters = []
+    for other in others:
+        project = make_projector([index for index in range(width) if index != other])
+        filters.append((project, set(map(project, rows))))
+    for shared, (left, right) in pair_join_groups(rows, first, second).items():
+        if len(left) == 1 or len(right) == 1:
+            continue  # A group with one value on either side cannot produce a new tuple
+        for left_value in left:
+            for right_value in right:
+                row = list(shared)
+                # Re-inserts the two joined columns at their positions
+                for index, value in sorted(((first, left_value), (second, right_value))):
+                    row.insert(index, value)
+                row = tuple(row)
+                if row in rows:
+                    continue
+                # The tuple is spurious unless some other projection filters it out
+                if all(project(row) in projection for project, projection in filters):
+                    return False
+    return True
+
+
+def implied_by_keys(components, keys):
+    """Fagin's test: a JD is implied by the keys when merging components that share a key yields the whole relation."""
+    components = [set(component) for component in components]
+    merged = True
+    while merged and len(components) > 1:
+        merged = False
+        for i, j in itertools.combinations(range(len(components)), 2):
+            if any(key <= components[i] & components[j] for key in keys):
+                components[i] |= components.pop(j)
+                merged = True
+                break
+    return len(components) == 1
+
+
+def find_join_dependencies(records, columns, fds=None, workers=None, max_components=JD_MAX_COMPONENTS):
+    """Identifies join dependencies *[R - a1, ..., R - ak] (k >= 3) that hold in the data and are not implied by the keys or an MVD."""
+    columns = list(columns)
+    if not isinstance(records, ColumnStore):
+        records = ColumnStore.from_records(getattr(records, "headers", columns), records)
+    if len(columns) < 3 or any(col not in records.positions for col in columns):
+        return []
+    # The distinct rows as tuples of codes, which are also cheap to ship to worker processes
+    rows = set(records.project(columns))
+    if not rows:
+        return []
+    engine = DependencyEngine(columns, fds or [])
+    workers = workers or os.cpu_count() or 1
+    pool = None
+
+    def run_tests(task, tests):
+        # Large batches of tests are spread across a process pool that holds the rows once per worker
+        nonlocal pool
+        if workers == 1 or len(tests) < JD_PARALLEL_MIN_CANDIDATES:
+            _init_jd_worker(rows)
+            return list(map(task, tests))
+        if pool is None:
+            pool = ProcessPoolExecutor(workers, initializer=_init_jd_worker, initargs=(rows,))
+        return list(pool.map(task, tests, chunksize=max(1, len(tests) // (workers * 4))))
+
+    try:
+        return _find_join_dependencies(rows, columns, engine, max_components, run_tests)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+def _find_join_dependencies(rows, columns, engine, max_components, run_tests):
+    """Prunes and tests the candidate JDs of find_join_dependencies."""
+    join_deps = []
+    width = len(columns)
+    keys = [set(key) for key in engine.candidate_keys(columns)]
+
+    # Two-way JDs are MVDs; a k-way JD containing a lossless pair is implied by it and left to 4NF
+    pairs = []
+    for first, second in itertools.combinations(range(width), 2):
+        shared = [col for index, col in enumerate(columns) if index not in (first, second)]
+        if engine.is_superkey(shared, shared + [columns[first]]) or engine.is_superkey(shared, shared + [columns[second]]):
+            continue  # The FD makes the pair lossless without looking at the data
+        pairs.append((first, second))
+    lossy_pairs = {pair for pair, lossless in zip(pairs, run_tests(_jd_pair_task, pairs)) if not lossless}
+
+    candidates = []
+    for size in range(3, min(max_components, width) + 1):
+        for removed in itertools.combinations(range(width), size):
+            if not all(pair in lossy_pairs for pair in itertools.combinations(removed, 2)):
+                continue
+            components = [[col for index, col in enumerate(columns) if index != other] for other in removed]
+            if implied_by_keys(components, keys):
+                continue
+            candidates.append(removed)
+
+    for removed, holds in zip(candidates, run_tests(_jd_task, candidates)):
+        if holds:
+            join_deps.append(
+                {"components": [[col for index, col in enumerate(columns) if index != other] for other in removed]}
+            )
+    return join_deps
+
+
+def ensure_5nf(relation, records, fds=None, workers=None, applied=None):
+    """Ensure the relation is in 5NF by handling join dependencies and decomposing as necessary.
+
+    The join dependency the relation is split along is appended to applied, when given."""
+    columns = relation["columns"]
+    engine = DependencyEngine(columns, fds or [])
+
+    # Identifies join dependencies by analyzing the data in records
+    join_deps = find_join_dependencies(records, columns, fds, workers)
+    if not join_deps:
+        return [relation]
+
+    # Decomposes along the first JD found; each component is keyed by its own candidate key
+    if applied is not None:
+        applied.append(join_deps[0]["components"])
+    decomposed_relations = []
+    for component in join_deps[0]["components"]:
+        component_key = ordered_columns(engine.candidate_keys(component)[0], component)
+        decomposed_relations.append(
+            {
+                "table_name": generate_table_name("CoffeeShop_5NF", component, component_key),
+                "columns": component,
+                "primary_key": component_key,
+            }
+        )
+    return decomposed_relations
+
+
+def run_stage(trace, name, stage, relation, *args):
+    """Runs one ensure_* stage on a relation and records it in the trace."""
+    with trace.stage(name) as entry:
+        relations = stage(relation, *args)
+        entry["relations_in"] += 1
+        entry["relations_out"] += len(relations)
+    return relations
+
+
+def normalize_relations(parsed_relations, fds, mvds=None, max_nf=6, records=None, trace=None, workers=None):
+    """Normalize relations up to the specified max normal form (1NF, 2NF, 3NF, BCNF, 4NF, or 5NF)."""
+    """Runs through normalizing stages up to the point that the user wants to normalze to (default=5NF)"""
+    plan = NormalizationPlan(fds, mvds, max_nf, records, trace, workers)
+    plan.run(parsed_relations)
+    return plan.relations()
+
+
+##### ^ NORMALIZER SEGMENTS ^ #####
+##### v NORMALIZATION PLAN v #####
+
+
+# Stage name and the max_nf value from which it runs
+PLAN_STAGES = (("1NF", 1), ("2NF", 2), ("3NF", 3), ("BCNF", 4), ("4NF", 5), ("5NF", 6))
+
+
+def relation_key(relation):
+    """Identifies a relation by its content: the set of its columns and its primary key."""
+    return frozenset(relation["columns"]), tuple(sorted(relation.get("primary_key", [])))
+
+
+class PlanNode:
+    """One distinct relation in the normalization plan and the results of the stages applied to it."""
+
+    __slots__ = ("key", "relation", "children", "seconds", "dependencies")
+
+    def __init__(self, key, relation):
+        self.key = key
+        self.relation = relation
+        self.children = {}  # stage -> keys of the relations it produced
+        self.seconds = {}  # stage -> time spent running it
+        self.dependencies = {}  # stage -> join dependencies, checked on the data, that the split relied on
+
+
+class NormalizationPlan:
+    """DAG of relations keyed by content; each (relation, stage) pair is computed once however many paths reach it."""
+
+    __slots__ = (
+        "fds", "mvds", "max_nf", "records", "trace", "workers", "nodes", "names", "roots", "frontiers", "stage_runs", "memo_hits",
+    )
+
+    def __init__(self, fds, mvds=None, max_nf=6, records=None, trace=None, workers=None):
+        self.fds = fds
+        self.mvds = mvds or []
+        self.max_nf = max_nf
+        self.records = records
+        self.trace = trace or PipelineTrace()
+        self.workers = workers
+        self.nodes = {}
+        self.names = {}  # table name -> key of the node that uses it
+        self.roots = []
+        self.frontiers = {}  # (key, depth) -> keys of the final relations below it
+        self.stage_runs = 0
+        self.memo_hits = 0
+
+    def stages(self):
+        """Returns the stages that run for max_nf, in order."""
+        return [stage for stage, level in PLAN_STAGES if level <= self.max_nf]
+
+    def add(self, relation, stage=None):
+        """Returns the key of the relation's node, merging it with an existing node of the same content."""
+        key = relation_key(relation)
+        if key not in self.nodes:
+            # Remainders keep their parent's name, so a name already taken by other content is regenerated
+            if self.names.get(relation["table_name"], key) != key:
+                primary_key = relation.get("primary_key", [])
+                relation = dict(relation, table_name=generate_table_name(f"CoffeeShop_{stage}", relation["columns"], primary_key))
+            self.nodes[key] = PlanNode(key, relation)
+            self.names[relation["table_name"]] = key
+        return key
+
+    def apply(self, key, stage):
+        """Runs one stage on a node, or reuses its result, and returns the keys of the relations it produced."""
+        node = self.nodes[key]
+        if stage in node.children:
+            self.memo_hits += 1
+            return node.children[stage]
+        relation = node.relation
+        applied = []
+        arguments = {
+            "1NF": (ensure_1nf, self.records),
+            "2NF": (ensure_2nf, self.fds),
+            "3NF": (ensure_3nf, self.fds),
+            "BCNF": (ensure_bcnf, self.fds),
+            "4NF": (ensure_4nf, self.mvds, self.records, self.fds, applied),
+            "5NF": (ensure_5nf, self.records, self.fds, self.workers, applied),
+        }[stage]
+        start = time.perf_counter()
+        produced = run_stage(self.trace, stage, arguments[0], relation, *arguments[1:])
+        node.seconds[stage] = time.perf_counter() - start
+        if applied:
+            node.dependencies[stage] = applied
+        self.stage_runs += 1
+        node.children[stage] = list(dict.fromkeys(self.add(child, stage) for child in produced))
+        return node.children[stage]
+
+    def expand(self, key, depth=0):
+        """Runs the remaining stages below a node and returns the keys of the final relations."""
+        stages = self.stages()
+        if depth >= len(stages):
+            return [key]
+        if (key, depth) in self.frontiers:
+            self.memo_hits += 1
+            return self.frontiers[(key, depth)]
+        children = self.apply(key, stages[depth])
+        frontier = []
+        for child in children:
+            frontier.extend(self.expand(child, depth + 1))
+        self.frontiers[(key, depth)] = list(dict.fromkeys(frontier))
+        return self.frontiers[(key, depth)]
+
+    def run(self, parsed_relations):
+        """Builds and executes the plan for every input relation."""
+        print("Running Normalizer")
+        for relation in parsed_relations.values():
+            key = self.add(relation)
+            self.roots.append(key)
+            self.expand(key)
+        return self
+
+    def frontier(self):
+        """Returns the keys of the final relations of every root, without duplicates."""
+        return list(dict.fromkeys(key for root in self.roots for key in self.frontiers.get((root, 0), [root])))
+
+    def relations(self):
+        """Returns the final relations in the format create_normalized_tables expects."""
+        return [self.nodes[key].relation for key in self.frontier()]
+
+    def estimated_rows(self, relation):
+        """Counts the distinct rows of the relation's projection when the records are in a ColumnStore."""
+        if isinstance(self.records, ColumnStore) and all(col in self.records.positions for col in relation["columns"]):
+            return len(self.records.project(relation["columns"]).distinct())
+        return None
+
+    def explain(self):
+        """Returns the decomposition tree with the time each stage took and the size of each relation."""
+        stages = self.stages()
+        final = set(self.frontier())
+        total = sum(sum(node.seconds.values()) for node in self.nodes.values())
+        lines = [
+            f"Normalization plan: {len(self.nodes)} distinct relations, {len(final)} final, "
+            f"{self.stage_runs} stage runs, {self.memo_hits} reused results, {total * 1000:.2f}ms"
+        ]
+        shown = set()
+
+        def describe(key):
+            relation = self.nodes[key].relation
+            rows = self.estimated_rows(relation)
+            text = f"{relation['table_name']} ({', '.join(relation['columns'])}) key ({', '.join(relation.get('primary_key', []))})"
+            if rows is not None:
+                text += f" ~{rows} rows"
+            return text + (" [final]" if key in final else "")
+
+        def walk(key, depth, indent):
+            lines.append("  " * indent + describe(key))
+            if key in shown:
+                lines[-1] += " (shared, expanded above)"
+                return
+            shown.add(key)
+            node = self.nodes[key]
+            # Stages that leave the relation unchanged are listed on one line
+            unchanged = []
+            while depth < len(stages) and node.children.get(stages[depth]) == [key]:
+                unchanged.append(f"{stages[depth]} {node.seconds[stages[depth]] * 1000:.2f}ms")
+                depth += 1
+            if unchanged:
+                lines.append("  " * (indent + 1) + "unchanged by " + ", ".join(unchanged))
+            if depth >= len(stages) or stages[depth] not in node.children:
+                return
+            stage = stages[depth]
+            children = node.children[stage]
+            lines.append(
+                "  " * (indent + 1) + f"{stage} {node.seconds[stage] * 1000:.2f}ms -> {len(children)} relation(s)"
+            )
+            for child in children:
+                walk(child, depth + 1, indent + 2)
+
+        for root in self.roots:
+            walk(root, 0, 0)
+        return "\n".join(lines)
+
+
+##### ^ NORMALIZATION PLAN ^ #####
+##### v SCHEMA SYNTHESIS v #####
+
+
+def relation_fds(columns, fds):
+    """Restricts the FDs to the relation: LHS inside it, RHS cut down to its columns."""
+    restricted = []
+    for fd in fds:
+        lhs = as_attribute_list(fd["lhs"])
+        rhs = [attr for attr in as_attribute_list(fd["rhs"]) if attr in columns and attr not in lhs]
+        if rhs and set(lhs) <= set(columns):
+            restricted.append({"lhs": lhs, "rhs": rhs})
+    return restricted
+
+
+def relation_key_mask(engine, mask, preferred=0):
+    """Returns one candidate key of the attributes in mask, keeping the preferred attributes when they are inside it."""
+    # Enumerating every candidate key is exponential; one key is found by minimizing the whole relation
+    return engine._minimize(mask, mask, preferred & mask)
+
+
+def synthesize_3nf(relation, fds):
+    """Decomposes a relation into 3NF by Bernstein synthesis from a minimal cover of its FDs.
+
+    Every group of FDs whose LHSs have the same closure becomes one relation keyed by its first LHS.
+    Relations contained in another are dropped, and a relation holding a key of the input is added if
+    none has one. The result is lossless and preserves every FD."""
+    columns = relation["columns"]
+    prefix = relation["table_name"]
+    engine = DependencyEngine(columns, relation_fds(columns, fds))
+    relation_mask = engine.encode(columns)
+
+    # LHSs with equal closures determine each other, so their FDs share one relation
+    groups = {}
+    for fd in engine.minimal_cover():
+        lhs = engine.encode(fd["lhs"])
+        group = groups.setdefault(engine.closure(lhs), {"keys": [], "mask": 0})
+        group["keys"].append(lhs)
+        group["mask"] |= lhs | engine.encode(fd["rhs"])
+    fragments = [(group["mask"] & relation_mask, group["keys"]) for group in groups.values()]
+    # Drops fragments contained in a larger one (or equal to an earlier one)
+    fragments = [
+        (mask, keys)
+        for index, (mask, keys) in enumerate(fragments)
+        if not any(
+            mask & ~other == 0 and (mask != other or other_index < index)
+            for other_index, (other, _) in enumerate(fragments)
+            if other_index != index
+        )
+    ]
+
+    key = relation_key_mask(engine, relation_mask, engine.encode(relation.get("primary_key", [])))
+    if not any(engine.determines(mask, relation_mask) for mask, _ in fragments):
+        fragments.append((key, [key]))
+
+    decomposed_relations = []
+    for mask, keys in fragments:
+        new_columns = ordered_columns(engine.decode(mask), columns)
+        new_primary_key = ordered_columns(engine.decode(keys[0]), columns)
+        decomposed_relations.append(
+            {
+                "table_name": generate_table_name(f"{prefix}_3NF", new_columns, new_primary_key),
+                "columns": new_columns,
+                "primary_key": new_primary_key,
+                "candidate_keys": [ordered_columns(engine.decode(other), columns) for other in keys],
+            }
+        )
+    return decomposed_relations
+
+
+# Relations up to this width are searched exhaustively for BCNF violations; wider ones only on the cover's LHSs
+BCNF_EXACT_COLUMNS = 12
+
+
+def bcnf_violation(engine, mask, cover):
+    """Returns an (lhs, determined) pair of bitmasks that violates BCNF in the relation, or None.
+
+    The LHSs of the cover are tried first. An FD that holds only in the projection can have another
+    LHS, so relations of up to BCNF_EXACT_COLUMNS columns are then searched exhaustively, smallest LHS
+    first. Wider relations are only checked on the cover's LHSs, so a violation of such a projected FD
+    can be missed there and None does not prove them in BCNF."""
+    candidates = [lhs for lhs in cover if lhs & ~mask == 0]
+    if mask.bit_count() <= BCNF_EXACT_COLUMNS:
+        bits = [1 << bit for bit in engine.iter_bits(mask)]
+        candidates += (
+            sum(subset)
+            for size in range(1, len(bits) - 1)
+            for subset in itertools.combinations(bits, size)
+        )
+    for lhs in candidates:
+        determined = engine.closure(lhs, target=mask) & mask
+        # lhs violates BCNF when it determines some of the relation's attributes but not all of them
+        if determined != lhs and determined != mask:
+            return lhs, determined
+    return None
+
+
+def split_bcnf(relations, fds, prefix, unchecked=None):
+    """Splits relations on BCNF violations of the FDs until bcnf_violation finds none.
+
+    A violating lhs -> rhs splits R into lhs + its closure in R, keyed by lhs, and R minus that closure.
+    The result is in BCNF for relations of up to BCNF_EXACT_COLUMNS columns; a wider relation can keep a
+    violation of an FD that only holds in its projection (see bcnf_violation). Wider relations that have
+    such FDs at all are appended to unchecked, when given."""
+    engine = DependencyEngine([col for relation in relations for col in relation["columns"]], fds)
+    cover = [engine.encode(fd["lhs"]) for fd in engine.minimal_cover()]
+    pending = list(reversed(relations))
+    decomposed_relations = []
+    while pending:
+        current = pending.pop()
+        columns = current["columns"]
+        mask = engine.encode(columns)
+        violation = bcnf_violation(engine, mask, cover)
+        if violation is None:
+            decomposed_relations.append(current)
+            # Some attribute determined by the others means the relation has a non-trivial FD that was not searched for
+            if unchecked is not None and mask.bit_count() > BCNF_EXACT_COLUMNS and any(
+                engine.determines(mask & ~(1 << bit), 1 << bit) for bit in engine.iter_bits(mask)
+            ):
+                unchecked.append(current)
+            continue
+        lhs, determined = violation
+        primary_key = engine.encode(current.get("primary_key", []))
+        remainder = mask & ~(determined & ~lhs)
+        # The remainder is pushed first so the split-off relation is processed first
+        for part, key in ((remainder, relation_key_mask(engine, remainder, primary_key)), (determined, lhs)):
+            part_columns = ordered_columns(engine.decode(part), columns)
+            part_key = ordered_columns(engine.decode(key), columns)
+            pending.append(
+                {
+                    "table_name": generate_table_name(f"{prefix}_BCNF", part_columns, part_key),
+                    "columns": part_columns,
+                    "primary_key": part_key,
+                }
+            )
+    return decomposed_relations
+
+
+def normalize_schema(relation, fds, max_nf=4, unchecked=None):
+    """Normalizes a relation from its FDs alone, without records, up to BCNF (max_nf 4).
+
+    2NF uses ensure_2nf, 3NF uses Bernstein synthesis and BCNF splits the synthesized relations further;
+    relations too wide to be fully checked for BCNF are appended to unchecked (see split_bcnf).
+    4NF and 5NF depend on the data, so higher max_nf values stop at BCNF."""
+    if max_nf <= 1:
+        return [relation]
+    if max_nf == 2:
+        return ensure_2nf(relation, fds)
+    fds = relation_fds(relation["columns"], fds)
+    relations = synthesize_3nf(relation, fds)
+    if max_nf >= 4:
+        relations = split_bcnf(relations, fds, relation["table_name"], unchecked)
+    # Splits can produce the same relation twice
+    return list({relation_key(part): part for part in relations}.values())
+
+
+##### ^ SCHEMA SYNTHESIS ^ #####
+##### v DECOMPOSITION VERIFIER v #####
+
+
+# Stops the chase when join dependencies keep adding tableau rows past this point
+CHASE_MAX_ROWS = 10000
+
+
+def projected_fds(engine, columns_mask):
+    """Projects the FDs onto a relation as (lhs, closure within the relation) bitmask pairs."""
+    fds = {}
+    for lhs in engine.lhs_masks:
+        if lhs & ~columns_mask == 0 and lhs not in fds:
+            rhs = engine.closure(lhs) & columns_mask & ~lhs
+            if rhs:
+                fds[lhs] = rhs
+    return list(fds.items())
+
+
+def chase(engine, columns_mask, fragments, fds, jds=()):
+    """Runs the tableau chase for a decomposition of the relation into fragments (all bitmasks).
+
+    Each row holds one symbol per column, 0 being the distinguished symbol, plus a bitmask of its
+    distinguished columns. FDs are indexed by LHS column so that after the first pass only the FDs
+    whose LHS saw a change are re-applied. Returns True when some row becomes fully distinguished
+    (lossless), False when the chase ends without one, and None when join dependencies blow the
+    tableau past CHASE_MAX_ROWS."""
+    width = len(engine.attributes)
+    columns = list(engine.iter_bits(columns_mask))
+    rows = []
+    symbols = itertools.count(1)
+    for fragment in fragments:
+        rows.append([0 if fragment >> col & 1 else next(symbols) for col in range(width)])
+    distinguished = [fragment & columns_mask for fragment in fragments]
+    if columns_mask in distinguished:
+        return True
+
+    fd_index = [[] for _ in range(width)]
+    for index, (lhs, _) in enumerate(fds):
+        for col in engine.iter_bits(lhs):
+            fd_index[col].append(index)
+    pending = set(range(len(fds)))
+    while True:
+        while pending:
+            changed = 0
+            for index in sorted(pending):
+                lhs, rhs = fds[index]
+                lhs_columns = list(engine.iter_bits(lhs))
+                groups = {}
+                for row in range(len(rows)):
+                    groups.setdefault(tuple(rows[row][col] for col in lhs_columns), []).append(row)
+                for group in groups.values():
+                    if len(group) < 2:
+                        continue
+                    for col in engine.iter_bits(rhs):
+                        values = {rows[row][col] for row in group}
+                        if len(values) < 2:
+                            continue
+                        # Equates the symbols across the whole column, preferring the distinguished one
+                        target = min(values)
+                        for row, cells in enumerate(rows):
+                            if cells[col] in values:
+                                cells[col] = target
+                                if target == 0:
+                                    distinguished[row] |= 1 << col
+                        changed |= 1 << col
+            if columns_mask in distinguished:
+                return True
+            pending = {index for col in engine.iter_bits(changed) for index in fd_index[col]}
+
+        # Join dependencies add the rows of the join of the tableau's projections
+        added = False
+        seen = {tuple(cells[col] for col in columns) for cells in rows}
+        for components in jds:
+            joined = [{}]
+            for component in components:
+                component_columns = list(engine.iter_bits(component))
+                projections = {tuple(cells[col] for col in component_columns) for cells in rows}
+                extended = []
+                for partial in joined:
+                    for values in projections:
+                        if all(partial.get(col, value) == value for col, value in zip(component_columns, values)):
+                            extended.append({**partial, **dict(zip(component_columns, values))})
+                joined = extended
+            for partial in joined:
+                cells = [partial[col] if col in partial else next(symbols) for col in range(width)]
+                key = tuple(cells[col] for col in columns)
+                if key in seen:
+                    continue
+                seen.add(key)
+                rows.append(cells)
+                distinguished.append(sum(1 << col for col in columns if cells[col] == 0))
+                added = True
+        if columns_mask in distinguished:
+            return True
+        if not added:
+            return False
+        if len(rows) > CHASE_MAX_ROWS:
+            return None
+        pending = set(range(len(fds)))
+
+
+def lost_dependencies(engine, fragments, fds):
+    """Returns the projected FDs that cannot be enforced from the fragments' own FDs."""
+    lost = []
+    for lhs, rhs in fds:
+        reached = lhs
+        while True:
+            # Grows lhs+ using only what each fragment can derive on its own columns
+            grown = reached
+            for fragment in fragments:
+                grown |= engine.closure(grown & fragment) & fragment
+            if grown == reached:
+                break
+            reached = grown
+        if rhs & ~reached:
+            lost.append({"lhs": engine.decode(lhs), "rhs": engine.decode(rhs & ~reached)})
+    return lost
+
+
+def verify_decomposition(columns, fragments, fds, jds=()):
+    """Checks that the fragments join back into the relation losslessly and lists the FDs they no longer preserve."""
+    engine = DependencyEngine(columns, fds)
+    columns_mask = engine.encode(columns)
+    fragment_masks = [engine.encode(fragment) for fragment in fragments]
+    projected = projected_fds(engine, columns_mask)
+    jd_masks = [[engine.encode(component) for component in jd] for jd in jds]
+    covered = 0
+    for fragment in fragment_masks:
+        covered |= fragment
+    return {
+        "lossless": chase(engine, columns_mask, fragment_masks, projected, jd_masks) if covered == columns_mask else False,
+        "missing_columns": engine.decode(columns_mask & ~covered),
+        "lost_fds": lost_dependencies(engine, fragment_masks, projected),
+    }
+
+
+def verify_plan(plan):
+    """Verifies every decomposition step of a normalization plan and the final relations against each input relation."""
+    reports = []
+    data_jds = []  # MVDs and JDs that were checked on the data, as join dependencies
+    for node in plan.nodes.values():
+        parent = node.relation
+        for stage, children in node.children.items():
+            if children == [node.key]:
+                continue
+            fragments = [plan.nodes[child].relation["columns"] for child in children]
+            # 4NF and 5NF enter the chase with the dependencies that justified the split, never with the split itself
+            jds = node.dependencies.get(stage, [])
+            report = verify_decomposition(parent["columns"], fragments, plan.fds, jds)
+            report.update(relation=parent["table_name"], stage=stage, fragments=len(fragments))
+            reports.append(report)
+            data_jds.extend(jds)
+    for root in plan.roots:
+        relation = plan.nodes[root].relation
+        final = plan.frontiers.get((root, 0), [root])
+        fragments = [plan.nodes[key].relation["columns"] for key in final]
+        report = verify_decomposition(relation["columns"], fragments, plan.fds, data_jds)
+        report.update(relation=relation["table_name"], stage="final", fragments=len(fragments))
+        reports.append(report)
+    return reports
+
+
+# SQLite refuses to join more tables than this in one query
+SQLITE_MAX_JOIN_TABLES = 64
+
+
+def join_limit_reason(normalized_relations):
+    """Returns why the tables cannot be natural-joined in one SQLite query, or None if they can."""
+    tables = sum(1 for relation in normalized_relations if relation["columns"])
+    if tables > SQLITE_MAX_JOIN_TABLES:
+        return f"{tables} tables are more than SQLite joins in one query ({SQLITE_MAX_JOIN_TABLES})"
+    return None
+
+
+def natural_join_query(normalized_relations, columns=None):
+    """Builds a SELECT DISTINCT over the natural join of the tables, ordered so each table shares a column with the ones before it.
+
+    Returns None when the tables cannot be chained without a cross product."""
+    remaining = [relation for relation in normalized_relations if relation["columns"]]
+    if not remaining:
+        return None
+    ordered = [remaining.pop(0)]
+    joined = set(ordered[0]["columns"])
+    while remaining:
+        connected = next((relation for relation in remaining if joined & set(relation["columns"])), None)
+        if connected is None:
+            return None
+        remaining.remove(connected)
+        ordered.append(connected)
+        joined |= set(connected["columns"])
+    columns = [col for col in columns if col in joined] if columns else sorted(joined)
+    tables = " NATURAL JOIN ".join(relation["table_name"] for relation in ordered)
+    return f"SELECT DISTINCT {', '.join(columns)} FROM {tables}"
+
+
+def verify_loaded_tables(conn, normalized_relations, records, headers, dedup_rows=DEDUP_MAX_ROWS, spill_dir=None):
+    """Rejoins the loaded tables in SQLite and compares the row count with the distinct input rows.
+
+    Streamed records are counted through a SpillingSet, so the check stays within the dedup_rows memory bound."""
+    reason = join_limit_reason(normalized_relations)
+    if reason is not None:
+        return {"checked": False, "reason": reason}
+    query = natural_join_query(normalized_relations, headers)
+    covered = {col for relation in normalized_relations for col in relation["columns"]}
+    if query is None or not set(headers) <= covered:
+        return {"checked": False, "reason": "the tables do not join back into every input column"}
+    rejoined = conn.execute(f"SELECT COUNT(*) FROM ({query})").fetchone()[0]
+    if isinstance(records, ColumnStore):
+        expected = len(records.project(headers).distinct())
+    else:
+        distinct = SpillingSet(dedup_rows, spill_dir)
+        try:
+            iterator = iter(records)
+            for chunk in iter(lambda: list(itertools.islice(iterator, BULK_BATCH_SIZE)), []):
+                # Malformed records are skipped, as ColumnStore.from_records does
+                distinct.update(tuple(record) for record in chunk if len(record) == len(headers))
+            expected = len(distinct)
+        finally:
+            distinct.close()
+    return {"checked": True, "rejoined_rows": rejoined, "input_rows": expected, "matches": rejoined == expected}
+
+
+##### ^ DECOMPOSITION VERIFIER ^ #####
+##### v DECOMPOSITION CACHE v #####
+
+
+CACHE_DIR = ".normalizer_cache"
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Bumped whenever a change to the normalizer can change the decomposition it produces for the same inputs
+CACHE_VERSION = 2
+# Stages whose result depends on the records and not only on the schema and dependencies
+DATA_STAGES = ("4NF", "5NF")
+
+
+def reads_records(max_nf):
+    """Returns whether any stage that runs for max_nf looks at the records."""
+    return any(stage in DATA_STAGES for stage, level in PLAN_STAGES if level <= max_nf)
+
+
+def decomposition_cache_key(parsed_relations, fds, mvds, max_nf, data_fingerprint=None, expansion=None, max_fanout=None):
+    """Hashes everything the decomposition depends on into a cache key.
+
+    data_fingerprint identifies the input file and is needed whenever reads_records(max_nf) is true;
+    expansion and max_fanout decide how the records are flattened before those stages see them."""
+    relations = {
+        name: {key: value for key, value in relation.items() if key != "records"}
+        for name, relation in parsed_relations.items()
+    }
+    content = json.dumps(
+        [CACHE_VERSION, relations, fds, mvds, max_nf, expansion or {}, max_fanout, data_fingerprint], sort_keys=True
+    )
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def file_fingerprint(path):
+    """Identifies a file's contents cheaply by its size and modification time."""
+    stat = os.stat(path)
+    return [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+
+
+def load_cached_decomposition(key, cache_dir=CACHE_DIR):
+    """Returns the cached normalized relations for the key, or None on a cache miss."""
+    path = os.path.join(cache_dir, f"{key}.json")
+    try:
+        with open(path, "r") as f:
+            relations = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # Refreshes the modification time so eviction removes the least recently used entries first
+    os.utime(path)
+    return relations
+
+
+def store_cached_decomposition(key, relations, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    """Saves the normalized relations under the key and evicts old entries beyond the size limit."""
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"{key}.json")
+    # Lazy record views are not part of the schema and are left out
+    schema = [{k: v for k, v in relation.items() if k != "records"} for relation in relations]
+    # Each process writes its own temporary file, so concurrent runs never interleave their writes
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(schema, f)
+    os.replace(temp_path, path)  # Readers never see a partially written entry
+    evict_cache(cache_dir, max_bytes)
+
+
+def evict_cache(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    """Removes the least recently used cache entries until the cache fits within max_bytes."""
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(".json"):
+            # Another process may evict the same entry in the meantime
+            with contextlib.suppress(FileNotFoundError):
+                stat = os.stat(os.path.join(cache_dir, name))
+                entries.append((stat.st_mtime_ns, stat.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(os.path.join(cache_dir, name))
+        total -= size
+
+
+##### ^ DECOMPOSITION CACHE ^ #####
+##### v MAIN v #####
+
+
+def build_parser():
+    """Builds the command-line parser; its options are also the keys of a batch manifest entry."""
+    parser = argparse.ArgumentParser(description="Normalizes input_data.txt into normalization.db.")
+    parser.add_argument(
+        "--input",
+        default="input_data.txt",
+        help="Brace-delimited input file",
+    )
+    parser.add_argument(
+        "--fds",
+        default="fds.txt",
+        help="JSON file with the functional dependencies",
+    )
+    parser.add_argument(
+        "--mvds",
+        default="mvds.txt",
+        help="JSON file with the multi-valued dependencies",
+    )
+    parser.add_argument(
+        "--relation",
+        default="CoffeeShop",
+        help="Name of the input relation",
+    )
+    parser.add_argument(
+        "--key",
+        nargs="+",
+        default=["OrderID"],
+        metavar="COLUMN",
+        help="Primary key of the input relation",
+    )
+    parser.add_argument(
+        "--max-nf",
+        type=int,
+        choices=range(1, 7),
+        default=None,
+        help="Normal form to reach: 1 for 1NF, 2 for 2NF, 3 for 3NF, 4 for BCNF, 5 for 4NF, 6 for 5NF (default: ask)",
+    )
+    parser.add_argument(
+        "--db",
+        default="normalization.db",
+        help="SQLite database the normalized tables are written to",
+    )
+    parser.add_argument(
+        "--discovered-fds",
+        default="discovered_fds.txt",
+        help="File the FDs found by --discover-fds are saved in",
+    )
+    parser.add_argument(
+        "--manifest",
+        default=None,
+        help="JSON manifest of datasets to normalize in one batch instead of a single input",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Datasets normalized at the same time in batch mode (default: one per core)",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream the input file in chunks instead of reading it into memory",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=INPUT_CHUNK_SIZE,
+        help="Bytes read per chunk in streaming mode",
+    )
+    parser.add_argument(
+        "--mmap",
+        action="store_true",
+        help="Memory-map the input file and parse the records directly from the mapped bytes",
+    )
+    parser.add_argument(
+        "--zip",
+        nargs="+",
+        default=[],
+        metavar="COLUMN",
+        help="Multi-valued columns flattened positionally instead of by Cartesian product",
+    )
+    parser.add_argument(
+        "--max-fanout",
+        type=int,
+        default=None,
+        help="Largest number of rows a single record may expand into during 1NF flattening",
+    )
+    parser.add_argument(
+        "--discover-fds",
+        action="store_true",
+        help="Discover the FDs from the input data instead of reading fds.txt",
+    )
+    parser.add_argument(
+        "--max-lhs",
+        type=int,
+        default=None,
+        help="Largest LHS considered during FD discovery (default: unlimited)",
+    )
+    parser.add_argument(
+        "--approximate",
+        action="store_true",
+        help="Check the FDs and MVDs on a sample, rechecking exactly only those too close to the threshold",
+    )
+    parser.add_argument(
+        "--sample-size",
+        type=int,
+        default=SAMPLE_SIZE,
+        help="LHS groups sampled per left-hand side in approximate mode",
+    )
+    parser.add_argument(
+        "--approx-threshold",
+        type=float,
+        default=APPROX_THRESHOLD,
+        help="Largest error at which a dependency still holds in approximate mode",
+    )
+    parser.add_argument(
+        "--confidence",
+        type=float,
+        default=APPROX_CONFIDENCE,
+        help="Confidence of the error bounds in approximate mode",
+    )
+    parser.add_argument(
+        "--validate-only",
+        action="store_true",
+        help="Stop after checking the dependencies, exiting with status 1 if any does not hold",
+    )
+    parser.add_argument(
+        "--dedup-rows",
+        type=int,
+        default=DEDUP_MAX_ROWS,
+        help="Distinct rows per table kept in memory while loading before sorted runs are spilled to disk",
+    )
+    parser.add_argument(
+        "--spill-dir",
+        default=None,
+        help="Directory for the spilled runs (default: the system temporary directory)",
+    )
+    parser.add_argument(
+        "--sink",
+        action="append",
+        default=[],
+        metavar="KIND:TARGET",
+        help="Also write the normalized tables to csv:DIR, tsv:DIR, ndjson:DIR, sqlite:FILE or sqlite-writer:FILE (repeatable)",
+    )
+    parser.add_argument(
+        "--sink-buffer",
+        type=int,
+        default=SINK_BUFFER_ROWS,
+        help="Rows handed to the sinks per write",
+    )
+    parser.add_argument(
+        "--sink-threads",
+        type=int,
+        default=None,
+        help="Tables written to the sinks at the same time (default: all of them)",
+    )
+    parser.add_argument(
+        "--schema-only",
+        action="store_true",
+        help="Normalize up to BCNF from the headers and FDs alone and print the DDL, without reading any records",
+    )
+    parser.add_argument(
+        "--ddl",
+        metavar="FILE",
+        default=None,
+        help="In schema-only mode, write the CREATE TABLE statements to FILE instead of printing them",
+    )
+    parser.add_argument(
+        "--columns",
+        nargs="+",
+        default=None,
+        metavar="COLUMN",
+        help="In schema-only mode, the input columns (default: the header line of --input)",
+    )
+    parser.add_argument(
+        "--append",
+        action="store_true",
+        help="Append the input to the existing normalization.db instead of rebuilding it",
+    )
+    parser.add_argument(
+        "--on-conflict",
+        choices=CONFLICT_MODES,
+        default="skip",
+        help="In append mode, skip or update rows whose primary key already exists",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always recompute the decomposition instead of using the on-disk cache",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=CACHE_MAX_BYTES // (1024 * 1024),
+        help="Size limit of the decomposition cache in MiB",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes for parallel stages (default: one per core)",
+    )
+    parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help="Parse, flatten and load the input in shards on a pool of --workers processes",
+    )
+    parser.add_argument(
+        "--explain",
+        action="store_true",
+        help="Print the decomposition tree with each stage's time and each relation's size",
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="FILE",
+        default=None,
+        help="Write a JSON trace of every stage's time, rows, relations, SQL statements and rejected inserts",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Include the top cProfile entries in the trace",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Include each stage's peak tracemalloc memory in the trace",
+    )
+    return parser
 
 
 def main():
     """Main function to process input data, normalize relations, and interact with the database."""
-    # Removes normalization.db if it exists
-    db_file = "normalization.db"
-    if os.path.exists(db_file):
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.manifest:
+        sys.exit(run_batch(args, parser))
+    trace = PipelineTrace(profile=args.profile, trace_memory=args.trace_memory)
+    try:
+        run_pipeline(args, trace)
+    finally:
+        trace.close(args.trace)
+        if args.trace:
+            print("Trace saved in", args.trace)
+
+
+def run_pipeline(args, trace):
+    """Parses, normalizes and loads the input files as configured by the command-line arguments."""
+    if args.schema_only:
+        run_schema_only(args, trace)
+        return
+    db_file = args.db
+    # In append mode the existing database and the schema stored inside it are reused
+    metadata = None
+    if args.append and os.path.exists(db_file):
+        conn = sqlite3.connect(db_file)
+        metadata = load_schema_metadata(conn)
+        conn.close()
+        if metadata is None:
+            print(f"{db_file} has no stored schema; rebuilding it from scratch")
+    # Removes the database if it exists
+    if metadata is None and os.path.exists(db_file):
         os.remove(db_file)
 
     # Reads data in from the 3 files
-    with open("input_data.txt", "r") as file:
-        input_data = file.read()
-    with open("fds.txt", "r") as f:
+    with open(args.fds, "r") as f:
         fds_text = f.read()  # Read the file contents into a string
         fds = json.loads(fds_text)  # Use json.loads to parse the JSON content
     # Manually inserts here for 4NF and 5NF - Loads multi-valued dependencies
-    with open("mvds.txt", "r") as f:
+    with open(args.mvds, "r") as f:
         mvds = json.load(f)
 
-    # Parses input data
-    headers, records = parse_input(input_data)
+    # Parses input data; in streaming mode every pass over the records re-reads the file in chunks
+    expansion = {col: "zip" for col in args.zip}
+    with trace.stage("parse") as entry:
+        if args.parallel:
+            # Workers parse and flatten their own byte range, so the flatten stage has nothing left to do
+            records, fanout = parallel_parse(args.input, args.workers, expansion, args.max_fanout)
+            headers = records.headers
+        elif args.mmap:
+            # Tokenizes the memory-mapped file instead of reading it into strings
+            headers, records = map_input(args.input)
+            if not args.stream:
+                records = ColumnStore.from_records(headers, records)
+        elif args.stream:
+            records = InputStream(args.input, args.chunk_size)
+            headers = records.headers
+        else:
+            # Records are kept dictionary-encoded in columns rather than as lists of strings
+            with open(args.input, "r") as file:
+                headers, records = stream_input(file, args.chunk_size)
+                records = ColumnStore.from_records(headers, records)
+        if isinstance(records, ColumnStore):
+            entry["rows_out"] += len(records)
+            if records.skipped_rows:
+                trace.reject(args.input, "malformed record", records.skipped_rows)
+
+    # Reports the 1NF fan-out first, then flattens every multi-valued column lazily
+    with trace.stage("flatten") as entry:
+        if not args.parallel:
+            fanout = fanout_1nf(records, headers, expansion)
+        print(
+            f"1NF expands {fanout['rows']} records into {fanout['expanded_rows']} rows "
+            f"(widest: record {fanout['max_fanout_row']} with {fanout['max_fanout']} rows)"
+        )
+        if not args.parallel:
+            records = FlatRecords(records, headers, expansion, args.max_fanout)
+            if not args.stream:
+                records = ColumnStore.from_records(headers, records)
+        entry["rows_in"] += fanout["rows"]
+        entry["rows_out"] += fanout["expanded_rows"]
+
+    if metadata is not None:
+        if metadata.get("headers") != headers:
+            raise SystemExit("The input headers do not match the schema stored in " + db_file)
+        append_to_database(db_file, metadata, records, headers, args.on_conflict, trace)
+        return
+
+    # Replaces the hand-written FDs with the ones that actually hold in the data
+    if args.discover_fds:
+        with trace.stage("discover_fds") as entry:
+            fds = discover_fds(headers, records, workers=args.workers, max_lhs=args.max_lhs)
+            entry["rows_in"] += fanout["expanded_rows"]
+        with open(args.discovered_fds, "w") as f:
+            f.write("[\n    " + ",\n    ".join(json.dumps(fd) for fd in fds) + "\n]\n")
+        print(f"Discovered {len(fds)} functional dependencies (saved in {args.discovered_fds})")
+
+    # Checks that the declared FDs and MVDs actually hold on the flattened data
+    with trace.stage("validate") as entry:
+        if args.approximate:
+            estimates = approximate_dependencies(
+                records, fds, mvds, headers, args.sample_size, args.approx_threshold, args.confidence
+            )
+            violations = [estimate for estimate in estimates if not estimate["holds"]]
+        elif isinstance(records, ColumnStore):
+            violations = validate_dependencies(records, fds, mvds, headers)
+        else:
+            # Streamed records are checked without loading them all, within the --dedup-rows memory bound
+            violations = stream_validate_dependencies(
+                records, fds, mvds, headers, run_rows=args.dedup_rows, spill_dir=args.spill_dir
+            )
+        entry["rows_out"] += len(violations)
+    if args.approximate:
+        print_estimates(estimates, args.approx_threshold, args.confidence)
+    for violation in [] if args.approximate else violations:
+        print(
+            f"{violation['kind'].upper()} {violation['lhs']} {'->>' if violation['kind'] == 'mvd' else '->'} "
+            f"{violation['rhs']} does not hold in "
+            f"{violation['groups']} group(s)"
+            + (f", {violation['missing_rows']} row(s) missing" if violation["kind"] == "mvd" else "")
+            + f"; first violating rows: {violation['rows']}"
+        )
+
+    if args.validate_only:
+        if violations:
+            raise SystemExit(1)
+        return
 
     # Prompts the user with how many normalization steps they would like to go through (6 for 5NF)
-    print(
-        "Information inserted into intut, fds, and mcds.tx files are being run; Sample inputs are implemented by default"
-    )
-    print("Would you like to use table input data?")
-    print("What normal for would you like to run?")
-    max_nf = int(
-        input(
-            "Please type '1' for 1NF, '2' for 2NF, '3' for 3NF, '4' for BCNF, '5' for 4NF, '6' for 5NF\n"
+    max_nf = args.max_nf
+    if max_nf is None:
+        print(
+            "Information inserted into intut, fds, and mcds.tx files are being run; Sample inputs are implemented by default"
+        )
+        print("Would you like to use table input data?")
+        print("What normal for would you like to run?")
+        max_nf = int(
+            input(
+                "Please type '1' for 1NF, '2' for 2NF, '3' for 3NF, '4' for BCNF, '5' for 4NF, '6' for 5NF\n"
+            )
         )
-    )
 
-    # Normalizes the data up to the max_nf level
-    normalized_relations = normalize_relations(
-        {
-            "CoffeeShop": {
-                "table_name": "CoffeeShop",
-                "columns": headers,
-                "primary_key": ["OrderID"],
-                "candidate_keys": [["OrderID"]],
-            }
-        },
-        fds,
-        mvds,
-        max_nf=max_nf,
-        records=records,
-    )
+    parsed_relations = {
+        args.relation: {
+            "table_name": args.relation,
+            "columns": headers,
+            "primary_key": list(args.key),
+            "candidate_keys": [list(args.key)],
+        }
+    }
+    # Stages that look at the records tie their cached results to the input file and how it was flattened
+    data_fingerprint = file_fingerprint(args.input) if reads_records(max_nf) else None
+    cache_key = decomposition_cache_key(parsed_relations, fds, mvds, max_nf, data_fingerprint, expansion, args.max_fanout)
+    # Explaining needs the plan itself, so it always recomputes the decomposition
+    normalized_relations = None if args.no_cache or args.explain else load_cached_decomposition(cache_key)
+    plan = None
+
+    if normalized_relations is not None:
+        print("Using cached decomposition")
+    else:
+        # Normalizes the data up to the max_nf level, running each stage once per distinct relation
+        plan = NormalizationPlan(fds, mvds, max_nf, records, trace, args.workers).run(parsed_relations)
+        normalized_relations = plan.relations()
+        if args.explain:
+            print(plan.explain())
+        if not args.no_cache:
+            store_cached_decomposition(
+                cache_key, normalized_relations, max_bytes=args.cache_size * 1024 * 1024
+            )
+
+    # Checks that the decomposition joins back losslessly and which FDs it no longer preserves
+    with trace.stage("verify") as entry:
+        if plan is not None:
+            reports = verify_plan(plan)
+        else:
+            # A cached decomposition has no plan, so only the final relations are checked
+            fragments = [relation["columns"] for relation in normalized_relations]
+            reports = [dict(verify_decomposition(headers, fragments, fds), relation=args.relation, stage="final", fragments=len(fragments))]
+        entry["relations_in"] += len(reports)
+    print_verification(reports)
 
     # Connects to the SQLite database
     conn = sqlite3.connect(db_file)
+    trace.attach(conn)
     cursor = conn.cursor()
 
     # Creates normalized tables based on the relations
-    create_normalized_tables(cursor, normalized_relations)
+    create_normalized_tables(cursor, normalized_relations, trace)
 
-    # Inserts data into the tables
-    for rel in normalized_relations:
-        table_name = rel["table_name"]
-        columns = rel["columns"]
-        for record in records:
-            insert_data(cursor, table_name, columns, record, headers)
+    # Inserts data into the tables in a single bulk-load transaction
+    if args.parallel:
+        # Workers expand, project and dedupe their shard again; this process only writes
+        parallel_load(
+            conn,
+            normalized_relations,
+            args.input,
+            args.workers,
+            expansion,
+            args.max_fanout,
+            trace=trace,
+            dedup_rows=args.dedup_rows,
+            spill_dir=args.spill_dir,
+        )
+    else:
+        bulk_load(
+            conn, normalized_relations, records, headers, trace=trace, dedup_rows=args.dedup_rows, spill_dir=args.spill_dir
+        )
+
+    # Indexes the join columns once the data is in, then exposes the join back to the original rows
+    create_join_indexes(conn, normalized_relations, trace)
+    if create_reconstructed_view(conn, normalized_relations, headers, trace=trace):
+        print(f"Original rows available through the {RECONSTRUCTED_VIEW} view")
+
+    # Rejoins the loaded tables and compares the result with the input
+    with trace.stage("verify_data"):
+        check = verify_loaded_tables(conn, normalized_relations, records, headers, args.dedup_rows, args.spill_dir)
+    if not check["checked"]:
+        trace.note(f"Data check skipped: {check['reason']}")
+    if check["checked"]:
+        print(
+            f"Rejoining the tables gives {check['rejoined_rows']} rows for {check['input_rows']} distinct input rows"
+            + ("" if check["matches"] else " (MISMATCH)")
+        )
+    else:
+        print("Data check skipped:", check["reason"])
+
+    # Records the schema and FDs so later runs can append to this database
+    save_schema_metadata(conn, normalized_relations, fds, headers)
 
-    conn.commit()
     conn.close()
     print("Tables saved in", db_file)
 
+    # Writes the same tables to any extra outputs
+    if args.sink:
+        metrics = write_sinks(
+            [make_sink(spec) for spec in args.sink],
+            normalized_relations,
+            records,
+            headers,
+            args.sink_buffer,
+            args.sink_threads,
+            args.dedup_rows,
+            args.spill_dir,
+            trace,
+        )
+        print_sink_metrics(metrics)
+
+
+def load_manifest(path, parser, defaults):
+    """Reads a batch manifest into one set of options per dataset.
+
+    The manifest is a JSON list of datasets, or an object with a "datasets" list. Each dataset is an
+    object whose keys are the command-line options (e.g. "input", "fds", "key", "max-nf", "db") plus an
+    optional "name" and "log"; options it leaves out keep the values given on the command line. Relative paths
+    are resolved against the manifest's directory."""
+    with open(path, "r") as f:
+        manifest = json.load(f)
+    if isinstance(manifest, dict):
+        manifest = manifest.get("datasets", [])
+    base = os.path.dirname(os.path.abspath(path))
+    known = {action.dest for action in parser._actions} - {"help", "manifest", "jobs"} | {"log"}
+    datasets = []
+    for index, entry in enumerate(manifest):
+        entry = {key.replace("-", "_"): value for key, value in entry.items()}
+        name = entry.pop("name", None) or os.path.splitext(os.path.basename(entry.get("db", f"dataset_{index}")))[0]
+        unknown = set(entry) - known
+        if unknown:
+            raise SystemExit(f"Dataset '{name}' in {path} has unknown options: {sorted(unknown)}")
+        options = dict(defaults, **entry)
+        if isinstance(options["key"], str):
+            options["key"] = [options["key"]]
+        if options["max_nf"] not in range(1, 7):
+            raise SystemExit(f"Dataset '{name}' in {path} needs a max-nf between 1 and 6")
+        # Outputs that would otherwise be shared default to files named after the dataset's database
+        stem = os.path.splitext(options["db"])[0]
+        if "discovered_fds" not in entry:
+            options["discovered_fds"] = f"{stem}.discovered_fds.txt"
+        if "log" not in entry:
+            options["log"] = f"{stem}.log"
+        # A trace or DDL file asked for on the command line is written once per dataset, not shared by all of them
+        if options.get("trace") and "trace" not in entry:
+            options["trace"] = f"{stem}.trace.json"
+        if options.get("ddl") and "ddl" not in entry:
+            options["ddl"] = f"{stem}.sql"
+        for key in ("input", "fds", "mvds", "db", "discovered_fds", "trace", "ddl", "log"):
+            if options.get(key):
+                options[key] = os.path.join(base, options[key])
+        datasets.append((name, options))
+    names = [name for name, _ in datasets]
+    databases = [options["db"] for _, options in datasets]
+    if len(set(names)) != len(names) or len(set(databases)) != len(databases):
+        raise SystemExit(f"Every dataset in {path} needs its own name and database")
+    return datasets
+
+
+def run_dataset(name, options):
+    """Runs the pipeline for one manifest dataset, writing its output to its log; returns its result."""
+    args = argparse.Namespace(**options)
+    started = time.perf_counter()
+    result = {"name": name, "db": args.db, "log": args.log, "ok": False, "error": None}
+    for path in (args.db, args.log):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(args.log, "w") as log, contextlib.redirect_stdout(log):
+        trace = PipelineTrace(profile=args.profile, trace_memory=args.trace_memory)
+        try:
+            run_pipeline(args, trace)
+            result["ok"] = True
+        except (Exception, SystemExit) as error:
+            # A failing dataset is reported and the rest of the batch carries on
+            traceback.print_exc(file=log)
+            result["error"] = f"{type(error).__name__}: {error}"
+        finally:
+            trace.close(args.trace)
+        result["rows"] = trace.stages.get("load", {}).get("rows_out", 0)
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def run_batch(args, parser):
+    """Normalizes every dataset of the manifest on a process pool and returns the exit code."""
+    defaults = vars(args).copy()
+    # Each dataset already runs in its own process, so its parallel stages default to one worker
+    if defaults["workers"] is None:
+        defaults["workers"] = 1
+    datasets = load_manifest(args.manifest, parser, defaults)
+    jobs = min(args.jobs or os.cpu_count() or 1, len(datasets)) or 1
+    print(f"Normalizing {len(datasets)} datasets with {jobs} jobs")
+    started = time.perf_counter()
+    failed = []
+    with ProcessPoolExecutor(jobs) as pool:
+        futures = [pool.submit(run_dataset, name, options) for name, options in datasets]
+        for done, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            status = "ok" if result["ok"] else f"FAILED ({result['error']})"
+            print(
+                f"[{done}/{len(datasets)}] {result['name']}: {status} in {result['seconds']:.2f}s, "
+                f"{result['rows']} rows loaded (log: {result['log']})"
+            )
+            if not result["ok"]:
+                failed.append(result["name"])
+    print(
+        f"{len(datasets) - len(failed)} of {len(datasets)} datasets normalized in {time.perf_counter() - started:.2f}s"
+        + (f"; failed: {', '.join(failed)}" if failed else "")
+    )
+    return 1 if failed else 0
+
+
+def print_estimates(estimates, threshold, confidence):
+    """Prints the estimated error of every dependency and whether it holds within the threshold."""
+    for estimate in estimates:
+        arrow = "->>" if estimate["kind"] == "mvd" else "->"
+        if estimate["exact"]:
+            bounds = "exact"
+        else:
+            bounds = (
+                f"[{estimate['lower']:.4f}, {estimate['upper']:.4f}] at {confidence:.0%} confidence "
+                f"from {estimate['samples']} sampled {'rows' if estimate['kind'] == 'fd' else 'groups'}"
+            )
+        measure = "g3 error" if estimate["kind"] == "fd" else "violating LHS groups"
+        print(
+            f"{estimate['kind'].upper()} {estimate['lhs']} {arrow} {estimate['rhs']}: {measure} "
+            f"{estimate['error']:.4f} ({bounds}); {'holds' if estimate['holds'] else 'does not hold'} "
+            f"within {threshold}"
+        )
+
+
+def run_schema_only(args, trace):
+    """Normalizes the input relation from its headers and FDs alone and prints or saves the resulting DDL."""
+    with open(args.fds, "r") as f:
+        fds = json.load(f)
+    headers = args.columns
+    if not headers:
+        # Only the header line is read; the records are never touched
+        with open(args.input, "r") as file:
+            headers = parse_headers(file.readline())
+    max_nf = args.max_nf or 4
+    if max_nf > 4:
+        print("4NF and 5NF depend on the records; the schema-only decomposition stops at BCNF")
+    relation = {
+        "table_name": args.relation,
+        "columns": list(headers),
+        "primary_key": list(args.key),
+        "candidate_keys": [list(args.key)],
+    }
+    started = time.perf_counter()
+    with trace.stage("schema") as entry:
+        unchecked = []
+        normalized_relations = normalize_schema(relation, fds, max_nf, unchecked)
+        entry["relations_in"] += 1
+        entry["relations_out"] += len(normalized_relations)
+    print(
+        f"Schema-only normalization of {len(headers)} columns gives {len(normalized_relations)} relations "
+        f"in {(time.perf_counter() - started) * 1000:.1f} ms"
+    )
+    for part in unchecked:
+        print(
+            f"Warning: {part['table_name']} has {len(part['columns'])} columns, more than the "
+            f"{BCNF_EXACT_COLUMNS} searched exhaustively, so it may still violate BCNF"
+        )
+    with trace.stage("verify") as entry:
+        fragments = [relation["columns"] for relation in normalized_relations]
+        reports = [dict(verify_decomposition(headers, fragments, fds), relation=args.relation, stage="schema", fragments=len(fragments))]
+        entry["relations_in"] += len(reports)
+    print_verification(reports)
+
+    ddl = "\n".join(schema_ddl(normalized_relations)) + "\n"
+    if args.ddl:
+        with open(args.ddl, "w") as f:
+            f.write(ddl)
+        print("DDL saved in", args.ddl)
+    else:
+        print(ddl, end="")
+    return normalized_relations
+
+
+def print_sink_metrics(metrics):
+    """Prints the rows written and the throughput of every sink."""
+    for metric in metrics:
+        rate = f"{metric['rows_per_second']:,.0f} rows/s" if metric["rows_per_second"] else "n/a"
+        print(
+            f"{metric['sink']} sink {metric['target']}: {metric['rows']} rows, {metric['bytes']:,} bytes "
+            f"in {metric['seconds']:.3f}s ({rate})"
+        )
+
+
+def print_verification(reports):
+    """Prints a summary of the verifier reports and every problem they found."""
+    lossy = [report for report in reports if report["lossless"] is False]
+    undecided = [report for report in reports if report["lossless"] is None]
+    print(f"Verified {len(reports)} decompositions: {len(lossy)} lossy, {len(undecided)} undecided")
+    for report in reports:
+        name = f"{report['stage']} split of {report['relation']} into {report['fragments']} relations"
+        if report["lossless"] is False:
+            print(f"  {name} is not lossless" + (f" (missing {report['missing_columns']})" if report["missing_columns"] else ""))
+        elif report["lossless"] is None:
+            print(f"  {name} could not be decided within {CHASE_MAX_ROWS} tableau rows")
+        for fd in report["lost_fds"]:
+            print(f"  {name} no longer preserves {fd['lhs']} -> {fd['rhs']}")
+
+
+def append_to_database(db_file, metadata, records, headers, on_conflict="skip", trace=None):
+    """Appends new records to an existing database, checking them against the stored FDs first."""
+    trace = trace or PipelineTrace()
+    normalized_relations = metadata["relations"]
+    fds = metadata.get("fds", [])
+    conn = sqlite3.connect(db_file)
+    trace.attach(conn)
+    prepare_append_indexes(conn, normalized_relations, fds)
+
+    # Flags the new rows that would break a stored dependency
+    with trace.stage("check_fds") as entry:
+        violations = check_fds_incremental(conn, normalized_relations, fds, records, headers)
+        entry["rows_out"] += len(violations)
+    for violation in violations:
+        trace.reject(f"{violation['lhs']} -> {violation['rhs']}", f"FD violation ({violation['source']})")
+        print(
+            f"FD violation ({violation['source']}): {violation['lhs']} -> {violation['rhs']} for {violation['key']}: "
+            f"existing {violation['stored']}, incoming {violation['incoming']}"
+        )
+
+    inserted = bulk_load(
+        conn,
+        normalized_relations,
+        records,
+        headers,
+        on_conflict=on_conflict,
+        pragmas=APPEND_LOAD_PRAGMAS,
+        trace=trace,
+    )
+    conn.close()
+    print(f"Appended {sum(inserted.values())} rows to {db_file} ({len(violations)} FD violations)")
+    return inserted, violations
+
 
 if __name__ == "__main__":
     main()
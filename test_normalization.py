@@ -0,0 +1,710 @@
+import itertools
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+import benchmark
+import normalization
+
+
+def flattened_records(text):
+    """Parses the input text and flattens it into a ColumnStore the way the pipeline does."""
+    headers, rows = normalization.parse_input(text)
+    return normalization.ColumnStore.from_records(headers, normalization.FlatRecords(rows, headers))
+
+
+def normalize_text(text, fds, mvds, max_nf, key=()):
+    """Normalizes the input text the way the pipeline does."""
+    records = flattened_records(text)
+    relations = {"R": {"table_name": "R", "columns": records.headers, "primary_key": list(key)}}
+    return normalization.normalize_relations(relations, fds, mvds, max_nf, records)
+
+
+def test_trace_accumulates_stages_sql_and_rejections(tmp_path):
+    trace = normalization.PipelineTrace(profile=True, trace_memory=True)
+    conn = sqlite3.connect(":memory:")
+    trace.attach(conn)
+    for _ in range(2):
+        with trace.stage("work") as entry:
+            conn.execute("SELECT 1")
+            entry["rows_in"] += 5
+    trace.reject("T", "duplicate", 2)
+    trace.reject("T", "duplicate")
+    trace.reject("T", "ignored", 0)
+    path = tmp_path / "trace.json"
+    result = trace.close(str(path))
+    assert json.loads(path.read_text()) == result
+    [stage] = result["stages"]
+    assert stage["calls"] == 2 and stage["rows_in"] == 10 and stage["sql_statements"] == 2
+    assert "peak_memory_bytes" in stage
+    assert result["rejected_inserts"] == [{"table": "T", "reason": "duplicate", "count": 3}]
+    assert result["profile"]
+
+
+def test_streamed_parse_matches_parse_input_for_any_chunk_size(tmp_path):
+    text = 'K "A" B\n1 {x, y} p\n2 z {q, r}\n3 {w} s'
+    expected = normalization.parse_input(text)
+    path = tmp_path / "input.txt"
+    path.write_text(text)
+    for chunk_size in (1, 3, 7, 1 << 20):
+        with open(path) as file:
+            headers, records = normalization.stream_input(file, chunk_size)
+            assert (headers, list(records)) == expected
+    # Each iteration of an InputStream reads the file again
+    stream = normalization.InputStream(str(path), 5)
+    assert stream.headers == ["K", "A", "B"]
+    assert list(stream) == list(stream) == expected[1]
+
+
+def test_mapped_input_matches_parse_input_and_projects_columns(tmp_path):
+    text = 'K "A" B\n1 {x, y} p\n2 z {q, r}\n3 {w} s'
+    expected = normalization.parse_input(text)
+    path = tmp_path / "input.txt"
+    path.write_text(text)
+    headers, records = normalization.map_input(str(path))
+    assert (headers, list(records)) == expected
+    assert list(records) == expected[1]
+    headers, records = normalization.map_input(str(path), ["B", "K"])
+    assert headers == ["B", "K"]
+    assert list(records) == [["p", "1"], ["q, r", "2"], ["s", "3"]]
+    # The byte ranges split on line boundaries and together hold every record once
+    ranges = records.ranges(2)
+    assert len(ranges) == 2
+    assert [record for start, end in ranges for record in records.iter_range(start, end)] == list(records)
+
+
+def test_column_store_encodes_each_value_once():
+    records = [["1", "x", "p"], ["2", "x", "q"], ["bad"], ["1", "x", "q"]]
+    store = normalization.ColumnStore.from_records(["K", "A", "B"], records)
+    assert len(store) == 3 and store.skipped_rows == 1
+    assert store.dictionaries[1] == ["x"]
+    assert list(store) == [records[0], records[1], records[3]]
+    projection = store.project(["K", "A"])
+    assert [projection.decode(row) for row in projection.distinct()] == [("1", "x"), ("2", "x")]
+    keys = store.project(["K"])
+    assert {keys.decode(key): list(rows) for key, rows in projection.group_by(["K"]).items()} == {
+        ("1",): [0, 2],
+        ("2",): [1],
+    }
+
+
+def test_column_store_merges_shards_with_their_own_dictionaries():
+    shard = normalization.ColumnStore.from_records(["K", "A"], [["3", "y"], ["1", "x"]])
+    store = normalization.ColumnStore.from_records(["K", "A"], [["1", "x"]])
+    store.extend_encoded(shard.dictionaries, shard.codes, skipped_rows=2)
+    assert list(store) == [["1", "x"], ["3", "y"], ["1", "x"]]
+    assert store.dictionaries[0] == ["1", "3"] and store.skipped_rows == 2
+
+
+def test_1nf_expands_the_cartesian_product_lazily():
+    headers = ["K", "A", "B"]
+    records = [["1", "x, y", "p, q, r"], ["2", "z", "s"]]
+    expanded = normalization.iter_1nf(iter(records), headers)
+    assert next(expanded) == ["1", "x", "p"]
+    rest = list(expanded)
+    assert len(rest) == 6 and rest[-1] == ["2", "z", "s"]
+    assert normalization.fanout_1nf(records, headers) == {
+        "rows": 2,
+        "expanded_rows": 7,
+        "max_fanout": 6,
+        "max_fanout_row": "1",
+    }
+
+
+def test_1nf_zip_columns_are_paired_and_fanout_is_capped():
+    headers = ["K", "A", "B"]
+    records = [["1", "x, y", "p"], ["2", "x, y, z", "p, q"]]
+    zipped = list(normalization.iter_1nf(records, headers, {"A": "zip", "B": "zip"}))
+    assert zipped == [["1", "x", "p"], ["1", "y", "p"], ["2", "x", "p"], ["2", "y", "q"], ["2", "z", "NULL"]]
+    with pytest.raises(ValueError, match="Record 2"):
+        list(normalization.iter_1nf(records, headers, max_fanout=4))
+
+
+def test_mvd_only_schema_keeps_a_primary_key():
+    relations = normalize_text("K A B\n1 {x, y} {p, q}", [], [{"lhs": "K", "rhs": ["A"]}], 5, key=["K"])
+    assert relations
+    assert all(relation.get("primary_key") for relation in relations)
+
+
+def test_4nf_fragments_keep_the_mvd_lhs():
+    relations = normalize_text("K A B\n1 {x, y} {p, q}\n2 {x, z} {q}", [], [{"lhs": "K", "rhs": ["A"]}], 5, key=["K"])
+    assert sorted((relation["columns"], relation["primary_key"]) for relation in relations) == [
+        (["K", "A"], ["K", "A"]),
+        (["K", "B"], ["K", "B"]),
+    ]
+
+
+def test_4nf_splits_along_every_valid_mvd():
+    text = "K A B C\n1 {x, y} {p, q} {s, t}\n2 {x} {q, r} {t}"
+    mvds = [{"lhs": "K", "rhs": ["A"]}, {"lhs": "K", "rhs": ["B"]}]
+    relations = normalize_text(text, [], mvds, 5, key=["K"])
+    assert sorted(relation["columns"] for relation in relations) == [["K", "A"], ["K", "B"], ["K", "C"]]
+
+
+def brute_force_keys(engine, columns):
+    """Returns the candidate keys of the columns by trying every subset, smallest first."""
+    relation = engine.encode(columns)
+    keys = []
+    for size in range(len(columns) + 1):
+        for subset in itertools.combinations(columns, size):
+            mask = engine.encode(subset)
+            if engine.determines(mask, relation) and not any(key & ~mask == 0 for key in keys):
+                keys.append(mask)
+    return sorted(sorted(engine.decode(key)) for key in keys)
+
+
+def test_candidate_keys_of_a_projection():
+    fds = [{"lhs": ["A"], "rhs": ["B"]}, {"lhs": ["B", "D"], "rhs": ["E"]}, {"lhs": ["E"], "rhs": ["D"]}]
+    engine = normalization.DependencyEngine(list("ABDEF"), fds)
+    assert sorted(sorted(key) for key in engine.candidate_keys(list("ADEF"))) == [["A", "D", "F"], ["A", "E", "F"]]
+
+
+def test_candidate_keys_match_brute_force():
+    rng = random.Random(3)
+    for _ in range(300):
+        attributes = list("ABCDEFGH")[: rng.randint(3, 8)]
+        fds = [
+            {"lhs": rng.sample(attributes, rng.randint(1, 3)), "rhs": rng.sample(attributes, rng.randint(1, 2))}
+            for _ in range(rng.randint(1, 8))
+        ]
+        engine = normalization.DependencyEngine(attributes, fds)
+        columns = rng.sample(attributes, rng.randint(1, len(attributes)))
+        assert sorted(sorted(key) for key in engine.candidate_keys(columns)) == brute_force_keys(engine, columns)
+
+
+def brute_force_fds(headers, rows, max_lhs):
+    """Every minimal FD X -> a with at most max_lhs attributes in X, as (sorted X, a) pairs."""
+
+    def holds(lhs, attr):
+        seen = {}
+        return all(seen.setdefault(tuple(row[i] for i in lhs), row[attr]) == row[attr] for row in rows)
+
+    found = set()
+    for attr in range(len(headers)):
+        others = [i for i in range(len(headers)) if i != attr]
+        for size in range(max_lhs + 1):
+            for lhs in itertools.combinations(others, size):
+                smaller = itertools.combinations(lhs, size - 1) if size else ()
+                if holds(lhs, attr) and not any(holds(subset, attr) for subset in smaller):
+                    found.add((tuple(sorted(headers[i] for i in lhs)), headers[attr]))
+    return found
+
+
+def test_discovered_fds_respect_max_lhs():
+    rng = random.Random(5)
+    for _ in range(150):
+        headers = list("ABCDEF")[: rng.randint(3, 6)]
+        rows = [[str(rng.randint(0, 2)) for _ in headers] for _ in range(rng.randint(2, 14))]
+        max_lhs = rng.randint(1, 3)
+        fds = normalization.discover_fds(headers, rows, workers=1, max_lhs=max_lhs)
+        found = {(tuple(sorted(fd["lhs"])), attr) for fd in fds for attr in fd["rhs"]}
+        assert found == brute_force_fds(headers, rows, max_lhs)
+
+
+def test_2nf_remainder_key_follows_column_order():
+    fds = [{"lhs": ["A"], "rhs": ["C"]}]
+    for _ in range(5):
+        relation = {"table_name": "R", "columns": ["A", "B", "C", "D"], "primary_key": ["D", "B", "A"]}
+        remainder = normalization.ensure_2nf(relation, fds)[-1]
+        assert remainder["primary_key"] == ["A", "B", "D"]
+
+
+def test_3nf_and_bcnf_keep_mutually_determined_lhs_in_the_remainder():
+    fds = [{"lhs": ["K"], "rhs": ["A", "B", "C"]}, {"lhs": ["A"], "rhs": ["B"]}, {"lhs": ["B"], "rhs": ["A"]}]
+    relation = {"table_name": "R", "columns": ["K", "A", "B", "C"], "primary_key": ["K"]}
+    for ensure in (normalization.ensure_3nf, normalization.ensure_bcnf):
+        fragments = [fragment["columns"] for fragment in ensure(relation, fds)]
+        assert normalization.verify_decomposition(relation["columns"], fragments, fds) == {
+            "lossless": True,
+            "missing_columns": [],
+            "lost_fds": [],
+        }
+
+
+def test_3nf_chain_moves_every_transitive_attribute():
+    fds = [{"lhs": ["K"], "rhs": ["A"]}, {"lhs": ["A"], "rhs": ["B"]}, {"lhs": ["B"], "rhs": ["C"]}]
+    relation = {"table_name": "R", "columns": ["K", "A", "B", "C"], "primary_key": ["K"]}
+    fragments = [fragment["columns"] for fragment in normalization.ensure_3nf(relation, fds)]
+    assert sorted(fragments) == [["A", "B"], ["B", "C"], ["K", "A"]]
+    assert normalization.verify_decomposition(relation["columns"], fragments, fds)["lossless"]
+
+
+def test_string_rhs_is_one_attribute():
+    relation = {"table_name": "R", "columns": ["Emp", "Dept", "DeptName"], "primary_key": ["Emp"]}
+    listed = [{"lhs": ["Emp"], "rhs": ["Dept"]}, {"lhs": ["Dept"], "rhs": ["DeptName"]}]
+    plain = [{"lhs": "Emp", "rhs": "Dept"}, {"lhs": "Dept", "rhs": "DeptName"}]
+    for stage in (normalization.ensure_3nf, normalization.ensure_bcnf):
+        assert stage(dict(relation), plain) == stage(dict(relation), listed)
+
+
+def test_approximate_fd_with_high_g3_does_not_hold():
+    # Every group has one row out of four with a different RHS, so the true g3 error is 0.25
+    headers = ["K", "V"]
+    rows = [[str(group), "odd" if copy == 3 else "even"] for group in range(4000) for copy in range(4)]
+    [estimate] = normalization.approximate_dependencies(
+        rows, [{"lhs": ["K"], "rhs": ["V"]}], headers=headers, sample_size=500
+    )
+    assert estimate["measure"] == "g3" and not estimate["exact"]
+    assert estimate["lower"] <= 0.25 <= estimate["upper"]
+    assert not estimate["holds"]
+
+
+def test_approximate_fd_violated_only_across_sampled_rows_does_not_hold():
+    # Each pair of rows disagrees, so g3 is 0.5 even though a small sample rarely holds both rows of a pair
+    headers = ["K", "V"]
+    rows = [[str(group), str(copy)] for group in range(20000) for copy in range(2)]
+    [estimate] = normalization.approximate_dependencies(
+        rows, [{"lhs": ["K"], "rhs": ["V"]}], headers=headers, sample_size=500, threshold=0.1
+    )
+    assert estimate["lower"] <= 0.5 <= estimate["upper"]
+    assert not estimate["holds"]
+
+
+def test_approximate_interval_covers_the_g3_error():
+    headers = ["K", "V"]
+    # One group in ten has two different RHS values over its two rows, so g3 is 0.05
+    rows = [[str(group), str(copy if group % 10 == 0 else 0)] for group in range(5000) for copy in range(2)]
+    [estimate] = normalization.approximate_dependencies(
+        rows, [{"lhs": "K", "rhs": "V"}], headers=headers, sample_size=1000, threshold=0.5
+    )
+    assert not estimate["exact"]
+    assert estimate["lower"] <= 0.05 <= estimate["upper"]
+    assert estimate["holds"]
+
+
+def test_approximate_mvd_is_measured_on_complete_groups():
+    headers = ["K", "A", "B"]
+    # Every group has a missing (A, B) combination
+    rows = [[str(group), a, b] for group in range(3000) for a, b in (("x", "p"), ("x", "q"), ("y", "p"))]
+    [estimate] = normalization.approximate_dependencies(
+        rows, [], [{"lhs": ["K"], "rhs": ["A"]}], headers=headers, sample_size=300
+    )
+    assert estimate["measure"] == "violating_groups"
+    assert estimate["error"] == 1.0 and not estimate["holds"]
+
+
+def test_key_sample_does_not_depend_on_the_hash_seed():
+    script = (
+        "import normalization\n"
+        "sample = normalization.KeySample([0], 50)\n"
+        "sample.extend([[str(value)] for value in range(1000)])\n"
+        "print(sorted(sample.groups))\n"
+    )
+    outputs = {
+        subprocess.run(
+            [sys.executable, "-c", script],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(normalization.__file__)),
+            env=dict(os.environ, PYTHONHASHSEED=seed),
+        ).stdout
+        for seed in ("1", "2")
+    }
+    assert len(outputs) == 1
+
+
+def test_bulk_load_inserts_each_distinct_projection_once():
+    records = flattened_records("K A B\n1 x p\n1 x q\n2 y p")
+    relations = [
+        {"table_name": "KA", "columns": ["K", "A"], "primary_key": ["K"]},
+        {"table_name": "KB", "columns": ["K", "B"], "primary_key": ["K", "B"]},
+    ]
+    conn = sqlite3.connect(":memory:")
+    normalization.create_normalized_tables(conn.cursor(), relations)
+    trace = normalization.PipelineTrace()
+    inserted = normalization.bulk_load(conn, relations, records, records.headers, batch_size=2, trace=trace)
+    assert inserted == {"KA": 2, "KB": 3}
+    assert sorted(conn.execute("SELECT K, A FROM KA")) == [("1", "x"), ("2", "y")]
+    assert sorted(conn.execute("SELECT K, B FROM KB")) == [("1", "p"), ("1", "q"), ("2", "p")]
+    assert trace.stages["load"]["rows_in"] == 3
+    assert not trace.rejections
+
+
+def test_bulk_load_skips_or_updates_conflicting_keys():
+    relation = {"table_name": "T", "columns": ["K", "V"], "primary_key": ["K"]}
+    records = [["1", "a"], ["1", "b"], ["2", "c"]]
+    for on_conflict, kept in (("skip", "a"), ("update", "b")):
+        conn = sqlite3.connect(":memory:")
+        normalization.create_normalized_tables(conn.cursor(), [relation])
+        trace = normalization.PipelineTrace()
+        normalization.bulk_load(conn, [relation], records, ["K", "V"], on_conflict=on_conflict, trace=trace)
+        assert sorted(conn.execute("SELECT K, V FROM T")) == [("1", kept), ("2", "c")]
+        if on_conflict == "skip":
+            assert trace.rejections == {"T": {"primary key already exists": 1}}
+
+
+def load_table(records, dedup_rows, spill_dir):
+    relation = {"table_name": "T", "columns": ["K", "V"], "primary_key": ["K"]}
+    conn = sqlite3.connect(":memory:")
+    normalization.create_normalized_tables(conn.cursor(), [relation])
+    normalization.bulk_load(conn, [relation], iter(records), ["K", "V"], dedup_rows=dedup_rows, spill_dir=spill_dir)
+    return conn.execute("SELECT K, V FROM T ORDER BY K").fetchall()
+
+
+def test_spilled_dedup_keeps_the_first_seen_row(tmp_path):
+    # Later rows conflict on the key with earlier ones and sort before them
+    records = [[str(key % 50), value] for key, value in zip(range(400), itertools.cycle("zyxwvut"))]
+    in_memory = load_table(records, 1_000_000, tmp_path)
+    spilled = load_table(records, 3, tmp_path)
+    assert in_memory == spilled
+    assert in_memory[0] == ("0", "z")
+
+
+def test_5nf_splits_along_a_cyclic_join_dependency():
+    headers = ["S", "P", "J"]
+    rows = [["s1", "p1", "j2"], ["s1", "p2", "j1"], ["s2", "p1", "j1"], ["s1", "p1", "j1"]]
+    [jd] = normalization.find_join_dependencies(rows, headers, workers=1)
+    assert sorted(jd["components"]) == [["P", "J"], ["S", "J"], ["S", "P"]]
+    # Without the row the three projections imply, the join is lossy
+    assert normalization.find_join_dependencies(rows[:3], headers, workers=1) == []
+    relation = {"table_name": "SPJ", "columns": headers, "primary_key": headers}
+    applied = []
+    fragments = normalization.ensure_5nf(relation, normalization.ColumnStore.from_records(headers, rows), [], 1, applied)
+    assert sorted(fragment["columns"] for fragment in fragments) == sorted(jd["components"])
+    assert applied == [jd["components"]]
+
+
+def test_join_dependencies_implied_by_an_mvd_are_not_reported():
+    headers = ["S", "P", "J"]
+    # S ->> P holds, so every JD here already follows from it
+    rows = [["s1", p, j] for p, j in itertools.product(["p1", "p2"], ["j1", "j2"])] + [["s2", "p1", "j1"]]
+    assert normalization.find_join_dependencies(rows, headers, workers=1) == []
+
+
+def test_4nf_split_is_verified_with_its_mvd():
+    records = flattened_records("K A B\n1 {x, y} {p, q}\n2 {x, z} {q}")
+    relations = {"R": {"table_name": "R", "columns": records.headers, "primary_key": ["K"]}}
+    plan = normalization.NormalizationPlan([], [{"lhs": "K", "rhs": ["A"]}], 5, records).run(relations)
+    [report] = [report for report in normalization.verify_plan(plan) if report["stage"] == "4NF"]
+    assert report["lossless"] is True
+    # The loaded tables keep every K-A pair
+    relations = plan.relations()
+    conn = sqlite3.connect(":memory:")
+    normalization.create_normalized_tables(conn.cursor(), relations)
+    normalization.bulk_load(conn, relations, records, records.headers)
+    [pairs] = [relation["table_name"] for relation in relations if relation["columns"] == ["K", "A"]]
+    assert sorted(conn.execute(f"SELECT K, A FROM {pairs}")) == [("1", "x"), ("1", "y"), ("2", "x"), ("2", "z")]
+    check = normalization.verify_loaded_tables(conn, relations, records, records.headers)
+    assert check["checked"] and check["matches"]
+
+
+def test_wrong_4nf_split_is_reported_lossy():
+    records = flattened_records("K A B\n1 {x, y} {p, q}")
+    relations = {"R": {"table_name": "R", "columns": records.headers, "primary_key": []}}
+    plan = normalization.NormalizationPlan([], [], 1, records).run(relations)
+    [root] = plan.roots
+    # A split that drops K from the A fragment, justified by the MVD K ->> A
+    node = plan.nodes[root]
+    node.children["4NF"] = [
+        plan.add({"table_name": name, "columns": columns, "primary_key": columns})
+        for name, columns in (("KB", ["K", "B"]), ("A", ["A"]))
+    ]
+    node.dependencies["4NF"] = [[["K", "A"], ["K", "B"]]]
+    [report] = [report for report in normalization.verify_plan(plan) if report["stage"] == "4NF"]
+    assert report["lossless"] is False
+
+
+def test_plan_runs_each_relation_and_stage_once():
+    fds = [{"lhs": ["Emp"], "rhs": ["Dept"]}, {"lhs": ["Dept"], "rhs": ["DeptName"]}]
+    relation = {"table_name": "A", "columns": ["Emp", "Dept", "DeptName"], "primary_key": ["Emp"]}
+    single = normalization.NormalizationPlan(fds, [], 4).run({"A": relation})
+    # The same content under another name shares every node with the first relation
+    shared = normalization.NormalizationPlan(fds, [], 4).run({"A": relation, "B": dict(relation, table_name="B")})
+    assert shared.stage_runs == single.stage_runs
+    assert shared.memo_hits == 1
+    assert len(shared.nodes) == len(single.nodes)
+    assert shared.roots[0] == shared.roots[1]
+    assert sorted(relation["columns"] for relation in shared.relations()) == [["Dept", "DeptName"], ["Emp", "Dept"]]
+    assert "shared, expanded above" in shared.explain()
+
+
+def test_loaded_tables_check_counts_streamed_records(tmp_path):
+    relation = {"table_name": "T", "columns": ["K", "V"], "primary_key": ["K", "V"]}
+    records = [[str(key % 30), str(key % 4)] for key in range(200)]
+    conn = sqlite3.connect(":memory:")
+    normalization.create_normalized_tables(conn.cursor(), [relation])
+    normalization.bulk_load(conn, [relation], iter(records), ["K", "V"])
+    check = normalization.verify_loaded_tables(conn, [relation], iter(records), ["K", "V"], 5, tmp_path)
+    assert check["checked"] and check["matches"]
+    assert check["input_rows"] == len({tuple(record) for record in records})
+
+
+def test_join_indexes_and_reconstructed_view_rebuild_the_input():
+    headers = ["Emp", "Dept", "DeptName"]
+    relations = [
+        {"table_name": "Emp", "columns": ["Emp", "Dept"], "primary_key": ["Emp"]},
+        {"table_name": "Dept", "columns": ["Dept", "DeptName"], "primary_key": ["Dept"]},
+    ]
+    records = [["1", "d1", "Sales"], ["2", "d1", "Sales"], ["3", "d2", "Ops"]]
+    conn = sqlite3.connect(":memory:")
+    normalization.create_normalized_tables(conn.cursor(), relations)
+    normalization.bulk_load(conn, relations, records, headers)
+    normalization.create_join_indexes(conn, relations)
+    # Dept.Dept is already covered by its primary key, so only the referencing column gets an index
+    [(index, table)] = conn.execute("SELECT name, tbl_name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL")
+    assert table == "Emp"
+    assert [row[2] for row in conn.execute(f"PRAGMA index_info({index})")] == ["Dept"]
+    assert normalization.create_reconstructed_view(conn, relations, headers)
+    view = normalization.RECONSTRUCTED_VIEW
+    assert [row[1] for row in conn.execute(f"PRAGMA table_info({view})")] == headers
+    assert sorted(conn.execute(f"SELECT * FROM {view}")) == [tuple(record) for record in records]
+
+
+def test_sinks_receive_the_distinct_rows_of_every_relation(tmp_path):
+    headers = ["Emp", "Dept", "DeptName"]
+    relations = [
+        {"table_name": "Emp", "columns": ["Emp", "Dept"], "primary_key": ["Emp"]},
+        {"table_name": "Dept", "columns": ["Dept", "DeptName"], "primary_key": ["Dept"]},
+    ]
+    records = [["1", "d1", "Sales"], ["2", "d1", "Sales"], ["3", "d2", "Ops"], ["3", "d2", "Ops"]]
+    specs = [f"{kind}:{tmp_path / kind}" for kind in ("csv", "ndjson", "sqlite", "sqlite-writer")]
+    sinks = [normalization.make_sink(spec) for spec in specs]
+    metrics = normalization.write_sinks(sinks, relations, records, headers, batch_size=1, threads=2)
+    assert [metric["sink"] for metric in metrics] == ["csv", "ndjson", "sqlite", "sqlite-writer"]
+    for metric in metrics:
+        assert metric["rows"] == 5 and metric["bytes"] > 0
+        assert {name: stats["rows"] for name, stats in metric["tables"].items()} == {"Emp": 3, "Dept": 2}
+    assert (tmp_path / "csv" / "Dept.csv").read_text().splitlines() == ["Dept,DeptName", "d1,Sales", "d2,Ops"]
+    lines = (tmp_path / "ndjson" / "Emp.ndjson").read_text().splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"Emp": "1", "Dept": "d1"},
+        {"Emp": "2", "Dept": "d1"},
+        {"Emp": "3", "Dept": "d2"},
+    ]
+    for kind in ("sqlite", "sqlite-writer"):
+        conn = sqlite3.connect(tmp_path / kind)
+        assert sorted(conn.execute("SELECT Emp, Dept FROM Emp")) == [("1", "d1"), ("2", "d1"), ("3", "d2")]
+        conn.close()
+    with pytest.raises(ValueError, match="Unknown sink"):
+        normalization.make_sink("parquet:out")
+
+
+def test_rejoin_over_too_many_tables_is_skipped():
+    relations = [{"table_name": f"T{i}", "columns": ["K", f"V{i}"], "primary_key": ["K"]} for i in range(65)]
+    headers = ["K"] + [f"V{i}" for i in range(65)]
+    records = [["1"] + ["x"] * 65]
+    conn = sqlite3.connect(":memory:")
+    normalization.create_normalized_tables(conn.cursor(), relations)
+    normalization.bulk_load(conn, relations, records, headers)
+    trace = normalization.PipelineTrace()
+    assert not normalization.create_reconstructed_view(conn, relations, headers, trace=trace)
+    assert trace.to_dict()["notes"]
+    check = normalization.verify_loaded_tables(conn, relations, records, headers)
+    assert check["checked"] is False and "64" in check["reason"]
+
+
+def test_append_checks_new_rows_against_the_stored_fds(tmp_path):
+    db_file = str(tmp_path / "out.db")
+    headers = ["Emp", "Dept", "DeptName"]
+    relations = [
+        {"table_name": "Emp", "columns": ["Emp", "Dept"], "primary_key": ["Emp"]},
+        {"table_name": "Dept", "columns": ["Dept", "DeptName"], "primary_key": ["Dept"]},
+    ]
+    fds = [{"lhs": ["Emp"], "rhs": ["Dept"]}, {"lhs": ["Dept"], "rhs": ["DeptName"]}]
+    conn = sqlite3.connect(db_file)
+    normalization.create_normalized_tables(conn.cursor(), relations)
+    normalization.bulk_load(conn, relations, [["e1", "d1", "Sales"]], headers)
+    normalization.save_schema_metadata(conn, relations, fds, headers)
+    conn.close()
+
+    metadata = normalization.load_schema_metadata(sqlite3.connect(db_file))
+    assert metadata["relations"] == relations and metadata["headers"] == headers
+    batch = [["e2", "d1", "Sales"], ["e3", "d1", "Marketing"], ["e4", "d2", "Ops"], ["e5", "d2", "Support"]]
+    inserted, violations = normalization.append_to_database(db_file, metadata, batch, headers)
+    assert sorted((violation["source"], violation["key"]) for violation in violations) == [
+        ("batch", ["d2"]),
+        ("stored", ["d1"]),
+    ]
+    assert inserted == {"Emp": 4, "Dept": 1}
+    conn = sqlite3.connect(db_file)
+    assert sorted(conn.execute("SELECT Dept, DeptName FROM Dept")) == [("d1", "Sales"), ("d2", "Ops")]
+
+
+def test_parallel_load_traces_the_rows_it_reads(tmp_path):
+    path = tmp_path / "input.txt"
+    path.write_text("K V\n1 {a, b}\n2 c\n2 c\n")
+    relation = {"table_name": "T", "columns": ["K", "V"], "primary_key": ["K", "V"]}
+    conn = sqlite3.connect(":memory:")
+    normalization.create_normalized_tables(conn.cursor(), [relation])
+    trace = normalization.PipelineTrace()
+    inserted = normalization.parallel_load(conn, [relation], str(path), workers=1, trace=trace)
+    assert inserted == {"T": 3}
+    assert trace.stages["load"]["rows_in"] == 4
+    assert trace.stages["load"]["rows_out"] == 3
+
+
+def test_cache_key_covers_flattening_options():
+    relations = {"R": {"table_name": "R", "columns": ["K", "A", "B"], "primary_key": ["K"]}}
+    fingerprint = ["input_data.txt", 10, 1]
+    keys = {
+        normalization.decomposition_cache_key(relations, [], [], 6, fingerprint),
+        normalization.decomposition_cache_key(relations, [], [], 6, fingerprint, {"A": "zip", "B": "zip"}),
+        normalization.decomposition_cache_key(relations, [], [], 6, fingerprint, None, 4),
+    }
+    assert len(keys) == 3
+    assert normalization.reads_records(5) and not normalization.reads_records(4)
+
+
+def test_table_names_depend_only_on_columns_and_key():
+    name = normalization.generate_table_name("T", ["A", "B"], ["A"])
+    assert name == normalization.generate_table_name("T", ["B", "A"], ["A"])
+    assert name != normalization.generate_table_name("T", ["A", "B"], ["B"])
+    script = (
+        "import json\n"
+        "import normalization\n"
+        "headers, rows = normalization.parse_input(open('input_data.txt').read())\n"
+        "records = normalization.ColumnStore.from_records(headers, normalization.FlatRecords(rows, headers))\n"
+        "relations = {'R': {'table_name': 'R', 'columns': headers, 'primary_key': ['OrderID']}}\n"
+        "fds = json.load(open('fds.txt'))\n"
+        "mvds = json.load(open('mvds.txt'))\n"
+        "print(sorted(r['table_name'] for r in normalization.normalize_relations(relations, fds, mvds, 6, records)))\n"
+    )
+    outputs = {
+        subprocess.run(
+            [sys.executable, "-c", script],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(normalization.__file__)),
+            env=dict(os.environ, PYTHONHASHSEED=seed),
+        ).stdout
+        for seed in ("1", "2")
+    }
+    assert len(outputs) == 1 and "CoffeeShop" in outputs.pop()
+
+
+def test_cached_decomposition_round_trips_and_evicts_old_entries(tmp_path):
+    relations = [{"table_name": "T", "columns": ["K"], "primary_key": ["K"], "records": object()}]
+    assert normalization.load_cached_decomposition("old", tmp_path) is None
+    normalization.store_cached_decomposition("old", relations, tmp_path)
+    assert normalization.load_cached_decomposition("old", tmp_path) == [
+        {"table_name": "T", "columns": ["K"], "primary_key": ["K"]}
+    ]
+    os.utime(tmp_path / "old.json", ns=(0, 0))
+    # The older entry is evicted once both no longer fit
+    normalization.store_cached_decomposition("new", relations, tmp_path, max_bytes=os.path.getsize(tmp_path / "old.json"))
+    assert sorted(os.listdir(tmp_path)) == ["new.json"]
+
+
+def test_validation_reports_violating_groups_and_missing_rows():
+    headers = ["K", "A", "B"]
+    records = [["1", "x", "p"], ["1", "y", "q"], ["2", "z", "p"], ["3", "w", "p"], ["3", "w", "q"], ["3", "v", "p"]]
+    fds = [{"lhs": "K", "rhs": "A"}, {"lhs": "A", "rhs": "K"}]
+    mvds = [{"lhs": "K", "rhs": ["A"]}]
+    # K = 1 is missing (x, q) and (y, p); K = 3 is missing (v, q)
+    assert normalization.validate_dependencies(records, fds, mvds, headers, max_rows=2) == [
+        {"kind": "fd", "lhs": ["K"], "rhs": ["A"], "groups": 2, "missing_rows": 0, "rows": [0, 1]},
+        {"kind": "mvd", "lhs": ["K"], "rhs": ["A"], "groups": 2, "missing_rows": 3, "rows": [0, 1]},
+    ]
+
+
+def test_streamed_validation_matches_column_store(tmp_path):
+    headers = ["K", "A", "B"]
+    records = [[str(row % 7), str(row % 3), str(row % 5)] for row in range(100)]
+    fds = [{"lhs": ["K"], "rhs": ["A"]}, {"lhs": ["A"], "rhs": "K"}]
+    mvds = [{"lhs": ["K"], "rhs": ["A"]}]
+    expected = normalization.validate_dependencies(normalization.ColumnStore.from_records(headers, records), fds, mvds)
+    streamed = normalization.stream_validate_dependencies(iter(records), fds, mvds, headers, run_rows=9, spill_dir=tmp_path)
+    assert expected and streamed == expected
+
+
+def test_schema_only_bcnf_splits_what_3nf_synthesis_keeps_together():
+    relation = {"table_name": "R", "columns": ["A", "B", "C"], "primary_key": ["A", "B"]}
+    fds = [{"lhs": ["A", "B"], "rhs": ["C"]}, {"lhs": ["C"], "rhs": ["B"]}]
+    [synthesized] = normalization.normalize_schema(relation, fds, 3)
+    assert synthesized["columns"] == ["A", "B", "C"] and synthesized["primary_key"] == ["A", "B"]
+    relations = normalization.normalize_schema(relation, fds, 4)
+    assert sorted((relation["columns"], relation["primary_key"]) for relation in relations) == [
+        (["A", "C"], ["A", "C"]),
+        (["B", "C"], ["C"]),
+    ]
+
+
+def test_schema_only_decompositions_are_lossless_and_3nf_preserves_the_fds():
+    rng = random.Random(5)
+    for _ in range(200):
+        columns = list("ABCDEF")[: rng.randint(3, 6)]
+        fds = [
+            {"lhs": rng.sample(columns, rng.randint(1, 2)), "rhs": rng.sample(columns, 1)}
+            for _ in range(rng.randint(1, 6))
+        ]
+        relation = {"table_name": "R", "columns": columns, "primary_key": []}
+        for max_nf in (3, 4):
+            relations = normalization.normalize_schema(relation, fds, max_nf)
+            report = normalization.verify_decomposition(columns, [relation["columns"] for relation in relations], fds)
+            assert report["lossless"]
+            if max_nf == 3:
+                assert report["lost_fds"] == []
+
+
+def test_wide_relations_are_reported_as_not_fully_checked_for_bcnf():
+    columns = list("ABCDEFGHIJKLMN")
+    relation = {"table_name": "R", "columns": columns, "primary_key": ["A"]}
+    unchecked = []
+    normalization.normalize_schema(relation, [], 4, unchecked)
+    assert unchecked == []
+    fds = [{"lhs": ["A"], "rhs": columns[1:]}]
+    normalization.normalize_schema(relation, fds, 4, unchecked)
+    assert [len(part["columns"]) for part in unchecked] == [14]
+
+
+def test_manifest_datasets_get_their_own_trace(tmp_path):
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text(json.dumps([{"db": "out/a.db"}, {"db": "out/b.db"}, {"db": "out/c.db", "trace": "c.json"}]))
+    parser = normalization.build_parser()
+    defaults = vars(parser.parse_args(["--trace", "shared.json", "--max-nf", "3"]))
+    datasets = normalization.load_manifest(str(manifest), parser, defaults)
+    traces = [options["trace"] for _, options in datasets]
+    assert traces == [str(tmp_path / "out" / "a.trace.json"), str(tmp_path / "out" / "b.trace.json"), str(tmp_path / "c.json")]
+
+
+def test_batch_normalizes_every_dataset_and_isolates_failures(tmp_path):
+    (tmp_path / "input.txt").write_text("Emp Dept DeptName\n1 d1 Sales\n2 d1 Sales\n3 d2 Ops\n")
+    (tmp_path / "fds.json").write_text(json.dumps([{"lhs": ["Emp"], "rhs": ["Dept"]}, {"lhs": ["Dept"], "rhs": ["DeptName"]}]))
+    (tmp_path / "mvds.json").write_text("[]")
+    common = {"fds": "fds.json", "mvds": "mvds.json", "key": "Emp"}
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text(
+        json.dumps(
+            [
+                dict(common, name="emp", input="input.txt", db="out/emp.db"),
+                dict(common, name="missing", input="missing.txt", db="out/missing.db"),
+            ]
+        )
+    )
+    parser = normalization.build_parser()
+    args = parser.parse_args(["--manifest", str(manifest), "--max-nf", "3", "--jobs", "2"])
+    assert normalization.run_batch(args, parser) == 1
+    conn = sqlite3.connect(tmp_path / "out" / "emp.db")
+    tables = [name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'") if not name.startswith("_")]
+    assert sorted(sum(1 for _ in conn.execute(f"SELECT * FROM {table}")) for table in tables) == [2, 3]
+    conn.close()
+    assert "FileNotFoundError" in (tmp_path / "out" / "missing.log").read_text()
+
+
+def test_synthetic_dataset_satisfies_its_dependencies(tmp_path):
+    headers, fds, mvds = benchmark.synthetic_schema(8, entities=2, multivalued=1)
+    path = tmp_path / "input.txt"
+    benchmark.write_dataset(str(path), headers, 300, fanout=3)
+    records = flattened_records(path.read_text())
+    assert records.headers == headers and len(records) > 300
+    assert normalization.validate_dependencies(records, fds, mvds) == []
+
+
+def test_benchmark_suite_times_every_stage_and_flags_regressions():
+    stages = benchmark.benchmark_pipeline(200, columns=8, max_nf=4)
+    assert {"parse", "flatten", "create_tables", "load"} <= set(stages)
+    results = {"200": {"load": 1.0, "parse": 0.001}}
+    baseline = {"200": {"load": 0.5, "parse": 0.0001}}
+    # The parse stage is slower too, but below the noise floor
+    assert benchmark.find_regressions(results, baseline) == [
+        {"rows": "200", "stage": "load", "baseline": 0.5, "seconds": 1.0}
+    ]
+    assert benchmark.find_regressions(results, baseline, threshold=1.5) == []
+